@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Backups do Banco PMPV
+Cópias com o banco em uso (API de backup do SQLite), comprimidas, com rotação e restauração verificada
+
+Uso:
+    python backup.py criar                       # backups/pmpv_backup_<data>.db.gz + rotação
+    python backup.py listar
+    python backup.py verificar backups/pmpv_backup_20260210_020000.db.gz
+    python backup.py restaurar backups/pmpv_backup_20260210_020000.db.gz
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import VERSAO_ESQUEMA
+
+
+PREFIXO = "pmpv_backup_"
+FORMATO_DATA = "%Y%m%d_%H%M%S"
+
+
+def copiar_online(db_path: str, destino: str, paginas_por_passo: int = 1024, pausa: float = 0.01,
+                  progresso: Callable[[float], None] = None):
+    """
+    Copia o banco para `destino` com Connection.backup, em passos.
+
+    O resultado é sempre um retrato consistente de um único commit (nunca
+    um arquivo pela metade, como numa cópia do arquivo). Em WAL a origem
+    fica presa a esse retrato por uma transação de leitura, que não bloqueia
+    quem grava: as gravações continuam durante a cópia e ela não recomeça.
+    Sem WAL, a leitura é liberada por `pausa` segundos entre um passo e
+    outro, e o SQLite recomeça a cópia se o banco mudar no meio.
+
+    Args:
+        db_path: Banco de origem (pode estar aberto por outros processos)
+        destino: Arquivo da cópia (sobrescrito)
+        paginas_por_passo: Páginas copiadas por passo
+        pausa: Segundos de pausa entre passos
+        progresso: Chamado com a fração copiada (0 a 1)
+    """
+    origem = sqlite3.connect(db_path, timeout=30)
+    copia = sqlite3.connect(destino)
+    try:
+        def informar(status, restantes, total):
+            if progresso and total:
+                progresso(1 - restantes / total)
+
+        wal = origem.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        if wal:
+            origem.execute("BEGIN")
+            origem.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        origem.backup(copia, pages=paginas_por_passo, progress=informar, sleep=pausa)
+        if wal:
+            origem.rollback()
+        # Retrato num arquivo só (sem -wal/-shm), pronto para comprimir
+        copia.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        copia.close()
+        origem.close()
+
+
+def _verificar_banco(caminho: str) -> Dict:
+    conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    try:
+        integridade = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+        sessoes = linhas = None
+        if integridade == "ok":
+            sessoes = conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+            linhas = conn.execute("SELECT COUNT(*) FROM dados_mes").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        integridade, versao, sessoes, linhas = str(e), None, None, None
+    finally:
+        conn.close()
+
+    problema = None
+    if integridade != "ok":
+        problema = f"integridade: {integridade}"
+    elif versao > VERSAO_ESQUEMA:
+        problema = f"esquema na versão {versao}, este programa conhece até a {VERSAO_ESQUEMA}"
+    return {'ok': problema is None, 'problema': problema, 'versao_esquema': versao,
+            'sessoes': sessoes, 'linhas': linhas}
+
+
+def _descomprimir(arquivo: str, destino: str):
+    with gzip.open(arquivo, "rb") as entrada, open(destino, "wb") as saida:
+        shutil.copyfileobj(entrada, saida, 2**20)
+
+
+def verificar_backup(arquivo: str) -> Dict:
+    """
+    Confere um backup (.db.gz ou .db): descomprime numa pasta temporária e roda o integrity_check.
+
+    Returns:
+        {'ok', 'problema', 'versao_esquema', 'sessoes', 'linhas'}
+    """
+    if not arquivo.endswith(".gz"):
+        return _verificar_banco(arquivo)
+
+    pasta = tempfile.mkdtemp(prefix="pmpv_verificar_")
+    try:
+        copia = os.path.join(pasta, "verificar.db")
+        try:
+            _descomprimir(arquivo, copia)
+        except (OSError, EOFError, zlib.error) as e:
+            return {'ok': False, 'problema': f"arquivo corrompido: {e}", 'versao_esquema': None,
+                    'sessoes': None, 'linhas': None}
+        return _verificar_banco(copia)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def criar_backup(db_path: str = "pmpv_data.db", pasta: str = "backups", comprimir: bool = True,
+                 verificar: bool = True, retencao: Optional[Dict[str, int]] = None,
+                 progresso: Callable[[float], None] = None) -> str:
+    """
+    Cria um backup do banco sem tirar ninguém do sistema.
+
+    A cópia é feita numa pasta temporária (copiar_online), conferida com
+    integrity_check, comprimida com gzip e só então aparece na pasta com o
+    nome final. Depois os backups antigos passam pela rotação (aplicar_retencao).
+
+    Args:
+        db_path: Banco de origem
+        pasta: Pasta dos backups
+        comprimir: False grava o .db sem compressão
+        verificar: Confere a cópia antes de guardá-la
+        retencao: {'diarios', 'semanais', 'mensais'} (None = padrão de aplicar_retencao;
+                  {} = não apaga nada)
+        progresso: Chamado com a fração copiada (0 a 1)
+
+    Returns:
+        Caminho do backup criado
+    """
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"{PREFIXO}{datetime.now().strftime(FORMATO_DATA)}.db" + (".gz" if comprimir else "")
+    caminho = os.path.join(pasta, nome)
+
+    temporaria = tempfile.mkdtemp(prefix=".pmpv_backup_", dir=pasta)
+    try:
+        copia = os.path.join(temporaria, "copia.db")
+        copiar_online(db_path, copia, progresso=progresso)
+        if verificar:
+            situacao = _verificar_banco(copia)
+            if not situacao['ok']:
+                raise RuntimeError(f"Backup descartado ({situacao['problema']})")
+
+        if comprimir:
+            comprimido = copia + ".gz"
+            with open(copia, "rb") as entrada, gzip.open(comprimido, "wb", compresslevel=6) as saida:
+                shutil.copyfileobj(entrada, saida, 2**20)
+            copia = comprimido
+        os.replace(copia, caminho)
+    finally:
+        shutil.rmtree(temporaria, ignore_errors=True)
+
+    print(f"Backup criado: {caminho}")
+    if retencao != {}:
+        aplicar_retencao(pasta, **(retencao or {}))
+    return caminho
+
+
+def listar_backups(pasta: str = "backups") -> List[Tuple[datetime, str]]:
+    """Backups da pasta, do mais novo para o mais antigo: [(data, caminho)]"""
+    backups = []
+    if not os.path.isdir(pasta):
+        return backups
+    for nome in os.listdir(pasta):
+        if not nome.startswith(PREFIXO) or not (nome.endswith(".db") or nome.endswith(".db.gz")):
+            continue
+        try:
+            data = datetime.strptime(nome[len(PREFIXO):].split(".")[0], FORMATO_DATA)
+        except ValueError:
+            continue
+        backups.append((data, os.path.join(pasta, nome)))
+    return sorted(backups, reverse=True)
+
+
+def aplicar_retencao(pasta: str = "backups", diarios: int = 7, semanais: int = 4,
+                     mensais: int = 12) -> List[str]:
+    """
+    Rotação avô-pai-filho: guarda o backup mais novo de cada um dos últimos
+    `diarios` dias, `semanais` semanas e `mensais` meses, e apaga o resto.
+
+    Assim a pasta nunca passa de diarios + semanais + mensais arquivos,
+    não importa há quanto tempo o backup noturno roda.
+
+    Returns:
+        Caminhos apagados
+    """
+    backups = listar_backups(pasta)
+    manter = set()
+    for periodo, quantidade in ((lambda d: d.date(), diarios),
+                                (lambda d: d.isocalendar()[:2], semanais),
+                                (lambda d: (d.year, d.month), mensais)):
+        vistos = set()
+        for data, caminho in backups:
+            chave = periodo(data)
+            if chave in vistos:
+                continue
+            if len(vistos) >= quantidade:
+                break
+            vistos.add(chave)
+            manter.add(caminho)
+
+    apagados = []
+    for _, caminho in backups:
+        if caminho not in manter:
+            os.remove(caminho)
+            apagados.append(caminho)
+    return apagados
+
+
+def restaurar_backup(arquivo: str, db_path: str = "pmpv_data.db",
+                     pasta_seguranca: Optional[str] = "backups") -> Dict:
+    """
+    Restaura um backup sobre o banco, depois de conferi-lo.
+
+    O backup é descomprimido e verificado numa pasta temporária; o banco
+    atual ganha antes um backup de segurança (em `pasta_seguranca`). A
+    restauração usa a API de backup do SQLite na conexão do banco de destino,
+    então outros programas com o banco aberto passam a ver os dados
+    restaurados no próximo acesso, sem arquivo trocado por baixo deles.
+
+    Returns:
+        Resultado de verificar_backup do banco restaurado
+
+    Raises:
+        ValueError: Backup inválido (o banco atual não é tocado)
+    """
+    temporaria = tempfile.mkdtemp(prefix="pmpv_restaurar_")
+    try:
+        copia = arquivo
+        if arquivo.endswith(".gz"):
+            copia = os.path.join(temporaria, "restaurar.db")
+            try:
+                _descomprimir(arquivo, copia)
+            except (OSError, EOFError, zlib.error) as e:
+                raise ValueError(f"Backup inválido: arquivo corrompido ({e})")
+        situacao = _verificar_banco(copia)
+        if not situacao['ok']:
+            raise ValueError(f"Backup inválido: {situacao['problema']}")
+
+        if pasta_seguranca and os.path.exists(db_path):
+            criar_backup(db_path, pasta_seguranca, retencao={})
+
+        origem = sqlite3.connect(f"file:{copia}?mode=ro", uri=True)
+        destino = sqlite3.connect(db_path, timeout=30)
+        try:
+            origem.backup(destino)
+        finally:
+            destino.close()
+            origem.close()
+    finally:
+        shutil.rmtree(temporaria, ignore_errors=True)
+
+    restaurado = _verificar_banco(db_path)
+    if not restaurado['ok']:
+        raise RuntimeError(f"Banco restaurado não passou na verificação: {restaurado['problema']}")
+    print(f"Backup restaurado: {arquivo} -> {db_path}")
+    return restaurado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backups do banco da Calculadora PMPV.")
+    parser.add_argument("--banco", default="pmpv_data.db", help="Arquivo do banco (padrão: pmpv_data.db)")
+    parser.add_argument("--pasta", default="backups", help="Pasta dos backups (padrão: backups)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("criar", help="Cria um backup e aplica a rotação")
+    p.add_argument("--sem-compressao", action="store_true", help="Grava o .db sem gzip")
+    p.add_argument("--diarios", type=int, default=7)
+    p.add_argument("--semanais", type=int, default=4)
+    p.add_argument("--mensais", type=int, default=12)
+
+    sub.add_parser("listar", help="Lista os backups da pasta")
+
+    p = sub.add_parser("verificar", help="Confere a integridade de um backup")
+    p.add_argument("arquivo")
+
+    p = sub.add_parser("restaurar", help="Confere e restaura um backup sobre o banco")
+    p.add_argument("arquivo")
+    p.add_argument("--sem-seguranca", action="store_true",
+                   help="Não faz backup do banco atual antes de restaurar")
+    args = parser.parse_args(argv)
+
+    if args.comando == "criar":
+        criar_backup(args.banco, args.pasta, comprimir=not args.sem_compressao,
+                     retencao={'diarios': args.diarios, 'semanais': args.semanais, 'mensais': args.mensais})
+    elif args.comando == "listar":
+        for data, caminho in listar_backups(args.pasta):
+            print(f"{data:%Y-%m-%d %H:%M:%S}  {os.path.getsize(caminho) / 2**20:>9.2f} MB  {caminho}")
+    elif args.comando == "verificar":
+        situacao = verificar_backup(args.arquivo)
+        if not situacao['ok']:
+            print(f"Backup inválido: {situacao['problema']}")
+            return 1
+        print(f"OK: esquema v{situacao['versao_esquema']}, {situacao['sessoes']} sessões, "
+              f"{situacao['linhas']} linhas")
+    else:
+        try:
+            restaurar_backup(args.arquivo, args.banco, None if args.sem_seguranca else args.pasta)
+        except ValueError as e:
+            print(e)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
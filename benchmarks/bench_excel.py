@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da exportação Excel: workbook completo x streaming (write-only).
+
+Para cada tamanho, gera um trimestre com N linhas por mês e mede tempo e pico
+de memória (tracemalloc) de ExcelHandlerPMPV.exportar_trimestre nos dois modos.
+No modo streaming os meses são geradores, como numa exportação direto do banco.
+
+Uso:
+    python benchmarks/bench_excel.py                         # 1k, 10k e 100k linhas/mês
+    python benchmarks/bench_excel.py --linhas 1000 50000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from excel_handler import ExcelHandlerPMPV
+
+
+def gerar_linhas(n: int, semente: int):
+    """Linhas de contratos de um mês (gerador)"""
+    rng = random.Random(semente)
+    for j in range(n):
+        yield {'empresa': f"EMPRESA {j}", 'molecula': rng.uniform(9, 12), 'transporte': 0.5,
+               'logistica': 0.3, 'volume': rng.uniform(1, 1e5)}
+
+
+def medir(n: int, streaming: bool, pasta: str):
+    """Retorna (segundos, pico de memória em MB, tamanho do arquivo em MB)"""
+    if streaming:
+        dados = {f"Mês {i}": gerar_linhas(n, i) for i in range(1, 4)}
+    else:
+        dados = {f"Mês {i}": list(gerar_linhas(n, i)) for i in range(1, 4)}
+    resultado = {'volume_total': 1.0, 'custo_total': 11.0, 'pmpv': 11.0}
+    arquivo = os.path.join(pasta, f"bench_{n}_{int(streaming)}.xlsx")
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    ExcelHandlerPMPV.exportar_trimestre(dados, resultado, arquivo, streaming=streaming)
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tamanho = os.path.getsize(arquivo) / 2**20
+    os.remove(arquivo)
+    return segundos, pico / 2**20, tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Linhas por mês")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    print(f"\n{'Linhas/mês':>10}  {'Modo':<10}{'Tempo (s)':>10}{'Pico (MB)':>11}{'Arquivo (MB)':>14}")
+    for n in args.linhas:
+        for streaming in (False, True):
+            segundos, pico, tamanho = medir(n, streaming, pasta)
+            modo = "streaming" if streaming else "completo"
+            print(f"{n:>10,}  {modo:<10}{segundos:>10.2f}{pico:>11.1f}{tamanho:>14.2f}")
+    os.rmdir(pasta)
+
+
+if __name__ == "__main__":
+    main()
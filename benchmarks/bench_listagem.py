@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de listagem e carga de sessões com histórico grande.
+
+Cria um banco temporário com muitas sessões e linhas de meses e mede as
+consultas usadas pela tela (listagem, carga de um mês, exportação e exclusão).
+
+Uso:
+    python benchmarks/bench_listagem.py                      # 100k sessões, 10M linhas
+    python benchmarks/bench_listagem.py --sessoes 10000 --linhas 1000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import DatabasePMPV, chave_empresa
+
+
+def popular(db: DatabasePMPV, n_sessoes: int, n_linhas: int):
+    """Preenche o banco com sessões, resultados e linhas de meses"""
+    rng = random.Random(42)
+    linhas_por_sessao = max(n_linhas // n_sessoes, 1)
+
+    db.conn.executemany(
+        "INSERT INTO sessoes (id, nome, data_modificacao, observacoes) "
+        "VALUES (?, ?, datetime('2020-01-01', ? || ' minutes'), '')",
+        ((i, f"Trimestre {i}", i) for i in range(1, n_sessoes + 1))
+    )
+    # Algumas sessões com mais de um resultado (o LEFT JOIN antigo duplicava)
+    db.conn.executemany(
+        "INSERT INTO resultados (sessao_id, volume_total, pmpv_trimestral, custo_total, data_calculo) "
+        "VALUES (?, ?, ?, ?, datetime('2020-01-01', ? || ' minutes'))",
+        ((i, 1000.0 * k, 11.0 + k, 11000.0 * k, i + k)
+         for i in range(1, n_sessoes + 1) for k in range(1 + i % 3))
+    )
+    db.conn.executemany("INSERT INTO empresas (id, nome) VALUES (?, ?)",
+                        ((k, f"EMPRESA {k}") for k in range(1, 51)))
+    db.conn.executemany("INSERT INTO empresas_alias (chave, empresa_id) VALUES (?, ?)",
+                        ((chave_empresa(f"EMPRESA {k}"), k) for k in range(1, 51)))
+    db.conn.executemany(
+        "INSERT INTO dados_mes (sessao_id, mes, empresa_id, molecula, transporte, logistica, volume) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((s, 1 + j % 3, 1 + j % 50, rng.uniform(9, 12), 0.5, 0.3, rng.uniform(0, 1e5))
+         for s in range(1, n_sessoes + 1) for j in range(linhas_por_sessao))
+    )
+    db.conn.commit()
+    db.conn.execute("ANALYZE")
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """Mediana em milissegundos"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", type=int, default=100_000)
+    parser.add_argument("--linhas", type=int, default=10_000_000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--banco", help="Arquivo do banco (padrão: temporário, apagado no fim)")
+    args = parser.parse_args()
+
+    caminho = args.banco or os.path.join(tempfile.mkdtemp(), "bench_pmpv.db")
+    novo = not os.path.exists(caminho)
+    db = DatabasePMPV(caminho)
+
+    if novo:
+        print(f"Populando {args.sessoes:,} sessões e {args.linhas:,} linhas em {caminho}...")
+        inicio = time.perf_counter()
+        popular(db, args.sessoes, args.linhas)
+        print(f"  pronto em {time.perf_counter() - inicio:.1f} s")
+
+    plano = db.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT s.id FROM sessoes s ORDER BY s.data_modificacao DESC, s.id DESC LIMIT 50"
+    ).fetchall()
+    print("Plano da listagem:", "; ".join(row[3] for row in plano))
+
+    sessao = random.Random(7).randint(1, args.sessoes)
+    pagina = db.listar_sessoes(limite=50)
+    assert len({s['id'] for s in pagina}) == len(pagina), "listagem com sessões duplicadas"
+
+    resultados = [
+        ("listar_sessoes(limite=50)", medir(lambda: db.listar_sessoes(limite=50), args.repeticoes)),
+        ("carregar_dados_mes", medir(lambda: db.carregar_dados_mes(sessao, 1), args.repeticoes)),
+        ("exportar_para_dict", medir(lambda: db.exportar_para_dict(sessao), args.repeticoes)),
+        ("listar_sessoes() completa", medir(db.listar_sessoes, 3)),
+    ]
+    inicio = time.perf_counter()
+    db.deletar_sessao(sessao)
+    resultados.append(("deletar_sessao (cascata)", (time.perf_counter() - inicio) * 1000))
+
+    print(f"\n{'Operação':<30}{'Mediana (ms)':>14}")
+    for nome, ms in resultados:
+        print(f"{nome:<30}{ms:>14.2f}")
+
+    db.fechar()
+    if not args.banco:
+        os.remove(caminho)
+
+
+if __name__ == "__main__":
+    main()
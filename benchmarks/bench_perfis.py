@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark dos perfis do SQLite (database.PERFIS).
+
+Para cada perfil cria um banco temporário e mede a vazão de gravação
+(salvar_sessao_completa, um commit por sessão), importação em massa
+(importar_linhas), carga (exportar_para_dict) e listagem
+(listar_sessoes_pagina).
+
+Uso:
+    python benchmarks/bench_perfis.py
+    python benchmarks/bench_perfis.py --sessoes 500 --linhas 300 --importar 1000000
+    python benchmarks/bench_perfis.py --pasta /mnt/rede/pmpv      # disco onde o banco vai ficar
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import PERFIS, DatabasePMPV
+
+
+def dados_sessao(rng: random.Random, linhas: int):
+    return {mes: [{'empresa': f"EMPRESA {i}", 'molecula': rng.uniform(9, 12), 'transporte': 0.5,
+                   'logistica': 0.3, 'volume': rng.uniform(0, 1e5)} for i in range(linhas)]
+            for mes in (1, 2, 3)}
+
+
+def vazao(funcao, vezes: int) -> float:
+    """Operações por segundo"""
+    inicio = time.perf_counter()
+    for i in range(vezes):
+        funcao(i)
+    return vezes / (time.perf_counter() - inicio)
+
+
+def medir_perfil(perfil: str, pasta: str, args) -> dict:
+    caminho = os.path.join(pasta, f"bench_{perfil}.db")
+    db = DatabasePMPV(caminho, perfil=perfil)
+    rng = random.Random(42)
+    dados = [dados_sessao(rng, args.linhas) for _ in range(10)]
+    resultado = {'volume_total': 1.0, 'pmpv': 11.0, 'custo_total': 11.0}
+
+    medidas = {}
+    medidas['salvar (sessões/s)'] = vazao(
+        lambda i: db.salvar_sessao_completa(f"Trimestre {i}", dados[i % 10], resultado), args.sessoes)
+
+    linhas = ((1 + j % 3, f"EMPRESA {j % 50}", 10.0, 0.5, 0.3, 1000.0) for j in range(args.importar))
+    inicio = time.perf_counter()
+    db.importar_linhas(linhas, "Importação")
+    medidas['importar (linhas/s)'] = args.importar / (time.perf_counter() - inicio)
+
+    ids = [rng.randint(1, args.sessoes) for _ in range(args.leituras)]
+    medidas['carregar (sessões/s)'] = vazao(lambda i: db.exportar_para_dict(ids[i]), args.leituras)
+    medidas['listar 50 (páginas/s)'] = vazao(lambda i: db.listar_sessoes_pagina(limite=50), args.leituras)
+
+    db.fechar()
+    return medidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", type=int, default=200, help="Sessões gravadas (um commit cada)")
+    parser.add_argument("--linhas", type=int, default=100, help="Linhas por mês de cada sessão")
+    parser.add_argument("--importar", type=int, default=300_000, help="Linhas da importação em massa")
+    parser.add_argument("--leituras", type=int, default=500, help="Repetições de carga e listagem")
+    parser.add_argument("--perfis", nargs="+", default=list(PERFIS), choices=list(PERFIS))
+    parser.add_argument("--pasta", help="Pasta dos bancos temporários (padrão: pasta temporária do sistema)")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="pmpv_perfis_", dir=args.pasta)
+    try:
+        resultados = {perfil: medir_perfil(perfil, pasta, args) for perfil in args.perfis}
+    finally:
+        shutil.rmtree(pasta)
+
+    operacoes = list(next(iter(resultados.values())))
+    print(f"\n{'Operação':<24}" + "".join(f"{perfil:>14}" for perfil in resultados))
+    for operacao in operacoes:
+        print(f"{operacao:<24}" + "".join(f"{medidas[operacao]:>14,.0f}" for medidas in resultados.values()))
+    for perfil in resultados:
+        ajustes = ", ".join(f"{k}={v}" for k, v in PERFIS[perfil].items())
+        print(f"\n{perfil}: {ajustes}", end="")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da programação diária (QDC e molécula por dia).
+
+Cria uma sessão com N contratos por mês num trimestre de 91 dias e mede:
+  - gravar as programações (DatabasePMPV.salvar_programacao, BLOBs float64)
+  - ler de volta para matrizes (carregar_programacao)
+  - PMPV ponderado por dia vetorizado (calculo.calcular_programacao)
+  - o mesmo PMPV num laço Python dia a dia (referência)
+
+e confere se o relatório do banco (resumo_mes) chega ao mesmo PMPV.
+
+Uso:
+    python benchmarks/bench_programacao.py
+    python benchmarks/bench_programacao.py --contratos 20000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+from calculo import calcular_programacao, dias_trimestre
+from database import DatabasePMPV
+
+
+def laco_python(volumes, moleculas, tarifa: float) -> float:
+    """PMPV com um objeto Python por dia (como seria sem as matrizes)"""
+    volume = custo = 0.0
+    for qdc, mol in zip(volumes.tolist(), moleculas.tolist()):
+        if qdc > 0:
+            volume += qdc
+            custo += (mol + tarifa) * qdc
+    return custo / volume
+
+
+def cronometrar(nome: str, funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    print(f"{nome:<44}{time.perf_counter() - inicio:>10.3f} s")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contratos", type=int, default=5000, help="Contratos por mês")
+    parser.add_argument("--banco", help="Arquivo do banco (padrão: temporário, apagado no fim)")
+    args = parser.parse_args()
+
+    caminho = args.banco or os.path.join(tempfile.mkdtemp(), "bench_programacao.db")
+    db = DatabasePMPV(caminho, perfil="rapido")
+    rng = np.random.default_rng(42)
+    calendario = {'ano': 2028, 'mes_inicial': 1}
+    dias = dias_trimestre(calendario['mes_inicial'], ano=calendario['ano'])
+
+    linhas = [{'empresa': f"EMPRESA {i % 50}", 'molecula': 10.0, 'transporte': 0.5,
+               'logistica': 0.3, 'volume': 1000.0} for i in range(args.contratos)]
+    sessao_id, ids = db.sincronizar_sessao({mes: {'linhas': linhas} for mes in (1, 2, 3)},
+                                           nome="Programação", calendario=calendario)
+    programacoes = {mes: (rng.uniform(-500, 5000, (args.contratos, dias[mes - 1])),
+                          rng.uniform(9, 12, (args.contratos, dias[mes - 1]))) for mes in (1, 2, 3)}
+    print(f"{args.contratos:,} contratos x {sum(dias)} dias = {args.contratos * sum(dias):,} valores por série\n")
+
+    cronometrar("Gravar (salvar_programacao)", lambda: [
+        db.salvar_programacao(sessao_id, mes, ids[mes], volumes, moleculas)
+        for mes, (volumes, moleculas) in programacoes.items()])
+    lidas = cronometrar("Ler (carregar_programacao)", lambda: [
+        db.carregar_programacao(sessao_id, mes) for mes in (1, 2, 3)])
+
+    def vetorizado():
+        partes = [calcular_programacao(p['volumes'], p['moleculas'], p['transporte'], p['logistica'])
+                  for p in lidas]
+        return sum(p['custo_total'] for p in partes) / sum(p['volume_total'] for p in partes)
+
+    pmpv = cronometrar("PMPV vetorizado (calcular_programacao)", vetorizado)
+    # Todos os contratos têm transporte + logística = 0.8
+    python = cronometrar("PMPV laço Python dia a dia", lambda: laco_python(
+        np.concatenate([p['volumes'].ravel() for p in lidas]),
+        np.concatenate([p['moleculas'].ravel() for p in lidas]), 0.8))
+    banco = db.relatorio_pmpv([sessao_id])[sessao_id]['pmpv']
+
+    print(f"\nPMPV: {pmpv:.6f} | diferença laço Python: {abs(pmpv - python):.2e} "
+          f"| diferença relatório do banco: {abs(pmpv - banco):.2e}")
+    blobs = db.conn.execute(
+        "SELECT SUM(LENGTH(volumes) + IFNULL(LENGTH(moleculas), 0)) FROM programacao_diaria"
+    ).fetchone()[0]
+    print(f"BLOBs: {blobs / 2**20:,.1f} MiB")
+
+    db.fechar()
+    if not args.banco:
+        os.remove(caminho)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark do relatório de PMPV: agregação no SQLite x cálculo em Python.
+
+Compara, para todas as sessões de um banco grande:
+  - SQL: DatabasePMPV.relatorio_pmpv (lê resumo_mes, mantida pelos triggers)
+  - Python por sessão: exportar_para_dict + calcular_trimestre (o caminho da exportação em lote)
+  - Python vetorizado: todas as linhas num cursor + calcular_lote agrupado por sessão
+
+e confere se os três chegam ao mesmo PMPV.
+
+Uso:
+    python benchmarks/bench_relatorio.py                         # 20k sessões, 2M linhas
+    python benchmarks/bench_relatorio.py --sessoes 50000 --linhas 5000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_listagem import popular
+from calculo import calcular_lote, calcular_trimestre
+from database import DatabasePMPV
+
+DIAS = {1: 31, 2: 28, 3: 31}
+
+
+def por_sessao(db: DatabasePMPV) -> dict:
+    pmpv = {}
+    for sessao_id in list(db.iterar_ids_sessoes()):
+        exportado = db.exportar_para_dict(sessao_id)
+        dados = {f"Mês {mes}": exportado['dados'][f"mes_{mes}"] for mes in DIAS}
+        resultado = calcular_trimestre(dados, {f"Mês {mes}": dias for mes, dias in DIAS.items()})
+        pmpv[sessao_id] = resultado['pmpv']
+    return pmpv
+
+
+def vetorizado(db: DatabasePMPV) -> dict:
+    import numpy as np
+
+    linhas = db.conn.execute(
+        "SELECT sessao_id, mes, molecula, transporte, logistica, volume FROM dados_mes"
+    ).fetchall()
+    matriz = np.array(linhas, dtype=np.float64).reshape(-1, 6)
+    ids, grupos = np.unique(matriz[:, 0].astype(np.int64), return_inverse=True)
+    dias = np.select([matriz[:, 1] == mes for mes in DIAS], list(DIAS.values()), 0.0)
+    resultado = calcular_lote(matriz[:, 2], matriz[:, 3], matriz[:, 4], matriz[:, 5], dias,
+                              grupos=grupos, n_grupos=len(ids))
+    return dict(zip(ids.tolist(), resultado['pmpv'].tolist()))
+
+
+def cronometrar(nome: str, funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    segundos = time.perf_counter() - inicio
+    print(f"{nome:<40}{segundos:>10.2f} s")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", type=int, default=20_000)
+    parser.add_argument("--linhas", type=int, default=2_000_000)
+    parser.add_argument("--sem-por-sessao", action="store_true",
+                        help="Pula o caminho por sessão (o mais lento)")
+    parser.add_argument("--banco", help="Arquivo do banco (padrão: temporário, apagado no fim)")
+    args = parser.parse_args()
+
+    caminho = args.banco or os.path.join(tempfile.mkdtemp(), "bench_relatorio.db")
+    novo = not os.path.exists(caminho)
+    db = DatabasePMPV(caminho)
+    if novo:
+        print(f"Populando {args.sessoes:,} sessões e {args.linhas:,} linhas em {caminho}...")
+        popular(db, args.sessoes, args.linhas)
+
+    print(f"\n{'Caminho':<40}{'Tempo':>12}")
+    sql = cronometrar("SQL (relatorio_pmpv)", lambda: db.relatorio_pmpv(dias_por_mes=DIAS))
+    cronometrar("Reconstruir resumo_mes (varredura)", db.reconstruir_resumo)
+    numpy_ = cronometrar("Python vetorizado (calcular_lote)", lambda: vetorizado(db))
+    caminhos = {'vetorizado': numpy_}
+    if not args.sem_por_sessao:
+        caminhos['por sessão'] = cronometrar("Python por sessão (calcular_trimestre)", lambda: por_sessao(db))
+
+    for nome, pmpv in caminhos.items():
+        diferenca = max(abs(sql[s]['pmpv'] - p) for s, p in pmpv.items() if sql.get(s, {}).get('pmpv'))
+        print(f"Maior diferença de PMPV SQL x {nome}: {diferenca:.2e}")
+
+    db.fechar()
+    if not args.banco:
+        os.remove(caminho)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador de carga para o serviço HTTP (servidor.py).
+
+Abre N clientes com conexões keep-alive que repetem uma mistura de
+requisições (cálculo, listagem, sessão e opcionalmente Excel) durante um
+tempo fixo e mostra requisições por segundo e latências (p50, p99).
+
+Uso:
+    python servidor.py --banco /tmp/pmpv_bench.db &
+    python benchmarks/carga_servidor.py --clientes 32 --segundos 10
+    python benchmarks/carga_servidor.py --rotas calcular --linhas 500
+    python benchmarks/carga_servidor.py --iniciar --sessoes 200     # sobe um servidor com banco temporário
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def corpo_calculo(linhas: int, rng: random.Random) -> bytes:
+    dados = {
+        f"Mês {m}": [{'empresa': f"Empresa {i}", 'molecula': rng.uniform(8, 12),
+                      'transporte': rng.uniform(1, 2), 'logistica': rng.uniform(0.1, 0.5),
+                      'volume': rng.uniform(1000, 50000)} for i in range(linhas)]
+        for m in (1, 2, 3)
+    }
+    return json.dumps({'dados': dados, 'dias': [31, 28, 31], 'conta_grafica': -0.021}).encode("utf-8")
+
+
+async def requisitar(leitor, escritor, host, metodo, alvo, corpo=b""):
+    escritor.write(
+        f"{metodo} {alvo} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(corpo)}\r\n\r\n".encode("latin-1") + corpo
+    )
+    await escritor.drain()
+    cabecalho = await leitor.readuntil(b"\r\n\r\n")
+    linhas = cabecalho.decode("latin-1").split("\r\n")
+    status = int(linhas[0].split(" ")[1])
+    tamanho = 0
+    for linha in linhas[1:]:
+        if linha.lower().startswith("content-length:"):
+            tamanho = int(linha.split(":", 1)[1])
+    await leitor.readexactly(tamanho)
+    return status
+
+
+async def cliente(host, porta, rotas, fim, latencias, erros, corpo, ids, rng):
+    leitor, escritor = await asyncio.open_connection(host, porta)
+    try:
+        while time.perf_counter() < fim:
+            rota = rng.choice(rotas)
+            if rota == "calcular":
+                pedido = ("POST", "/calcular", corpo)
+            elif rota == "listar":
+                pedido = ("GET", "/sessoes?limite=50", b"")
+            elif rota == "sessao":
+                pedido = ("GET", f"/sessoes/{rng.choice(ids)}", b"")
+            else:
+                pedido = ("GET", f"/sessoes/{rng.choice(ids)}/excel", b"")
+
+            inicio = time.perf_counter()
+            status = await requisitar(leitor, escritor, host, *pedido)
+            latencias.append(time.perf_counter() - inicio)
+            if status != 200:
+                erros[status] = erros.get(status, 0) + 1
+    finally:
+        escritor.close()
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)]
+
+
+async def medir(args, ids):
+    rng = random.Random(42)
+    corpo = corpo_calculo(args.linhas, rng)
+    latencias, erros = [], {}
+    inicio = time.perf_counter()
+    fim = inicio + args.segundos
+    await asyncio.gather(*(
+        cliente(args.host, args.porta, args.rotas, fim, latencias, erros, corpo, ids, random.Random(i))
+        for i in range(args.clientes)
+    ))
+    segundos = time.perf_counter() - inicio
+
+    print(f"Rotas: {', '.join(args.rotas)} | clientes: {args.clientes} | {segundos:.1f} s")
+    print(f"Requisições:  {len(latencias)} ({len(latencias) / segundos:,.1f} req/s)")
+    if latencias:
+        print(f"Latência:     média {statistics.mean(latencias) * 1000:.1f} ms | "
+              f"p50 {percentil(latencias, 50) * 1000:.1f} ms | "
+              f"p99 {percentil(latencias, 99) * 1000:.1f} ms | "
+              f"máx {max(latencias) * 1000:.1f} ms")
+    if erros:
+        print(f"Respostas com erro: {erros}")
+
+
+def popular(db_path: str, n_sessoes: int, linhas: int):
+    """Banco temporário com sessões para as rotas de consulta"""
+    from database import DatabasePMPV
+
+    rng = random.Random(7)
+    db = DatabasePMPV(db_path)
+    try:
+        for s in range(n_sessoes):
+            dados = {m: [{'empresa': f"Empresa {i}", 'molecula': rng.uniform(8, 12), 'transporte': 1.5,
+                          'logistica': 0.3, 'volume': rng.uniform(1000, 50000)} for i in range(linhas)]
+                     for m in (1, 2, 3)}
+            db.salvar_sessao_completa(f"Trimestre {s}", dados,
+                                      {'volume_total': 1.0, 'custo_total': 11.0, 'pmpv': 11.0})
+    finally:
+        db.fechar()
+
+
+async def com_servidor(args):
+    from servidor import ServicoPMPV
+
+    pasta = tempfile.mkdtemp(prefix="pmpv_carga_")
+    db_path = os.path.join(pasta, "pmpv.db")
+    popular(db_path, args.sessoes, args.linhas)
+    servico = ServicoPMPV(db_path, args.conexoes)
+    servidor = await asyncio.start_server(servico.atender, args.host, args.porta)
+    try:
+        async with servidor:
+            await medir(args, list(range(1, args.sessoes + 1)))
+    finally:
+        servico.fechar()
+        os.remove(db_path)
+        os.rmdir(pasta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga para o serviço HTTP da Calculadora PMPV.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--clientes", type=int, default=32, help="Conexões simultâneas")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--rotas", nargs="+", default=["calcular", "listar", "sessao"],
+                        choices=["calcular", "listar", "sessao", "excel"])
+    parser.add_argument("--linhas", type=int, default=20, help="Linhas por mês (cálculo e sessões geradas)")
+    parser.add_argument("--ids", type=int, nargs="+", default=[1], help="IDs de sessão para /sessoes/<id>")
+    parser.add_argument("--iniciar", action="store_true",
+                        help="Sobe o serviço neste processo, com um banco temporário")
+    parser.add_argument("--sessoes", type=int, default=100, help="Sessões do banco temporário (--iniciar)")
+    parser.add_argument("--conexoes", type=int, default=4, help="Conexões de leitura do serviço (--iniciar)")
+    args = parser.parse_args()
+
+    if args.iniciar:
+        asyncio.run(com_servidor(args))
+    else:
+        asyncio.run(medir(args, args.ids))
+
+
+if __name__ == "__main__":
+    main()
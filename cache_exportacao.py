@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de Exportações Excel
+Guarda as planilhas geradas pelo conteúdo (hash dos dados), para não gerar de novo
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Optional, Sequence
+
+from excel_handler import ExcelHandlerPMPV
+
+
+class CacheExportacao:
+    """
+    Planilhas já geradas, endereçadas pela impressão digital dos dados.
+
+    A chave é o SHA-256 das entradas normalizadas (linhas de cada mês, dias
+    dos meses, conta gráfica e resultado). Os arquivos ficam numa pasta, um
+    por chave; quando a pasta passa do limite de itens ou de bytes, saem os
+    usados há mais tempo (LRU pela data de modificação do arquivo).
+
+    Uma exportação repetida vira uma cópia do arquivo guardado (cópia, e não
+    hard link, para que editar a planilha exportada não altere o cache).
+    A linha "Data:" do resumo continua sendo a da primeira geração.
+    """
+
+    # Mudou o layout da planilha? Aumente para invalidar o que está guardado
+    VERSAO = 1
+
+    def __init__(self, pasta: str = ".pmpv_cache", limite_itens: int = 200,
+                 limite_bytes: int = 200 * 2**20):
+        """
+        Args:
+            pasta: Pasta onde as planilhas ficam guardadas
+            limite_itens: Quantidade máxima de planilhas
+            limite_bytes: Tamanho máximo somado das planilhas
+        """
+        self.pasta = pasta
+        self.limite_itens = limite_itens
+        self.limite_bytes = limite_bytes
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+        # chave -> tamanho, do menos para o mais recentemente usado
+        arquivos = []
+        for nome in os.listdir(pasta):
+            if nome.endswith(".xlsx"):
+                info = os.stat(os.path.join(pasta, nome))
+                arquivos.append((info.st_mtime, nome[:-5], info.st_size))
+        self._itens = OrderedDict((chave, tamanho) for _, chave, tamanho in sorted(arquivos))
+        self._bytes = sum(self._itens.values())
+
+    @classmethod
+    def impressao_digital(cls, dados_por_mes: Dict, resultado: Dict,
+                          dias_por_mes: Optional[Sequence[float]] = None,
+                          conta_grafica: float = 0.0) -> str:
+        """
+        Chave da planilha: muda se qualquer dado que aparece nela mudar.
+
+        Args:
+            dados_por_mes: {"Mês 1": [...], ...} (mesmo formato de exportar_trimestre)
+            resultado: Resultado do cálculo
+            dias_por_mes: Dias de cada mês, na ordem dos meses
+            conta_grafica: Conta gráfica usada no cálculo
+
+        Returns:
+            SHA-256 em hexadecimal
+        """
+        # Mesma conversão da planilha: None vale 0 e "10,5" vale 10.5
+        numero = ExcelHandlerPMPV._numero
+        normalizado = {
+            'versao': cls.VERSAO,
+            'meses': [
+                [mes, [[str(l.get('empresa') or ''), numero(l.get('molecula')),
+                        numero(l.get('transporte')), numero(l.get('logistica')),
+                        numero(l.get('volume'))] for l in dados_por_mes.get(mes, [])]]
+                for mes in ("Mês 1", "Mês 2", "Mês 3")
+            ],
+            'dias': [float(d) for d in dias_por_mes] if dias_por_mes else None,
+            'conta_grafica': float(conta_grafica or 0.0),
+            'resultado': [float(resultado.get(k) or 0.0) for k in ('volume_total', 'custo_total', 'pmpv')]
+        }
+        texto = json.dumps(normalizado, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.pasta, chave + ".xlsx")
+
+    def obter(self, chave: str, destino: str) -> bool:
+        """
+        Copia a planilha guardada para `destino`.
+
+        Returns:
+            True se a chave estava no cache
+        """
+        with self._lock:
+            if chave not in self._itens or not os.path.exists(self._caminho(chave)):
+                self._itens.pop(chave, None)
+                self.falhas += 1
+                return False
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+
+        origem = self._caminho(chave)
+        try:
+            os.utime(origem)  # LRU entre execuções
+            shutil.copyfile(origem, destino)
+        except FileNotFoundError:
+            # Removida por outro processo que usa a mesma pasta
+            with self._lock:
+                self._itens.pop(chave, None)
+                self.acertos -= 1
+                self.falhas += 1
+            return False
+        return True
+
+    def guardar(self, chave: str, arquivo: str):
+        """Guarda uma cópia de `arquivo` com a chave e remove as menos usadas se passar do limite"""
+        # Cópia temporária + rename: outro processo nunca vê o arquivo pela metade
+        fd, temporario = tempfile.mkstemp(suffix=".tmp", dir=self.pasta)
+        os.close(fd)
+        shutil.copyfile(arquivo, temporario)
+        os.replace(temporario, self._caminho(chave))
+
+        with self._lock:
+            self._bytes -= self._itens.pop(chave, 0)
+            self._itens[chave] = os.path.getsize(self._caminho(chave))
+            self._bytes += self._itens[chave]
+            while self._itens and (len(self._itens) > self.limite_itens or self._bytes > self.limite_bytes):
+                antiga, tamanho = self._itens.popitem(last=False)
+                self._bytes -= tamanho
+                try:
+                    os.remove(self._caminho(antiga))
+                except FileNotFoundError:
+                    pass
+
+    def exportar(self, dados_por_mes: Dict, resultado: Dict, nome_arquivo: str = None,
+                 dias_por_mes: Optional[Sequence[float]] = None, conta_grafica: float = 0.0,
+                 progresso: Callable[[float, str], None] = None) -> str:
+        """
+        Igual a ExcelHandlerPMPV.exportar_trimestre (modo streaming), passando pelo cache.
+
+        Returns:
+            Caminho do arquivo criado
+        """
+        if nome_arquivo is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            nome_arquivo = f"PMPV_Trimestral_{timestamp}.xlsx"
+
+        chave = self.impressao_digital(dados_por_mes, resultado, dias_por_mes, conta_grafica)
+        if self.obter(chave, nome_arquivo):
+            print(f"Excel exportado (cache): {nome_arquivo}")
+            return nome_arquivo
+
+        ExcelHandlerPMPV.exportar_trimestre(dados_por_mes, resultado, nome_arquivo,
+                                            progresso=progresso, streaming=True)
+        self.guardar(chave, nome_arquivo)
+        return nome_arquivo
+
+    def estatisticas(self) -> Dict:
+        """Acertos, falhas, planilhas guardadas e bytes ocupados"""
+        with self._lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas,
+                    'itens': len(self._itens), 'bytes': self._bytes}
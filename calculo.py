@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de Cálculo PMPV
+Cálculo vetorizado (NumPy) independente da interface Tkinter
+"""
+
+import calendar
+import math
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Union
+
+# NumPy é importado só nas funções vetorizadas: quem usa apenas o
+# AgregadoTrimestre (ex: `python -m pmpv calc`) não paga o import
+if TYPE_CHECKING:
+    import numpy as np
+
+
+CHAVES_RESULTADO = ('volume_total', 'custo_total', 'pmpv', 'conta_grafica', 'preco_final')
+
+# Mesmo calendário da tela (mapa_dias_padrao em main.py)
+DIAS_POR_MES = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def dias_trimestre(mes_inicial: int, bissexto: bool = False, ano: Optional[int] = None) -> List[int]:
+    """
+    Dias dos 3 meses de um trimestre.
+
+    Args:
+        mes_inicial: Mês inicial (1 = Janeiro ... 12 = Dezembro)
+        bissexto: Fevereiro com 29 dias (ignorado quando `ano` é informado)
+        ano: Ano do mês inicial. Fevereiro segue o seu próprio ano: o trimestre
+             Dezembro/2027 - Fevereiro/2028 tem Fevereiro com 29 dias.
+
+    Returns:
+        [dias do mês 1, dias do mês 2, dias do mês 3]
+    """
+    dias = []
+    for i in range(3):
+        indice = mes_inicial - 1 + i
+        mes = indice % 12
+        if mes == 1 and ano is not None:
+            bissexto = calendar.isleap(ano + indice // 12)
+        dias.append(29 if mes == 1 and bissexto else DIAS_POR_MES[mes])
+    return dias
+
+
+def calcular_lote(molecula: Sequence[float], transporte: Sequence[float],
+                  logistica: Sequence[float], qdc: Sequence[float],
+                  dias: Union[Sequence[float], float],
+                  grupos: Optional[Sequence[int]] = None,
+                  n_grupos: Optional[int] = None,
+                  conta_grafica: Union[Sequence[float], float] = 0.0) -> Dict[str, 'np.ndarray']:
+    """
+    Calcula volume, custo, PMPV e preço final de vários trimestres numa única chamada.
+
+    Cada posição dos arrays é uma linha de contrato. Linhas com QDC <= 0 não
+    entram no cálculo (mesma regra da tela).
+
+    Args:
+        molecula: Preço da molécula por linha (R$/m³)
+        transporte: Preço do transporte por linha (R$/m³)
+        logistica: Preço da logística por linha (R$/m³)
+        qdc: Volume diário por linha (m³/dia)
+        dias: Dias do mês de cada linha (ou um escalar para todas)
+        grupos: Índice do trimestre/unidade de cada linha (0..n_grupos-1).
+                Se None, todas as linhas formam um único trimestre.
+        n_grupos: Quantidade de grupos (se None, usa max(grupos) + 1)
+        conta_grafica: Conta gráfica por grupo (ou um escalar para todos)
+
+    Returns:
+        Dicionário com arrays (um valor por grupo) para cada chave de CHAVES_RESULTADO.
+        PMPV e preço final ficam NaN nos grupos sem volume.
+    """
+    import numpy as np
+    
+    # Estouro vira inf/NaN no resultado (quem chama decide o que fazer), sem RuntimeWarning
+    with np.errstate(over='ignore', invalid='ignore'):
+        qdc = np.asarray(qdc, dtype=np.float64)
+        preco = (np.asarray(molecula, dtype=np.float64)
+                 + np.asarray(transporte, dtype=np.float64)
+                 + np.asarray(logistica, dtype=np.float64))
+        ativa = qdc > 0
+        volume = np.where(ativa, qdc * np.asarray(dias, dtype=np.float64), 0.0)
+        # Só as linhas ativas: preço infinito x volume 0 daria NaN no grupo inteiro
+        custo = np.multiply(preco, volume, out=np.zeros_like(volume), where=ativa)
+
+        if grupos is None:
+            volume_total = np.array([volume.sum()])
+            custo_total = np.array([custo.sum()])
+        else:
+            grupos = np.asarray(grupos, dtype=np.intp)
+            if n_grupos is None:
+                n_grupos = int(grupos.max()) + 1 if grupos.size else 0
+            # bincount devolve inteiros quando não há linhas
+            volume_total = np.bincount(grupos, weights=volume, minlength=n_grupos).astype(np.float64, copy=False)
+            custo_total = np.bincount(grupos, weights=custo, minlength=n_grupos).astype(np.float64, copy=False)
+
+        pmpv = np.full_like(volume_total, np.nan)
+        np.divide(custo_total, volume_total, out=pmpv, where=volume_total > 0)
+        conta = np.broadcast_to(np.asarray(conta_grafica, dtype=np.float64), pmpv.shape)
+        preco_final = pmpv + conta
+
+    return {
+        'volume_total': volume_total,
+        'custo_total': custo_total,
+        'pmpv': pmpv,
+        'conta_grafica': conta,
+        'preco_final': preco_final
+    }
+
+
+def colunas_de_dados(dados_por_mes: Dict[str, List[Dict]],
+                     dias_por_mes: Dict[str, float]) -> Dict[str, 'np.ndarray']:
+    """
+    Converte os dados no formato de dicionários (tela, banco, Excel) em colunas.
+
+    Args:
+        dados_por_mes: {"Mês 1": [{'molecula': ..., 'volume': ...}, ...], ...}
+        dias_por_mes: {"Mês 1": 30, ...}
+
+    Returns:
+        Dicionário com as colunas molecula, transporte, logistica, qdc e dias
+    """
+    import numpy as np
+    
+    linhas = [(l.get('molecula', 0.0), l.get('transporte', 0.0), l.get('logistica', 0.0),
+               l.get('volume', 0.0), dias_por_mes.get(mes, 30))
+              for mes, dados in dados_por_mes.items() for l in dados]
+    matriz = np.array(linhas, dtype=np.float64).reshape(-1, 5)
+
+    return {
+        'molecula': matriz[:, 0],
+        'transporte': matriz[:, 1],
+        'logistica': matriz[:, 2],
+        'qdc': matriz[:, 3],
+        'dias': matriz[:, 4]
+    }
+
+
+def calcular_trimestre(dados_por_mes: Dict[str, List[Dict]], dias_por_mes: Dict[str, float],
+                       conta_grafica: float = 0.0) -> Dict[str, float]:
+    """
+    Calcula um único trimestre a partir dos dados em dicionários.
+
+    Args:
+        dados_por_mes: Dados dos 3 meses (mesmo formato do ExcelHandlerPMPV)
+        dias_por_mes: Dias de cada mês
+        conta_grafica: Conta gráfica / recuperação (R$)
+
+    Returns:
+        Dicionário no formato de `ultimo_resultado` da tela
+    """
+    colunas = colunas_de_dados(dados_por_mes, dias_por_mes)
+    resultado = calcular_lote(conta_grafica=conta_grafica, **colunas)
+    return {chave: float(resultado[chave][0]) for chave in CHAVES_RESULTADO}
+
+
+def calcular_programacao(volumes, moleculas, transporte: Union[Sequence[float], float] = 0.0,
+                         logistica: Union[Sequence[float], float] = 0.0) -> Dict[str, 'np.ndarray']:
+    """
+    PMPV ponderado dia a dia para programações diárias (uma linha por contrato,
+    uma coluna por dia do mês).
+
+    Dias com QDC <= 0 não entram (mesma regra das linhas). Tudo é feito em
+    matrizes NumPy: nenhum objeto Python é criado por dia.
+
+    Args:
+        volumes: QDC de cada dia (linhas x dias)
+        moleculas: Preço da molécula de cada dia (linhas x dias) ou um por linha
+        transporte: Transporte por linha (ou um escalar para todas)
+        logistica: Logística por linha (ou um escalar para todas)
+
+    Returns:
+        Arrays por linha: 'volume', 'custo' e os equivalentes constantes 'qdc'
+        (QDC médio) e 'molecula' (ponderada pelo volume), que reproduzem volume
+        e custo com QDC x dias; por dia: 'volume_dia', 'custo_dia', 'pmpv_dia';
+        e do conjunto: 'volume_total', 'custo_total', 'pmpv' (NaN sem volume).
+    """
+    import numpy as np
+
+    volumes = np.asarray(volumes, dtype=np.float64)
+    if volumes.ndim != 2:
+        raise ValueError(f"volumes deve ser uma matriz linhas x dias, não {volumes.shape}")
+    n_linhas, n_dias = volumes.shape
+    moleculas = np.asarray(moleculas, dtype=np.float64)
+    if moleculas.ndim < 2:
+        moleculas = np.broadcast_to(moleculas.reshape(-1, 1), (n_linhas, 1))
+    fixo = np.broadcast_to(np.asarray(transporte, dtype=np.float64)
+                           + np.asarray(logistica, dtype=np.float64), (n_linhas,))
+
+    ativo = volumes > 0
+    qdc = np.where(ativo, volumes, 0.0)
+    # Só os dias ativos: preço infinito x QDC 0 daria NaN na linha e no dia inteiros
+    custo_molecula = np.multiply(moleculas, qdc, out=np.zeros_like(qdc), where=ativo)
+    custo_fixo = np.multiply(fixo.reshape(-1, 1), qdc, out=np.zeros_like(qdc), where=ativo)
+    volume = qdc.sum(axis=1)
+    custo_linha_molecula = custo_molecula.sum(axis=1)
+    custo = custo_linha_molecula + custo_fixo.sum(axis=1)
+
+    # Sem volume no mês a molécula ponderada não existe: fica a média simples
+    molecula = np.broadcast_to(moleculas, volumes.shape).mean(axis=1) if n_dias else np.zeros(n_linhas)
+    np.divide(custo_linha_molecula, volume, out=molecula, where=volume > 0)
+
+    volume_dia = qdc.sum(axis=0)
+    custo_dia = custo_molecula.sum(axis=0) + custo_fixo.sum(axis=0)
+    pmpv_dia = np.full_like(volume_dia, np.nan)
+    np.divide(custo_dia, volume_dia, out=pmpv_dia, where=volume_dia > 0)
+
+    volume_total = volume.sum()
+    custo_total = custo.sum()
+    return {
+        'volume': volume,
+        'custo': custo,
+        'qdc': volume / n_dias if n_dias else np.zeros(n_linhas),
+        'molecula': molecula,
+        'volume_dia': volume_dia,
+        'custo_dia': custo_dia,
+        'pmpv_dia': pmpv_dia,
+        'volume_total': volume_total,
+        'custo_total': custo_total,
+        'pmpv': custo_total / volume_total if volume_total > 0 else np.nan
+    }
+
+
+class AgregadoTrimestre:
+    """
+    Somas correntes por mês para o PMPV ao vivo.
+
+    Guarda a contribuição diária (custo e QDC) de cada linha e as somas por mês,
+    atualizadas por delta. O volume do mês é QDC x dias, então trocar os dias de
+    um mês não exige percorrer as linhas.
+    """
+
+    # Refaz as somas a partir das contribuições de tempos em tempos,
+    # para não acumular erro de arredondamento das subtrações
+    LIMITE_DELTAS = 100_000
+
+    def __init__(self, meses: Sequence[str], dias_padrao: float = 30):
+        self.dias = {mes: dias_padrao for mes in meses}
+        self.custo_dia = {mes: 0.0 for mes in meses}   # Σ preço x QDC
+        self.qdc = {mes: 0.0 for mes in meses}         # Σ QDC
+        self._contribuicoes = {}                       # chave -> (mes, custo_dia, qdc)
+        self._deltas = 0
+
+    def atualizar_linha(self, chave, mes: str, preco: float, qdc: float):
+        """Registra (ou substitui) a contribuição de uma linha"""
+        self.remover_linha(chave)
+        if qdc > 0:
+            custo = preco * qdc
+            self._contribuicoes[chave] = (mes, custo, qdc)
+            self.custo_dia[mes] += custo
+            self.qdc[mes] += qdc
+        self._contar_delta()
+
+    def remover_linha(self, chave):
+        """Retira a contribuição de uma linha (se houver)"""
+        anterior = self._contribuicoes.pop(chave, None)
+        if anterior:
+            mes, custo, qdc = anterior
+            self.custo_dia[mes] -= custo
+            self.qdc[mes] -= qdc
+            # inf - inf e nan - nan não desfazem a soma: refaz a partir das linhas
+            if not (math.isfinite(self.custo_dia[mes]) and math.isfinite(self.qdc[mes])):
+                self.recalcular()
+
+    def definir_dias(self, mes: str, dias: float):
+        """Atualiza os dias de um mês (bissexto / mês inicial)"""
+        self.dias[mes] = dias
+
+    def recalcular(self):
+        """Refaz as somas por mês a partir das contribuições das linhas"""
+        for mes in self.dias:
+            self.custo_dia[mes] = 0.0
+            self.qdc[mes] = 0.0
+        for mes, custo, qdc in self._contribuicoes.values():
+            self.custo_dia[mes] += custo
+            self.qdc[mes] += qdc
+        self._deltas = 0
+
+    def _contar_delta(self):
+        self._deltas += 1
+        if self._deltas >= self.LIMITE_DELTAS:
+            self.recalcular()
+
+    def resultado(self, conta_grafica: float = 0.0) -> Optional[Dict[str, float]]:
+        """
+        Resultado do trimestre a partir das somas correntes.
+
+        Returns:
+            Dicionário no formato de `ultimo_resultado`, ou None se não há volume
+        """
+        volume_total = sum(self.qdc[mes] * dias for mes, dias in self.dias.items())
+        custo_total = sum(self.custo_dia[mes] * dias for mes, dias in self.dias.items())
+        if volume_total <= 0:
+            return None
+
+        pmpv = custo_total / volume_total
+        return {
+            'volume_total': volume_total,
+            'custo_total': custo_total,
+            'pmpv': pmpv,
+            'conta_grafica': conta_grafica,
+            'preco_final': pmpv + conta_grafica
+        }
+
+
+# Exemplo de uso
+if __name__ == "__main__":
+    import time
+    import numpy as np
+
+    # Teste com um trimestre
+    dados_teste = {
+        'Mês 1': [
+            {'empresa': 'Fornecedor 1', 'molecula': 10.50, 'transporte': 0.50, 'logistica': 0.30, 'volume': 100000},
+            {'empresa': 'Fornecedor 2', 'molecula': 11.20, 'transporte': 0.45, 'logistica': 0.25, 'volume': 80000},
+        ],
+        'Mês 2': [
+            {'empresa': 'Fornecedor 1', 'molecula': 10.50, 'transporte': 0.50, 'logistica': 0.30, 'volume': 100000},
+        ],
+        'Mês 3': []
+    }
+    print(calcular_trimestre(dados_teste, {'Mês 1': 30, 'Mês 2': 31, 'Mês 3': 30}, -0.0210))
+
+    # Recalcular 10.000 trimestres com 50 contratos por mês
+    n_trimestres, n_linhas = 10_000, 150
+    rng = np.random.default_rng(0)
+    total = n_trimestres * n_linhas
+    colunas = {
+        'molecula': rng.uniform(9, 12, total),
+        'transporte': rng.uniform(0, 1, total),
+        'logistica': rng.uniform(0, 2, total),
+        'qdc': rng.uniform(0, 100000, total),
+        'dias': np.tile(np.repeat([30, 31, 30], 50), n_trimestres)
+    }
+    grupos = np.repeat(np.arange(n_trimestres), n_linhas)
+
+    inicio = time.perf_counter()
+    resultado = calcular_lote(grupos=grupos, n_grupos=n_trimestres, **colunas)
+    print(f"{n_trimestres} trimestres em {(time.perf_counter() - inicio) * 1000:.1f} ms")
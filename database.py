@@ -4,40 +4,241 @@ Módulo de Banco de Dados SQLite para a Calculadora PMPV
 Permite salvar e carregar dados entre sessões
 """
 
+import queue
+import re
 import sqlite3
 import json
+import threading
+import unicodedata
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+
+# Ajustes do SQLite por perfil: journal_mode vale para o arquivo, o resto para cada conexão
+# (cache_size negativo = KiB; mmap_size em bytes)
+PERFIS = {
+    # Padrão: o commit só retorna depois de chegar ao disco
+    'duravel': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'cache_size': -16_000,
+                'mmap_size': 0, 'temp_store': 'DEFAULT'},
+    # Tela e serviço: uma queda de energia pode perder o último commit, mas não corrompe o banco
+    'rapido': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -64_000,
+               'mmap_size': 256 * 2**20, 'temp_store': 'MEMORY'},
+    # Importação em massa num banco novo ou descartável: sem fsync, cache grande.
+    # Uma queda de energia no meio pode corromper o arquivo inteiro (não use no banco de produção)
+    'carga': {'journal_mode': 'WAL', 'synchronous': 'OFF', 'cache_size': -256_000,
+              'mmap_size': 256 * 2**20, 'temp_store': 'MEMORY'},
+}
+
+# Versão do esquema gravada em PRAGMA user_version (aumente ao mudar as tabelas)
+VERSAO_ESQUEMA = 5
+
+
+def chave_empresa(nome: str) -> str:
+    """
+    Forma usada para comparar nomes de empresa (tabela empresas_alias).
+    
+    Sem acentos, em maiúsculas e só com letras/dígitos separados por um
+    espaço: "Petrobras S.A." e "PETROBRAS  S A" dão a mesma chave.
+    """
+    sem_acento = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^A-Z0-9]+", " ", sem_acento.upper()).split())
 
 
 class DatabasePMPV:
-    """Gerenciador de banco de dados para o sistema PMPV"""
+    """
+    Gerenciador de banco de dados para o sistema PMPV.
+    
+    Pode ser usado por várias threads ao mesmo tempo: há uma conexão de
+    escrita (uma transação por vez, sob um lock) e um pool de conexões de
+    leitura. Com o journal em WAL as leituras veem o último commit e nunca
+    esperam uma gravação em andamento; cada chamada usa o seu próprio cursor.
+    """
     
-    def __init__(self, db_path: str = "pmpv_data.db"):
+    def __init__(self, db_path: str = "pmpv_data.db", leitores: int = 4, timeout: float = 30.0,
+                 perfil: Union[str, Dict] = "duravel"):
         """
         Inicializa a conexão com o banco de dados.
         
         Args:
             db_path: Caminho para o arquivo do banco de dados
+            leitores: Máximo de conexões de leitura mantidas abertas
+            timeout: Segundos esperando outro processo liberar a escrita (busy_timeout)
+            perfil: Nome de um perfil de PERFIS ou um dicionário com os mesmos PRAGMAs
         """
         self.db_path = db_path
+        self.leitores = leitores
+        self.timeout = timeout
         self.conn = None
-        self.cursor = None
+        self._lock_escrita = threading.RLock()
+        self._lock_leitores = threading.Lock()
+        self._leitores_livres = queue.LifoQueue()
+        self._leitores_abertos = []
+        # Dimensão de empresas: texto digitado/chave -> id (só usado com a trava de escrita)
+        self._ids_empresas = None
+        # Nomes para o autocompletar (None = recarregar do banco)
+        self._nomes_empresas = None
+        if isinstance(perfil, str):
+            if perfil not in PERFIS:
+                raise ValueError(f"Perfil desconhecido: {perfil} (use {', '.join(PERFIS)})")
+            perfil = PERFIS[perfil]
+        self.perfil = dict(PERFIS['duravel'], **perfil)
+        # Banco em memória só existe na conexão que o criou: lê pela de escrita
+        self._memoria = db_path == ":memory:" or "mode=memory" in db_path
         self._conectar()
         self._criar_tabelas()
     
-    def _conectar(self):
-        """Estabelece conexão com o banco de dados"""
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
+    def _nova_conexao(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               uri=self.db_path.startswith("file:"))
         # Permite acessar colunas por nome
-        self.conn.row_factory = sqlite3.Row
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+        # Sem isso o ON DELETE CASCADE não apaga os meses/resultados da sessão
+        conn.execute("PRAGMA foreign_keys = ON")
+        for pragma in ('synchronous', 'cache_size', 'mmap_size', 'temp_store'):
+            conn.execute(f"PRAGMA {pragma} = {self.perfil[pragma]}")
+        return conn
+    
+    def _conectar(self):
+        """Abre a conexão de escrita e aplica o journal_mode do perfil (WAL por padrão)"""
+        self.conn = self._nova_conexao()
+        if not self._memoria:
+            self.conn.execute(f"PRAGMA journal_mode = {self.perfil['journal_mode']}")
+    
+    @contextmanager
+    def _transacao(self):
+        """
+        Transação na conexão de escrita: commit no fim, rollback se der erro.
+        
+        BEGIN IMMEDIATE pega a trava de escrita logo no início (esperando até
+        `timeout` por outro processo), então a transação nunca falha no meio
+        por "database is locked".
+        """
+        with self._lock_escrita:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                yield cursor
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                # Empresas inseridas nesta transação não existem mais
+                self._ids_empresas = None
+                self._nomes_empresas = None
+                raise
+            finally:
+                cursor.close()
+    
+    @contextmanager
+    def _leitura(self):
+        """Cursor numa conexão de leitura do pool (aberta sob demanda, devolvida no fim)"""
+        if self._memoria:
+            with self._lock_escrita:
+                cursor = self.conn.cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+            return
+        
+        conn = self._obter_leitor()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            # Sem transação de leitura aberta, o próximo uso vê o último commit
+            if conn.in_transaction:
+                conn.rollback()
+            self._devolver_leitor(conn)
+    
+    def _obter_leitor(self) -> sqlite3.Connection:
+        try:
+            return self._leitores_livres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock_leitores:
+            if len(self._leitores_abertos) < self.leitores:
+                conn = self._nova_conexao()
+                conn.execute("PRAGMA query_only = ON")
+                self._leitores_abertos.append(conn)
+                return conn
+        try:
+            return self._leitores_livres.get(timeout=self.timeout)
+        except queue.Empty:
+            # Todas presas (ex: geradores aninhados na mesma thread): uma avulsa evita o impasse
+            conn = self._nova_conexao()
+            conn.execute("PRAGMA query_only = ON")
+            return conn
+    
+    def _devolver_leitor(self, conn: sqlite3.Connection):
+        if conn in self._leitores_abertos:
+            self._leitores_livres.put(conn)
+        else:
+            conn.close()
     
     def _criar_tabelas(self):
-        """Cria as tabelas necessárias se não existirem"""
+        """
+        Cria ou atualiza as tabelas, só quando o banco está numa versão antiga.
         
+        Um banco já em VERSAO_ESQUEMA abre com uma única leitura de
+        PRAGMA user_version, sem DDL nem transação de escrita.
+        """
+        if self._versao_esquema(self.conn) == VERSAO_ESQUEMA:
+            return
+        with self._transacao() as cursor:
+            # Relido com a trava de escrita: outro processo pode ter migrado antes
+            versao = self._versao_esquema(cursor)
+            if versao > VERSAO_ESQUEMA:
+                raise RuntimeError(
+                    f"Banco {self.db_path} está na versão {versao} do esquema; "
+                    f"esta versão do programa só conhece até a {VERSAO_ESQUEMA}."
+                )
+            self._migrar(cursor, versao)
+            cursor.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+    
+    @staticmethod
+    def _versao_esquema(conexao) -> int:
+        return conexao.execute("PRAGMA user_version").fetchone()[0]
+    
+    def _migrar(self, cursor: sqlite3.Cursor, versao: int):
+        """Aplica, em ordem, as mudanças de esquema posteriores a `versao`"""
+        if versao < 1:
+            # Versão 1: esquema completo (bancos sem versão já podem ter parte das tabelas)
+            self._criar_esquema_v1(cursor)
+        if versao < 2:
+            # Versão 2: somas por sessão/mês mantidas por triggers
+            self._apagar_orfaos(cursor)
+            self._criar_resumo_mes(cursor)
+            self._reconstruir_resumo_em(cursor)
+        if versao < 3:
+            # Versão 3: empresa em tabela própria, dados_mes guarda só o id
+            self._criar_empresas(cursor)
+            self._migrar_dados_mes_v3(cursor)
+        if versao < 4:
+            # Versão 4: calendário do trimestre gravado na sessão
+            self._adicionar_calendario(cursor)
+        if versao < 5:
+            # Versão 5: programação diária (QDC e molécula por dia) de linhas de dados_mes
+            self._criar_programacao_diaria(cursor)
+    
+    @staticmethod
+    def _apagar_orfaos(cursor: sqlite3.Cursor):
+        """
+        Apaga meses e resultados de sessões que não existem mais.
+        
+        Versões antigas gravavam com foreign_keys desligado, então
+        deletar_sessao deixava essas linhas para trás; com as chaves
+        estrangeiras ligadas, copiá-las para resumo_mes falharia.
+        """
+        for tabela in ('dados_mes', 'resultados'):
+            cursor.execute(f"DELETE FROM {tabela} WHERE sessao_id NOT IN (SELECT id FROM sessoes)")
+    
+    def _criar_esquema_v1(self, cursor: sqlite3.Cursor):
         # Tabela de sessões (trimestres salvos)
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS sessoes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 nome TEXT NOT NULL,
@@ -48,7 +249,7 @@ class DatabasePMPV:
         """)
         
         # Tabela de dados por mês
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS dados_mes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 sessao_id INTEGER NOT NULL,
@@ -63,7 +264,7 @@ class DatabasePMPV:
         """)
         
         # Tabela de resultados calculados
-        self.cursor.execute("""
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS resultados (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 sessao_id INTEGER NOT NULL,
@@ -75,7 +276,593 @@ class DatabasePMPV:
             )
         """)
         
-        self.conn.commit()
+        # Arquivos já importados em lote (hash do conteúdo -> sessão criada)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS importacoes (
+                hash TEXT PRIMARY KEY,
+                arquivo TEXT NOT NULL,
+                sessao_id INTEGER,
+                linhas INTEGER,
+                erro TEXT,
+                data_importacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (sessao_id) REFERENCES sessoes (id) ON DELETE CASCADE
+            )
+        """)
+        
+        # Índices (bancos antigos ganham os índices na próxima abertura)
+        # dados_mes: filtro por sessão/mês; a ordem por id vem de graça (rowid)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_dados_mes_sessao_mes
+            ON dados_mes (sessao_id, mes)
+        """)
+        
+        # resultados: cobre a busca do último resultado de cada sessão
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_resultados_sessao_data
+            ON resultados (sessao_id, data_calculo, id, volume_total, pmpv_trimestral, custo_total)
+        """)
+        
+        # sessoes: listagem pela data de modificação mais recente
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sessoes_modificacao
+            ON sessoes (data_modificacao, id)
+        """)
+        
+        self._criar_busca_textual(cursor)
+    
+    def _criar_busca_textual(self, cursor: sqlite3.Cursor):
+        """Índice FTS5 sobre nome/observações das sessões, mantido por triggers"""
+        ja_existe = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sessoes_fts'"
+        ).fetchone()
+        
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS sessoes_fts USING fts5(
+                nome, observacoes, content='sessoes', content_rowid='id'
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS sessoes_fts_insert AFTER INSERT ON sessoes BEGIN
+                INSERT INTO sessoes_fts (rowid, nome, observacoes)
+                VALUES (new.id, new.nome, new.observacoes);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS sessoes_fts_delete AFTER DELETE ON sessoes BEGIN
+                INSERT INTO sessoes_fts (sessoes_fts, rowid, nome, observacoes)
+                VALUES ('delete', old.id, old.nome, old.observacoes);
+            END
+        """)
+        # Só nome/observações: salvar (data_modificacao) não mexe no índice
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS sessoes_fts_update
+            AFTER UPDATE OF nome, observacoes ON sessoes BEGIN
+                INSERT INTO sessoes_fts (sessoes_fts, rowid, nome, observacoes)
+                VALUES ('delete', old.id, old.nome, old.observacoes);
+                INSERT INTO sessoes_fts (rowid, nome, observacoes)
+                VALUES (new.id, new.nome, new.observacoes);
+            END
+        """)
+        
+        # Banco antigo: indexa as sessões que já existiam
+        if not ja_existe:
+            cursor.execute("INSERT INTO sessoes_fts (sessoes_fts) VALUES ('rebuild')")
+    
+    def _criar_resumo_mes(self, cursor: sqlite3.Cursor):
+        """
+        Tabela resumo_mes (uma linha por sessão/mês) e os triggers que a mantêm.
+        
+        Guarda as somas diárias, como o AgregadoTrimestre: volume_dia = Σ QDC
+        e custo_dia = Σ preço x QDC (só linhas com QDC > 0) e `linhas` (todas
+        as linhas do mês). Volume e custo do mês são essas somas x dias do mês.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS resumo_mes (
+                sessao_id INTEGER NOT NULL,
+                mes INTEGER NOT NULL,
+                volume_dia REAL NOT NULL DEFAULT 0,
+                custo_dia REAL NOT NULL DEFAULT 0,
+                linhas INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (sessao_id, mes),
+                FOREIGN KEY (sessao_id) REFERENCES sessoes (id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        """)
+        
+        # Contribuição de uma linha (new/old) para as somas do mês
+        volume = "CASE WHEN {l}.volume > 0 THEN {l}.volume ELSE 0 END"
+        custo = ("CASE WHEN {l}.volume > 0 THEN (COALESCE({l}.molecula, 0) + COALESCE({l}.transporte, 0)"
+                 " + COALESCE({l}.logistica, 0)) * {l}.volume ELSE 0 END")
+        somar = f"""
+            INSERT INTO resumo_mes (sessao_id, mes, volume_dia, custo_dia, linhas)
+            VALUES (new.sessao_id, new.mes, {volume.format(l='new')}, {custo.format(l='new')}, 1)
+            ON CONFLICT (sessao_id, mes) DO UPDATE SET
+                volume_dia = volume_dia + excluded.volume_dia,
+                custo_dia = custo_dia + excluded.custo_dia,
+                linhas = linhas + 1;
+        """
+        # O mês que fica sem linhas sai da tabela (e zera o erro de arredondamento das subtrações)
+        subtrair = f"""
+            UPDATE resumo_mes SET
+                volume_dia = volume_dia - {volume.format(l='old')},
+                custo_dia = custo_dia - {custo.format(l='old')},
+                linhas = linhas - 1
+            WHERE sessao_id = old.sessao_id AND mes = old.mes;
+            DELETE FROM resumo_mes WHERE sessao_id = old.sessao_id AND mes = old.mes AND linhas <= 0;
+        """
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS resumo_mes_insert AFTER INSERT ON dados_mes BEGIN
+                {somar}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS resumo_mes_delete AFTER DELETE ON dados_mes BEGIN
+                {subtrair}
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS resumo_mes_update
+            AFTER UPDATE OF sessao_id, mes, molecula, transporte, logistica, volume ON dados_mes BEGIN
+                {subtrair}
+                {somar}
+            END
+        """)
+    
+    def _criar_empresas(self, cursor: sqlite3.Cursor):
+        """
+        Dimensão de empresas: empresas (id, nome de exibição) e empresas_alias.
+        
+        Cada nome digitado é procurado pela sua chave_empresa em empresas_alias;
+        grafias diferentes da mesma empresa apontam para o mesmo id
+        (veja unificar_empresas).
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS empresas (
+                id INTEGER PRIMARY KEY,
+                nome TEXT NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS empresas_alias (
+                chave TEXT PRIMARY KEY,
+                empresa_id INTEGER NOT NULL,
+                FOREIGN KEY (empresa_id) REFERENCES empresas (id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_empresas_alias_empresa
+            ON empresas_alias (empresa_id)
+        """)
+    
+    def _migrar_dados_mes_v3(self, cursor: sqlite3.Cursor):
+        """
+        Troca dados_mes.empresa (texto) por empresa_id, preservando ids e sequência.
+        
+        O SQLite não altera o tipo de uma coluna: a tabela é recriada, copiada
+        numa única instrução INSERT ... SELECT e renomeada; o índice e os
+        triggers de resumo_mes são recriados sobre a tabela nova.
+        """
+        # Linhas de sessões apagadas com foreign_keys desligado não passam para a tabela nova
+        textos = [row[0] for row in cursor.execute(
+            "SELECT DISTINCT d.empresa FROM dados_mes d JOIN sessoes s ON s.id = d.sessao_id")]
+        cursor.execute("CREATE TEMP TABLE mapa_empresas (empresa TEXT PRIMARY KEY, empresa_id INTEGER NOT NULL)")
+        cursor.executemany("INSERT INTO temp.mapa_empresas VALUES (?, ?)",
+                           [(texto, self._id_empresa(cursor, texto)) for texto in textos])
+        
+        cursor.execute("""
+            CREATE TABLE dados_mes_v3 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sessao_id INTEGER NOT NULL,
+                mes INTEGER NOT NULL,  -- 1, 2 ou 3
+                empresa_id INTEGER NOT NULL,
+                molecula REAL,
+                transporte REAL,
+                logistica REAL,
+                volume REAL,
+                FOREIGN KEY (sessao_id) REFERENCES sessoes (id) ON DELETE CASCADE,
+                FOREIGN KEY (empresa_id) REFERENCES empresas (id)
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO dados_mes_v3 (id, sessao_id, mes, empresa_id, molecula, transporte, logistica, volume)
+            SELECT d.id, d.sessao_id, d.mes, m.empresa_id, d.molecula, d.transporte, d.logistica, d.volume
+            FROM dados_mes d
+            JOIN sessoes s ON s.id = d.sessao_id
+            JOIN temp.mapa_empresas m ON m.empresa = d.empresa
+            ORDER BY d.id
+        """)
+        
+        # O próximo id continua de onde a tabela antiga parou (linhas apagadas não voltam)
+        row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'dados_mes'").fetchone()
+        sequencia = row[0] if row else 0
+        
+        # Sem os triggers, apagar a tabela antiga não mexe em resumo_mes (os ids não mudam)
+        for trigger in ('resumo_mes_insert', 'resumo_mes_delete', 'resumo_mes_update'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DROP TABLE dados_mes")
+        cursor.execute("DROP TABLE temp.mapa_empresas")
+        cursor.execute("ALTER TABLE dados_mes_v3 RENAME TO dados_mes")
+        cursor.execute("""
+            UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'dados_mes'
+        """, (sequencia,))
+        if sequencia and cursor.rowcount == 0:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('dados_mes', ?)", (sequencia,))
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_dados_mes_sessao_mes
+            ON dados_mes (sessao_id, mes)
+        """)
+        self._criar_resumo_mes(cursor)
+    
+    @staticmethod
+    def _adicionar_calendario(cursor: sqlite3.Cursor):
+        """
+        Colunas do calendário em sessoes: ano e mês inicial do trimestre e os
+        dias de cada mês. Sessões antigas ficam com NULL (calendário
+        desconhecido: as somas usam 30 dias, como antes).
+        """
+        existentes = {row[1] for row in cursor.execute("PRAGMA table_info(sessoes)")}
+        for coluna in ('ano', 'mes_inicial', 'dias_mes_1', 'dias_mes_2', 'dias_mes_3'):
+            if coluna not in existentes:
+                cursor.execute(f"ALTER TABLE sessoes ADD COLUMN {coluna} INTEGER")
+    
+    @staticmethod
+    def _criar_programacao_diaria(cursor: sqlite3.Cursor):
+        """
+        Tabela programacao_diaria: uma linha por contrato com programação.
+        
+        volumes e moleculas são float64 little-endian empacotados (8 bytes por
+        dia do mês); moleculas NULL = molécula constante da linha. A linha de
+        dados_mes guarda os equivalentes (QDC médio e molécula ponderada pelo
+        volume), então resumo_mes e os relatórios continuam exatos. Mudar
+        volume ou molécula da linha por fora descarta a programação.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS programacao_diaria (
+                linha_id INTEGER PRIMARY KEY,
+                volumes BLOB NOT NULL,
+                moleculas BLOB,
+                FOREIGN KEY (linha_id) REFERENCES dados_mes (id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS programacao_diaria_descartar
+            AFTER UPDATE OF volume, molecula ON dados_mes
+            WHEN new.volume IS NOT old.volume OR new.molecula IS NOT old.molecula BEGIN
+                DELETE FROM programacao_diaria WHERE linha_id = new.id;
+            END
+        """)
+    
+    # --- CALENDÁRIO ---
+    @staticmethod
+    def _gravar_calendario(cursor: sqlite3.Cursor, sessao_id: int, calendario: Dict):
+        """
+        Grava o calendário da sessão (chaves ano, mes_inicial e dias, todas opcionais).
+        
+        Sem 'dias', os dias saem de calculo.dias_trimestre(mes_inicial, ano=ano).
+        """
+        ano = calendario.get('ano')
+        mes_inicial = calendario.get('mes_inicial')
+        dias = calendario.get('dias')
+        if mes_inicial is not None and not 1 <= int(mes_inicial) <= 12:
+            raise ValueError(f"Mês inicial inválido: {mes_inicial}")
+        if dias is None and mes_inicial is not None:
+            from calculo import dias_trimestre
+            dias = dias_trimestre(int(mes_inicial), ano=ano)
+        dias = list(dias) if dias is not None else [None, None, None]
+        if len(dias) != 3:
+            raise ValueError(f"Informe os dias dos 3 meses: {dias}")
+        DatabasePMPV._conferir_dias_programacao(cursor, sessao_id, dias)
+        cursor.execute("""
+            UPDATE sessoes SET ano = ?, mes_inicial = ?, dias_mes_1 = ?, dias_mes_2 = ?, dias_mes_3 = ?
+            WHERE id = ?
+        """, (ano, mes_inicial, *dias, sessao_id))
+    
+    @staticmethod
+    def _conferir_dias_programacao(cursor: sqlite3.Cursor, sessao_id: int, dias: List[Optional[int]]):
+        """Programações diárias já gravadas fixam os dias do seu mês"""
+        for mes, dias_programacao in cursor.execute("""
+            SELECT DISTINCT d.mes, LENGTH(p.volumes) / 8
+            FROM dados_mes d
+            JOIN programacao_diaria p ON p.linha_id = d.id
+            WHERE d.sessao_id = ?
+        """, (sessao_id,)).fetchall():
+            if 1 <= mes <= 3 and dias[mes - 1] != dias_programacao:
+                raise ValueError(f"O mês {mes} tem programação diária de {dias_programacao} dias")
+    
+    def definir_calendario(self, sessao_id: int, ano: Optional[int] = None,
+                           mes_inicial: Optional[int] = None,
+                           dias: Optional[Sequence[int]] = None) -> bool:
+        """
+        Grava o calendário de uma sessão já salva (ex: sessões de antes da versão 4).
+        
+        Args:
+            sessao_id: ID da sessão
+            ano: Ano do mês inicial
+            mes_inicial: Mês inicial do trimestre (1-12)
+            dias: Dias dos 3 meses (padrão: calculados a partir de mes_inicial e ano)
+            
+        Returns:
+            True se gravou com sucesso
+        """
+        try:
+            with self._transacao() as cursor:
+                self._gravar_calendario(cursor, sessao_id,
+                                        {'ano': ano, 'mes_inicial': mes_inicial, 'dias': dias})
+                if cursor.rowcount == 0:
+                    raise ValueError(f"Sessão não encontrada: {sessao_id}")
+            return True
+        except Exception as e:
+            print(f"Erro ao gravar calendário: {e}")
+            return False
+    
+    # Dias do mês {mes} da sessão `s` (30 quando o calendário não foi gravado)
+    _DIAS_MES_SESSAO = ("COALESCE(CASE {mes} WHEN 1 THEN s.dias_mes_1 WHEN 2 THEN s.dias_mes_2 "
+                        "WHEN 3 THEN s.dias_mes_3 END, 30)")
+    
+    def _sql_dias(self, tabela: str, dias_por_mes: Union[Dict[int, float], Sequence[float], None]
+                  ) -> Tuple[str, str, List]:
+        """
+        (junção, expressão dos dias do mês, parâmetros da junção) para as linhas de `tabela`.
+        
+        Sem dias_por_mes, cada sessão usa os dias do seu calendário gravado.
+        """
+        if dias_por_mes is None:
+            return (f"JOIN sessoes s ON s.id = {tabela}.sessao_id",
+                    self._DIAS_MES_SESSAO.format(mes=f"{tabela}.mes"), [])
+        juncao = (f"JOIN (SELECT 1 AS mes, ? AS dias UNION ALL SELECT 2, ? UNION ALL SELECT 3, ?) dias "
+                  f"ON dias.mes = {tabela}.mes")
+        return juncao, "dias.dias", self._dias_por_mes(dias_por_mes)
+    
+    # --- PROGRAMAÇÃO DIÁRIA ---
+    def salvar_programacao(self, sessao_id: int, mes: int, linha_ids: Sequence[int],
+                           volumes, moleculas=None) -> bool:
+        """
+        Grava a programação diária (QDC e, opcionalmente, molécula de cada dia)
+        de linhas já salvas de um mês.
+        
+        As matrizes vão para o banco como BLOBs (uma por linha, sem um objeto
+        Python por dia). A linha de dados_mes passa a ter os equivalentes
+        constantes (calculo.calcular_programacao), que os triggers levam para
+        resumo_mes. O número de dias deve ser o do mês no calendário da
+        sessão; sem calendário, a programação define os dias do mês.
+        
+        Args:
+            sessao_id: ID da sessão
+            mes: Número do mês (1, 2 ou 3)
+            linha_ids: IDs das linhas em dados_mes (uma por linha das matrizes)
+            volumes: QDC por dia, matriz linhas x dias (array NumPy, lista de listas...)
+            moleculas: Molécula por dia, mesma forma (None = molécula constante da linha)
+            
+        Returns:
+            True se gravou com sucesso
+        """
+        import numpy as np
+        from calculo import calcular_programacao
+        
+        try:
+            if mes not in (1, 2, 3):
+                raise ValueError(f"Mês inválido: {mes}")
+            linha_ids = [int(i) for i in linha_ids]
+            volumes = np.ascontiguousarray(volumes, dtype='<f8')
+            if volumes.ndim != 2 or volumes.shape[0] != len(linha_ids):
+                raise ValueError(f"volumes deve ter {len(linha_ids)} linhas x dias, não {volumes.shape}")
+            if moleculas is not None:
+                moleculas = np.ascontiguousarray(moleculas, dtype='<f8')
+                if moleculas.shape != volumes.shape:
+                    raise ValueError(f"moleculas deve ter a forma {volumes.shape}, não {moleculas.shape}")
+            n_dias = volumes.shape[1]
+            
+            with self._transacao() as cursor:
+                row = cursor.execute(f"SELECT dias_mes_{mes} FROM sessoes WHERE id = ?", (sessao_id,)).fetchone()
+                if row is None:
+                    raise ValueError(f"Sessão não encontrada: {sessao_id}")
+                if row[0] is not None and row[0] != n_dias:
+                    raise ValueError(f"O mês {mes} da sessão tem {row[0]} dias, a programação tem {n_dias}")
+                cursor.execute(f"""
+                    UPDATE sessoes SET dias_mes_{mes} = ?, data_modificacao = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (n_dias, sessao_id))
+                
+                cursor.execute("""
+                    SELECT id, molecula, transporte, logistica FROM dados_mes
+                    WHERE sessao_id = ? AND mes = ? AND id IN (SELECT value FROM json_each(?))
+                """, (sessao_id, mes, json.dumps(linha_ids)))
+                linhas = {row[0]: row[1:] for row in cursor.fetchall()}
+                faltando = [i for i in linha_ids if i not in linhas]
+                if faltando:
+                    raise ValueError(f"Linhas que não são do mês {mes} da sessão {sessao_id}: {faltando[:10]}")
+                
+                constantes = np.array([[v or 0.0 for v in linhas[i]] for i in linha_ids],
+                                      dtype=np.float64).reshape(-1, 3)
+                calculo = calcular_programacao(volumes, constantes[:, 0] if moleculas is None else moleculas,
+                                               constantes[:, 1], constantes[:, 2])
+                
+                # Primeiro os equivalentes (o trigger descarta a programação anterior), depois os BLOBs
+                cursor.executemany(
+                    "UPDATE dados_mes SET volume = ?, molecula = ? WHERE id = ?",
+                    zip(calculo['qdc'].tolist(), calculo['molecula'].tolist(), linha_ids)
+                )
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO programacao_diaria (linha_id, volumes, moleculas)
+                    VALUES (?, ?, ?)
+                """, ((linha_id, volumes[i].tobytes(), None if moleculas is None else moleculas[i].tobytes())
+                      for i, linha_id in enumerate(linha_ids)))
+            return True
+        except Exception as e:
+            print(f"Erro ao salvar programação: {e}")
+            return False
+    
+    def carregar_programacao(self, sessao_id: int, mes: int) -> Optional[Dict]:
+        """
+        Lê as programações diárias de um mês direto para matrizes NumPy.
+        
+        Args:
+            sessao_id: ID da sessão
+            mes: Número do mês (1, 2 ou 3)
+            
+        Returns:
+            {'id': ids das linhas, 'volumes' e 'moleculas': matrizes linhas x dias,
+             'transporte' e 'logistica': um valor por linha} (pronto para
+            calculo.calcular_programacao), ou None se o mês não tem programação
+        """
+        import numpy as np
+        
+        with self._leitura() as cursor:
+            cursor.execute("""
+                SELECT d.id, d.molecula, d.transporte, d.logistica, p.volumes, p.moleculas
+                FROM dados_mes d
+                JOIN programacao_diaria p ON p.linha_id = d.id
+                WHERE d.sessao_id = ? AND d.mes = ?
+                ORDER BY d.id
+            """, (sessao_id, mes))
+            rows = cursor.fetchall()
+        if not rows:
+            return None
+        
+        ids, molecula, transporte, logistica, blobs_volumes, blobs_moleculas = zip(*rows)
+        n_dias = len(blobs_volumes[0]) // 8
+        volumes = np.frombuffer(b"".join(blobs_volumes), dtype='<f8').reshape(len(rows), n_dias)
+        # Linhas sem molécula diária: a constante da linha repetida nos dias
+        moleculas = np.frombuffer(b"".join(
+            m if m is not None else np.full(n_dias, mol or 0.0, dtype='<f8').tobytes()
+            for m, mol in zip(blobs_moleculas, molecula)
+        ), dtype='<f8').reshape(len(rows), n_dias)
+        return {
+            'id': np.array(ids, dtype=np.int64),
+            'volumes': volumes,
+            'moleculas': moleculas,
+            'transporte': np.array([v or 0.0 for v in transporte], dtype=np.float64),
+            'logistica': np.array([v or 0.0 for v in logistica], dtype=np.float64),
+        }
+    
+    # --- EMPRESAS ---
+    def _id_empresa(self, cursor: sqlite3.Cursor, nome: str) -> int:
+        """
+        Id da empresa com este nome, criando-a se ainda não existe.
+        
+        Chamado dentro da transação de escrita. O cache guarda tanto o texto
+        como veio quanto a chave, então cada grafia é normalizada uma vez.
+        Usa um cursor próprio: pode rodar enquanto `cursor` está num executemany.
+        """
+        cursor = cursor.connection.cursor()
+        if self._ids_empresas is None:
+            self._ids_empresas = dict(cursor.execute("SELECT chave, empresa_id FROM empresas_alias"))
+        
+        empresa_id = self._ids_empresas.get(nome)
+        if empresa_id is not None:
+            return empresa_id
+        
+        chave = chave_empresa(nome)
+        empresa_id = self._ids_empresas.get(chave)
+        if empresa_id is None:
+            # Pode ter sido criada por outro processo depois do cache
+            row = cursor.execute(
+                "SELECT empresa_id FROM empresas_alias WHERE chave = ?", (chave,)
+            ).fetchone()
+            if row:
+                empresa_id = row[0]
+            else:
+                cursor.execute("INSERT INTO empresas (nome) VALUES (?)", (" ".join(nome.split()),))
+                empresa_id = cursor.lastrowid
+                cursor.execute(
+                    "INSERT INTO empresas_alias (chave, empresa_id) VALUES (?, ?)", (chave, empresa_id)
+                )
+                self._nomes_empresas = None
+            self._ids_empresas[chave] = empresa_id
+        self._ids_empresas[nome] = empresa_id
+        return empresa_id
+    
+    def nomes_empresas(self, recarregar: bool = False) -> List[str]:
+        """
+        Nomes das empresas cadastradas, em ordem alfabética (para autocompletar).
+        
+        A lista fica em cache e é relida do banco só quando uma empresa nova é
+        gravada por esta instância ou com `recarregar=True`.
+        """
+        nomes = self._nomes_empresas
+        if nomes is None or recarregar:
+            with self._leitura() as cursor:
+                cursor.execute("SELECT nome FROM empresas WHERE nome != '' ORDER BY nome COLLATE NOCASE")
+                nomes = [row[0] for row in cursor.fetchall()]
+            self._nomes_empresas = nomes
+        return nomes
+    
+    def unificar_empresas(self, nome: str, destino: str) -> bool:
+        """
+        Junta duas grafias da mesma empresa (ex: um erro de digitação).
+        
+        As linhas de `nome` passam para `destino`, e `nome` vira um apelido:
+        gravações futuras com essa grafia já usam o id de `destino`.
+        
+        Args:
+            nome: Grafia a eliminar
+            destino: Empresa que fica (criada se ainda não existe)
+            
+        Returns:
+            True se unificou com sucesso
+        """
+        try:
+            with self._transacao() as cursor:
+                row = cursor.execute(
+                    "SELECT empresa_id FROM empresas_alias WHERE chave = ?", (chave_empresa(nome),)
+                ).fetchone()
+                destino_id = self._id_empresa(cursor, destino)
+                if row and row[0] != destino_id:
+                    origem_id = row[0]
+                    cursor.execute("UPDATE dados_mes SET empresa_id = ? WHERE empresa_id = ?",
+                                   (destino_id, origem_id))
+                    cursor.execute("UPDATE empresas_alias SET empresa_id = ? WHERE empresa_id = ?",
+                                   (destino_id, origem_id))
+                    cursor.execute("DELETE FROM empresas WHERE id = ?", (origem_id,))
+                elif not row:
+                    cursor.execute("INSERT INTO empresas_alias (chave, empresa_id) VALUES (?, ?)",
+                                   (chave_empresa(nome), destino_id))
+            self._ids_empresas = None
+            self._nomes_empresas = None
+            return True
+        except Exception as e:
+            print(f"Erro ao unificar empresas: {e}")
+            return False
+    
+    @staticmethod
+    def _reconstruir_resumo_em(cursor: sqlite3.Cursor, sessao_ids: Optional[List[int]] = None):
+        filtro, parametros = "", []
+        if sessao_ids is not None:
+            filtro = "WHERE sessao_id IN (SELECT value FROM json_each(?))"
+            parametros = [json.dumps(sessao_ids)]
+        cursor.execute(f"DELETE FROM resumo_mes {filtro}", parametros)
+        cursor.execute(f"""
+            INSERT INTO resumo_mes (sessao_id, mes, volume_dia, custo_dia, linhas)
+            SELECT sessao_id, mes,
+                   SUM(CASE WHEN volume > 0 THEN volume ELSE 0 END),
+                   SUM(CASE WHEN volume > 0 THEN (COALESCE(molecula, 0) + COALESCE(transporte, 0)
+                                                  + COALESCE(logistica, 0)) * volume ELSE 0 END),
+                   COUNT(*)
+            FROM dados_mes
+            {filtro}
+            GROUP BY sessao_id, mes
+        """, parametros)
+    
+    def reconstruir_resumo(self, sessao_ids: Optional[Iterable[int]] = None) -> bool:
+        """
+        Refaz resumo_mes a partir de dados_mes (uma varredura agrupada).
+        
+        Os triggers mantêm a tabela em dia; use para conferir/corrigir depois
+        de mexer em dados_mes por fora (ex: com os triggers desligados).
+        
+        Args:
+            sessao_ids: Sessões a refazer (None = todas)
+            
+        Returns:
+            True se refez com sucesso
+        """
+        try:
+            with self._transacao() as cursor:
+                self._reconstruir_resumo_em(cursor, None if sessao_ids is None else list(sessao_ids))
+            return True
+        except Exception as e:
+            print(f"Erro ao reconstruir resumo: {e}")
+            return False
     
     def criar_sessao(self, nome: str, observacoes: str = "") -> int:
         """
@@ -88,12 +875,12 @@ class DatabasePMPV:
         Returns:
             ID da sessão criada
         """
-        self.cursor.execute(
-            "INSERT INTO sessoes (nome, observacoes) VALUES (?, ?)",
-            (nome, observacoes)
-        )
-        self.conn.commit()
-        return self.cursor.lastrowid
+        with self._transacao() as cursor:
+            cursor.execute(
+                "INSERT INTO sessoes (nome, observacoes) VALUES (?, ?)",
+                (nome, observacoes)
+            )
+            return cursor.lastrowid
     
     def salvar_dados_mes(self, sessao_id: int, mes: int, dados: List[Dict]) -> bool:
         """
@@ -108,41 +895,298 @@ class DatabasePMPV:
             True se salvou com sucesso
         """
         try:
-            # Remove dados anteriores deste mês
-            self.cursor.execute(
-                "DELETE FROM dados_mes WHERE sessao_id = ? AND mes = ?",
-                (sessao_id, mes)
-            )
+            with self._transacao() as cursor:
+                # Remove dados anteriores deste mês
+                cursor.execute(
+                    "DELETE FROM dados_mes WHERE sessao_id = ? AND mes = ?",
+                    (sessao_id, mes)
+                )
+                
+                # Insere novos dados
+                for linha in dados:
+                    cursor.execute("""
+                        INSERT INTO dados_mes 
+                        (sessao_id, mes, empresa_id, molecula, transporte, logistica, volume)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, self._valores_linha(cursor, sessao_id, mes, linha))
+                
+                # Atualiza data de modificação
+                cursor.execute(
+                    "UPDATE sessoes SET data_modificacao = CURRENT_TIMESTAMP WHERE id = ?",
+                    (sessao_id,)
+                )
+            return True
+        except Exception as e:
+            print(f"Erro ao salvar dados: {e}")
+            return False
+    
+    def salvar_sessao_completa(self, nome: str, dados_meses: Dict[int, List[Dict]],
+                               resultado: Optional[Dict] = None,
+                               observacoes: str = "",
+                               calendario: Optional[Dict] = None) -> Optional[int]:
+        """
+        Salva a sessão, os 3 meses e o resultado numa única transação.
+        Ou tudo é gravado, ou nada é (um único commit no final).
+        
+        Args:
+            nome: Nome da sessão (ex: "Trimestre Q1 2026")
+            dados_meses: {1: [...], 2: [...], 3: [...]} com os dados das empresas
+            resultado: Resultado do cálculo (chaves volume_total, pmpv, custo_total)
+            observacoes: Observações opcionais
+            calendario: Calendário do trimestre (chaves ano, mes_inicial, dias)
             
-            # Insere novos dados
-            for linha in dados:
-                self.cursor.execute("""
-                    INSERT INTO dados_mes 
-                    (sessao_id, mes, empresa, molecula, transporte, logistica, volume)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    sessao_id,
-                    mes,
-                    linha.get('empresa', ''),
-                    linha.get('molecula', 0.0),
-                    linha.get('transporte', 0.0),
-                    linha.get('logistica', 0.0),
-                    linha.get('volume', 0.0)
-                ))
+        Returns:
+            ID da sessão criada, ou None se não salvou
+        """
+        salvo = self.sincronizar_sessao(
+            {mes: {'linhas': dados} for mes, dados in dados_meses.items()},
+            resultado, nome=nome, observacoes=observacoes, calendario=calendario
+        )
+        return salvo[0] if salvo else None
+    
+    def sincronizar_sessao(self, alteracoes: Dict[int, Dict], resultado: Optional[Dict] = None,
+                           sessao_id: Optional[int] = None, nome: str = "",
+                           observacoes: str = "",
+                           calendario: Optional[Dict] = None) -> Optional[Tuple[int, Dict[int, List[int]]]]:
+        """
+        Grava só o que mudou numa sessão, numa única transação.
+        
+        Linhas com 'id' viram UPSERT (a linha mantém o mesmo id no banco),
+        linhas sem 'id' (ou com o id de uma linha de outra sessão) são
+        inseridas, e os ids em 'removidos' são apagados.
+        Uma linha com 'programacao_de' (id de outra linha, ex: ao salvar como
+        sessão nova) recebe uma cópia da programação diária daquela linha.
+        
+        Args:
+            alteracoes: {mes: {'linhas': [...], 'removidos': [ids]}}
+            resultado: Resultado do cálculo (chaves volume_total, pmpv, custo_total)
+            sessao_id: ID da sessão (se None, cria uma nova sessão com `nome`)
+            nome: Nome da sessão nova
+            observacoes: Observações da sessão nova
+            calendario: Calendário do trimestre (chaves ano, mes_inicial e dias;
+                        None mantém o que já estava gravado)
             
-            # Atualiza data de modificação
-            self.cursor.execute(
-                "UPDATE sessoes SET data_modificacao = CURRENT_TIMESTAMP WHERE id = ?",
-                (sessao_id,)
-            )
+        Returns:
+            (sessao_id, {mes: [id de cada linha de 'linhas', na mesma ordem]}),
+            ou None se não salvou
+        """
+        try:
+            with self._transacao() as cursor:
+                if sessao_id is None:
+                    cursor.execute(
+                        "INSERT INTO sessoes (nome, observacoes) VALUES (?, ?)",
+                        (nome, observacoes)
+                    )
+                    sessao_id = cursor.lastrowid
+                else:
+                    cursor.execute(
+                        "UPDATE sessoes SET data_modificacao = CURRENT_TIMESTAMP WHERE id = ?",
+                        (sessao_id,)
+                    )
+                if calendario:
+                    self._gravar_calendario(cursor, sessao_id, calendario)
+                
+                ids_por_mes = {}
+                copiadas = False
+                for mes, alteracao in alteracoes.items():
+                    linhas = alteracao.get('linhas', [])
+                    
+                    removidos = alteracao.get('removidos', [])
+                    if removidos:
+                        cursor.executemany(
+                            "DELETE FROM dados_mes WHERE id = ? AND sessao_id = ?",
+                            ((id_linha, sessao_id) for id_linha in removidos)
+                        )
+                    
+                    # Um id de outra sessão (ex: modelo ligado à sessão errada) não é
+                    # atualizado: a linha é gravada como nova nesta sessão
+                    alheios = set()
+                    existentes = [l for l in linhas if l.get('id')]
+                    if existentes:
+                        alheios = {row[0] for row in cursor.execute("""
+                            SELECT id FROM dados_mes
+                            WHERE sessao_id != ? AND id IN (SELECT value FROM json_each(?))
+                        """, (sessao_id, json.dumps([l['id'] for l in existentes])))}
+                        existentes = [l for l in existentes if l['id'] not in alheios]
+                    if existentes:
+                        cursor.executemany("""
+                            INSERT INTO dados_mes 
+                            (id, sessao_id, mes, empresa_id, molecula, transporte, logistica, volume)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (id) DO UPDATE SET
+                                empresa_id = excluded.empresa_id,
+                                molecula = excluded.molecula,
+                                transporte = excluded.transporte,
+                                logistica = excluded.logistica,
+                                volume = excluded.volume
+                            WHERE dados_mes.sessao_id = excluded.sessao_id
+                        """, ((l['id'],) + self._valores_linha(cursor, sessao_id, mes, l) for l in existentes))
+                    
+                    novas = [l for l in linhas if not l.get('id') or l['id'] in alheios]
+                    ids_novos = iter(self._inserir_linhas(cursor, sessao_id, mes, novas))
+                    ids_por_mes[mes] = [next(ids_novos) if not l.get('id') or l['id'] in alheios else l['id']
+                                        for l in linhas]
+                    
+                    # Depois dos valores da linha: o UPSERT acima descartaria a cópia
+                    copias = [(id_linha, l['programacao_de'])
+                              for id_linha, l in zip(ids_por_mes[mes], linhas) if l.get('programacao_de')]
+                    if copias:
+                        cursor.executemany("""
+                            INSERT OR REPLACE INTO programacao_diaria (linha_id, volumes, moleculas)
+                            SELECT ?, volumes, moleculas FROM programacao_diaria WHERE linha_id = ?
+                        """, copias)
+                        copiadas = True
+                
+                if copiadas:
+                    dias = cursor.execute(
+                        "SELECT dias_mes_1, dias_mes_2, dias_mes_3 FROM sessoes WHERE id = ?", (sessao_id,)
+                    ).fetchone()
+                    self._conferir_dias_programacao(cursor, sessao_id, list(dias))
+                
+                if resultado:
+                    cursor.execute("""
+                        INSERT INTO resultados 
+                        (sessao_id, volume_total, pmpv_trimestral, custo_total)
+                        VALUES (?, ?, ?, ?)
+                    """, (sessao_id, resultado['volume_total'], resultado['pmpv'],
+                          resultado['custo_total']))
             
-            self.conn.commit()
+            return sessao_id, ids_por_mes
+        except Exception as e:
+            print(f"Erro ao salvar sessão: {e}")
+            return None
+    
+    def _inserir_linhas(self, cursor: sqlite3.Cursor, sessao_id: int, mes: int,
+                        linhas: List[Dict]) -> List[int]:
+        """
+        Insere linhas novas com executemany e devolve os ids que receberam.
+        
+        Os ids são reservados a partir do sqlite_sequence (o mesmo contador do
+        AUTOINCREMENT), dentro da transação de escrita já aberta.
+        """
+        if not linhas:
+            return []
+        
+        row = cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'dados_mes'"
+        ).fetchone()
+        base = row[0] if row else 0
+        ids = list(range(base + 1, base + 1 + len(linhas)))
+        
+        cursor.executemany("""
+            INSERT INTO dados_mes 
+            (id, sessao_id, mes, empresa_id, molecula, transporte, logistica, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, ((id_linha,) + self._valores_linha(cursor, sessao_id, mes, l) for id_linha, l in zip(ids, linhas)))
+        return ids
+    
+    def importar_linhas(self, linhas: Iterable[Tuple], nome: str, observacoes: str = "",
+                        tamanho_lote: int = 5000, resultado: Optional[Dict] = None,
+                        origem: Optional[Tuple[str, str]] = None) -> Optional[int]:
+        """
+        Cria uma sessão e insere as linhas em lotes (executemany), numa única transação.
+        
+        As linhas são consumidas do iterável aos poucos, então um gerador (ex:
+        ExcelHandlerPMPV.iterar_linhas_excel) é gravado com memória constante.
+        
+        Args:
+            linhas: Tuplas (mes, empresa, molecula, transporte, logistica, volume)
+            nome: Nome da sessão
+            observacoes: Observações da sessão
+            tamanho_lote: Linhas por executemany
+            resultado: Resultado a gravar junto (chaves volume_total, pmpv, custo_total)
+            origem: (arquivo, hash) para registrar em `importacoes` na mesma transação
+            
+        Returns:
+            ID da sessão criada, ou None se não importou
+        """
+        try:
+            with self._transacao() as cursor:
+                cursor.execute(
+                    "INSERT INTO sessoes (nome, observacoes) VALUES (?, ?)",
+                    (nome, observacoes)
+                )
+                sessao_id = cursor.lastrowid
+                
+                total = 0
+                linhas = iter(linhas)
+                while True:
+                    lote = [(sessao_id, linha[0], self._id_empresa(cursor, linha[1])) + tuple(linha[2:])
+                            for linha in islice(linhas, tamanho_lote)]
+                    if not lote:
+                        break
+                    cursor.executemany("""
+                        INSERT INTO dados_mes 
+                        (sessao_id, mes, empresa_id, molecula, transporte, logistica, volume)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, lote)
+                    total += len(lote)
+                
+                if resultado:
+                    cursor.execute("""
+                        INSERT INTO resultados 
+                        (sessao_id, volume_total, pmpv_trimestral, custo_total)
+                        VALUES (?, ?, ?, ?)
+                    """, (sessao_id, resultado['volume_total'], resultado['pmpv'],
+                          resultado['custo_total']))
+                
+                if origem:
+                    arquivo, hash_arquivo = origem
+                    self._registrar_importacao(cursor, hash_arquivo, arquivo, sessao_id, total, None)
+            
+            return sessao_id
+        except Exception as e:
+            print(f"Erro ao importar linhas: {e}")
+            return None
+    
+    @staticmethod
+    def _registrar_importacao(cursor: sqlite3.Cursor, hash_arquivo: str, arquivo: str,
+                              sessao_id: Optional[int], linhas: int, erro: Optional[str]):
+        cursor.execute("""
+            INSERT INTO importacoes (hash, arquivo, sessao_id, linhas, erro)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (hash) DO UPDATE SET
+                arquivo = excluded.arquivo,
+                sessao_id = excluded.sessao_id,
+                linhas = excluded.linhas,
+                erro = excluded.erro,
+                data_importacao = CURRENT_TIMESTAMP
+        """, (hash_arquivo, arquivo, sessao_id, linhas, erro))
+    
+    def registrar_erro_importacao(self, hash_arquivo: str, arquivo: str, erro: str) -> bool:
+        """
+        Anota um arquivo que falhou na importação em lote (é tentado de novo na próxima vez).
+        
+        Returns:
+            True se registrou
+        """
+        try:
+            with self._transacao() as cursor:
+                self._registrar_importacao(cursor, hash_arquivo, arquivo, None, 0, erro)
             return True
         except Exception as e:
-            print(f"Erro ao salvar dados: {e}")
-            self.conn.rollback()
+            print(f"Erro ao registrar importação: {e}")
             return False
     
+    def hashes_importados(self) -> set:
+        """Hashes dos arquivos importados com sucesso (sessão ainda existe)"""
+        with self._leitura() as cursor:
+            cursor.execute(
+                "SELECT hash FROM importacoes WHERE erro IS NULL AND sessao_id IS NOT NULL"
+            )
+            return {row[0] for row in cursor.fetchall()}
+    
+    def _valores_linha(self, cursor: sqlite3.Cursor, sessao_id: int, mes: int, linha: Dict) -> Tuple:
+        return (
+            sessao_id,
+            mes,
+            self._id_empresa(cursor, linha.get('empresa', '')),
+            linha.get('molecula', 0.0),
+            linha.get('transporte', 0.0),
+            linha.get('logistica', 0.0),
+            linha.get('volume', 0.0)
+        )
+    
     def carregar_dados_mes(self, sessao_id: int, mes: int) -> List[Dict]:
         """
         Carrega os dados de um mês específico.
@@ -152,16 +1196,18 @@ class DatabasePMPV:
             mes: Número do mês (1, 2 ou 3)
             
         Returns:
-            Lista de dicionários com os dados
+            Lista de dicionários com os dados (inclui o 'id' de cada linha)
         """
-        self.cursor.execute("""
-            SELECT empresa, molecula, transporte, logistica, volume
-            FROM dados_mes
-            WHERE sessao_id = ? AND mes = ?
-            ORDER BY id
-        """, (sessao_id, mes))
-        
-        rows = self.cursor.fetchall()
+        with self._leitura() as cursor:
+            cursor.execute("""
+                SELECT d.id, e.nome AS empresa, d.molecula, d.transporte, d.logistica, d.volume
+                FROM dados_mes d
+                JOIN empresas e ON e.id = d.empresa_id
+                WHERE d.sessao_id = ? AND d.mes = ?
+                ORDER BY d.id
+            """, (sessao_id, mes))
+            
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
     def salvar_resultado(self, sessao_id: int, volume_total: float, 
@@ -179,36 +1225,224 @@ class DatabasePMPV:
             True se salvou com sucesso
         """
         try:
-            self.cursor.execute("""
-                INSERT INTO resultados 
-                (sessao_id, volume_total, pmpv_trimestral, custo_total)
-                VALUES (?, ?, ?, ?)
-            """, (sessao_id, volume_total, pmpv, custo_total))
-            
-            self.conn.commit()
+            with self._transacao() as cursor:
+                cursor.execute("""
+                    INSERT INTO resultados 
+                    (sessao_id, volume_total, pmpv_trimestral, custo_total)
+                    VALUES (?, ?, ?, ?)
+                """, (sessao_id, volume_total, pmpv, custo_total))
             return True
         except Exception as e:
             print(f"Erro ao salvar resultado: {e}")
             return False
     
-    def listar_sessoes(self) -> List[Dict]:
+    # Último resultado salvo de cada sessão ou, sem resultado, as somas de resumo_mes
+    # com os dias do calendário da sessão (subconsultas por sessão: só as sessões
+    # da página são consultadas)
+    _CONSULTA_LISTAGEM = f"""
+        SELECT s.id, s.nome, s.data_criacao, s.data_modificacao, s.observacoes,
+               COALESCE(r.volume_total,
+                        (SELECT SUM(m.volume_dia * {_DIAS_MES_SESSAO.format(mes='m.mes')})
+                         FROM resumo_mes m WHERE m.sessao_id = s.id)
+               ) AS volume_total,
+               COALESCE(r.pmpv_trimestral,
+                        (SELECT SUM(m.custo_dia * {_DIAS_MES_SESSAO.format(mes='m.mes')})
+                                / NULLIF(SUM(m.volume_dia * {_DIAS_MES_SESSAO.format(mes='m.mes')}), 0)
+                         FROM resumo_mes m WHERE m.sessao_id = s.id)
+               ) AS pmpv_trimestral,
+               COALESCE(r.custo_total,
+                        (SELECT SUM(m.custo_dia * {_DIAS_MES_SESSAO.format(mes='m.mes')})
+                         FROM resumo_mes m WHERE m.sessao_id = s.id)
+               ) AS custo_total,
+               (SELECT COALESCE(SUM(m.linhas), 0) FROM resumo_mes m WHERE m.sessao_id = s.id) AS linhas
+        FROM sessoes s
+        LEFT JOIN resultados r ON r.id = (
+            SELECT r2.id FROM resultados r2
+            WHERE r2.sessao_id = s.id
+            ORDER BY r2.data_calculo DESC, r2.id DESC
+            LIMIT 1
+        )
+        {{where}}
+        ORDER BY s.data_modificacao DESC, s.id DESC
+        LIMIT ?
+    """
+    
+    def listar_sessoes(self, limite: Optional[int] = None) -> List[Dict]:
         """
-        Lista todas as sessões salvas.
+        Lista as sessões salvas, cada uma com o seu resultado mais recente.
         
-        Returns:
-            Lista de dicionários com informações das sessões
-        """
-        self.cursor.execute("""
-            SELECT s.id, s.nome, s.data_criacao, s.data_modificacao, s.observacoes,
-                   r.volume_total, r.pmpv_trimestral, r.custo_total
-            FROM sessoes s
-            LEFT JOIN resultados r ON s.id = r.sessao_id
-            ORDER BY s.data_modificacao DESC
-        """)
+        Sessões sem resultado salvo trazem volume, custo e PMPV das somas de
+        resumo_mes (mantidas pelos triggers), como listar_sessoes_pagina.
+        
+        Args:
+            limite: Quantidade máxima de sessões (None = todas)
         
-        rows = self.cursor.fetchall()
+        Returns:
+            Lista de dicionários com informações das sessões (uma por sessão)
+        """
+        with self._leitura() as cursor:
+            cursor.execute(self._CONSULTA_LISTAGEM.format(where=""), (-1 if limite is None else limite,))
+            rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
+    def listar_sessoes_pagina(self, limite: int = 50, apos: Optional[Tuple[str, int]] = None,
+                              busca: str = "") -> List[Dict]:
+        """
+        Lista uma página de sessões (mais recentes primeiro) com paginação por chave.
+        
+        O custo de cada página não depende do tamanho do histórico: a próxima
+        página começa logo depois da última sessão da anterior, sem OFFSET.
+        
+        Args:
+            limite: Tamanho da página
+            apos: (data_modificacao, id) da última sessão da página anterior
+            busca: Texto para buscar no nome/observações (prefixo de cada palavra)
+            
+        Returns:
+            Lista de dicionários no mesmo formato de listar_sessoes
+        """
+        condicoes, parametros = [], []
+        if apos is not None:
+            condicoes.append("(s.data_modificacao, s.id) < (?, ?)")
+            parametros.extend(apos)
+        
+        consulta_fts = self._consulta_fts(busca)
+        if consulta_fts:
+            condicoes.append("s.id IN (SELECT rowid FROM sessoes_fts WHERE sessoes_fts MATCH ?)")
+            parametros.append(consulta_fts)
+        
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        with self._leitura() as cursor:
+            cursor.execute(self._CONSULTA_LISTAGEM.format(where=where), parametros + [limite])
+            return [dict(row) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def _consulta_fts(busca: str) -> str:
+        """Converte o texto digitado numa consulta FTS5 segura (cada palavra como prefixo)"""
+        termos = busca.split()
+        return " ".join('"' + termo.replace('"', '""') + '"*' for termo in termos)
+    
+    def relatorio_pmpv(self, sessao_ids: Optional[Iterable[int]] = None,
+                       dias_por_mes: Union[Dict[int, float], Sequence[float], None] = None) -> Dict[int, Dict]:
+        """
+        Volume, custo e PMPV por mês e por trimestre de várias sessões, calculados no SQLite.
+        
+        Lê as somas de resumo_mes (mantidas pelos triggers), então o custo é
+        proporcional ao número de sessões, não de linhas. Segue a regra de
+        calcular_trimestre: linhas com QDC <= 0 não entram nas somas.
+        
+        Args:
+            sessao_ids: Sessões do relatório (None = todas as que têm linhas)
+            dias_por_mes: Dias de cada mês, {1: 31, 2: 28, 3: 31} ou [31, 28, 31], para
+                          todas as sessões (padrão: os dias gravados em cada sessão,
+                          30 nas sessões sem calendário)
+            
+        Returns:
+            {sessao_id: {'meses': {1: {'volume', 'custo', 'pmpv', 'linhas'}, 2: ..., 3: ...},
+                         'volume_total', 'custo_total', 'pmpv'}}
+            (pmpv é None sem volume; `linhas` conta as linhas do mês)
+        """
+        juncao, dias, parametros = self._sql_dias("r", dias_por_mes)
+        filtro = ""
+        if sessao_ids is not None:
+            sessao_ids = list(sessao_ids)
+            filtro = "WHERE r.sessao_id IN (SELECT value FROM json_each(?))"
+            parametros.append(json.dumps(sessao_ids))
+        
+        relatorio = {}
+        with self._leitura() as cursor:
+            cursor.execute(f"""
+                SELECT r.sessao_id, r.mes, r.linhas,
+                       r.volume_dia * {dias} AS volume,
+                       r.custo_dia * {dias} AS custo
+                FROM resumo_mes r
+                {juncao}
+                {filtro}
+            """, parametros)
+            
+            while True:
+                lote = cursor.fetchmany(5000)
+                if not lote:
+                    break
+                for sessao_id, mes, linhas, volume, custo in lote:
+                    if sessao_id not in relatorio:
+                        relatorio[sessao_id] = self._resumo_vazio()
+                    relatorio[sessao_id]['meses'][mes] = {
+                        'volume': volume, 'custo': custo,
+                        'pmpv': custo / volume if volume > 0 else None, 'linhas': linhas
+                    }
+        
+        for sessao_id in (sessao_ids or []):
+            relatorio.setdefault(sessao_id, self._resumo_vazio())
+        
+        for resumo in relatorio.values():
+            resumo['volume_total'] = sum(m['volume'] for m in resumo['meses'].values())
+            resumo['custo_total'] = sum(m['custo'] for m in resumo['meses'].values())
+            if resumo['volume_total'] > 0:
+                resumo['pmpv'] = resumo['custo_total'] / resumo['volume_total']
+        return relatorio
+    
+    @staticmethod
+    def _resumo_vazio() -> Dict:
+        return {
+            'meses': {mes: {'volume': 0.0, 'custo': 0.0, 'pmpv': None, 'linhas': 0} for mes in (1, 2, 3)},
+            'volume_total': 0.0, 'custo_total': 0.0, 'pmpv': None
+        }
+    
+    @staticmethod
+    def _dias_por_mes(dias_por_mes: Union[Dict[int, float], Sequence[float], None]) -> List[float]:
+        """[dias do mês 1, 2, 3] a partir de um dict, uma sequência ou None (30 para todos)"""
+        if dias_por_mes is None:
+            return [30, 30, 30]
+        if isinstance(dias_por_mes, dict):
+            return [dias_por_mes.get(mes, 30) for mes in (1, 2, 3)]
+        return list(dias_por_mes)[:3]
+    
+    def relatorio_empresas(self, sessao_ids: Optional[Iterable[int]] = None,
+                           dias_por_mes: Union[Dict[int, float], Sequence[float], None] = None) -> Dict[str, Dict]:
+        """
+        Volume, custo e PMPV de cada empresa, somados nas sessões escolhidas.
+        
+        O agrupamento é feito pelo empresa_id inteiro de dados_mes; o nome só
+        é buscado para as linhas já agrupadas (uma por empresa).
+        
+        Args:
+            sessao_ids: Sessões consideradas (None = todas)
+            dias_por_mes: Dias de cada mês, como em relatorio_pmpv (padrão: os de cada sessão)
+            
+        Returns:
+            {nome da empresa: {'volume', 'custo', 'pmpv', 'linhas'}}
+            (pmpv é None sem volume; volume e custo só de linhas com QDC > 0)
+        """
+        juncao, dias, parametros = self._sql_dias("d", dias_por_mes)
+        filtro = ""
+        if sessao_ids is not None:
+            filtro = "WHERE d.sessao_id IN (SELECT value FROM json_each(?))"
+            parametros.append(json.dumps(list(sessao_ids)))
+        
+        with self._leitura() as cursor:
+            cursor.execute(f"""
+                WITH totais AS (
+                    SELECT d.empresa_id, COUNT(*) AS linhas,
+                           SUM(CASE WHEN d.volume > 0 THEN d.volume * {dias} ELSE 0 END) AS volume,
+                           SUM(CASE WHEN d.volume > 0 THEN (COALESCE(d.molecula, 0) + COALESCE(d.transporte, 0)
+                                    + COALESCE(d.logistica, 0)) * d.volume * {dias} ELSE 0 END) AS custo
+                    FROM dados_mes d
+                    {juncao}
+                    {filtro}
+                    GROUP BY d.empresa_id
+                )
+                SELECT e.nome, t.linhas, t.volume, t.custo
+                FROM totais t
+                JOIN empresas e ON e.id = t.empresa_id
+                ORDER BY e.nome COLLATE NOCASE
+            """, parametros)
+            return {
+                nome: {'volume': volume, 'custo': custo,
+                       'pmpv': custo / volume if volume > 0 else None, 'linhas': linhas}
+                for nome, linhas, volume, custo in cursor.fetchall()
+            }
+    
     def deletar_sessao(self, sessao_id: int) -> bool:
         """
         Deleta uma sessão e todos os seus dados.
@@ -220,13 +1454,71 @@ class DatabasePMPV:
             True se deletou com sucesso
         """
         try:
-            self.cursor.execute("DELETE FROM sessoes WHERE id = ?", (sessao_id,))
-            self.conn.commit()
+            with self._transacao() as cursor:
+                cursor.execute("DELETE FROM sessoes WHERE id = ?", (sessao_id,))
             return True
         except Exception as e:
             print(f"Erro ao deletar sessão: {e}")
             return False
     
+    def iterar_sessao(self, sessao_id: int, tamanho_lote: int = 2000) -> Iterator[List[sqlite3.Row]]:
+        """
+        Lê a sessão inteira (cabeçalho, último resultado e linhas dos 3 meses)
+        numa única consulta ordenada por mês, entregando as linhas em lotes.
+        
+        Cada linha traz as colunas da sessão (sessao_id, nome, data_criacao,
+        data_modificacao, observacoes, ano, mes_inicial, dias_mes_1..3), do resultado (resultado_id, volume_total,
+        pmpv_trimestral, custo_total, data_calculo) e da linha do mês (id, mes,
+        empresa, molecula, transporte, logistica, volume e programada = 1 se a
+        linha tem programação diária). Uma sessão sem linhas
+        gera uma única linha com id NULL; uma sessão inexistente não gera nada.
+        
+        Args:
+            sessao_id: ID da sessão
+            tamanho_lote: Linhas por lote
+            
+        Yields:
+            Listas de sqlite3.Row
+        """
+        # Conexão de leitura presa ao gerador: ele pode ficar aberto entre outras consultas
+        with self._leitura() as cursor:
+            cursor.execute("""
+                SELECT s.id AS sessao_id, s.nome, s.data_criacao, s.data_modificacao, s.observacoes,
+                       s.ano, s.mes_inicial, s.dias_mes_1, s.dias_mes_2, s.dias_mes_3,
+                       r.id AS resultado_id, r.volume_total, r.pmpv_trimestral, r.custo_total,
+                       r.data_calculo,
+                       d.id, d.mes, e.nome AS empresa, d.molecula, d.transporte, d.logistica, d.volume,
+                       EXISTS (SELECT 1 FROM programacao_diaria p WHERE p.linha_id = d.id) AS programada
+                FROM sessoes s
+                LEFT JOIN resultados r ON r.id = (
+                    SELECT r2.id FROM resultados r2
+                    WHERE r2.sessao_id = s.id
+                    ORDER BY r2.data_calculo DESC, r2.id DESC
+                    LIMIT 1
+                )
+                LEFT JOIN dados_mes d ON d.sessao_id = s.id
+                LEFT JOIN empresas e ON e.id = d.empresa_id
+                WHERE s.id = ?
+                ORDER BY d.mes, d.id
+            """, (sessao_id,))
+            
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield lote
+    
+    def iterar_ids_sessoes(self, tamanho_lote: int = 1000) -> Iterator[int]:
+        """IDs de todas as sessões (em ordem), lidos aos poucos com um cursor próprio"""
+        with self._leitura() as cursor:
+            cursor.execute("SELECT id FROM sessoes ORDER BY id")
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                for row in lote:
+                    yield row[0]
+    
     def exportar_para_dict(self, sessao_id: int) -> Dict:
         """
         Exporta todos os dados de uma sessão para um dicionário.
@@ -238,22 +1530,41 @@ class DatabasePMPV:
         Returns:
             Dicionário com todos os dados
         """
-        # Informações da sessão
-        self.cursor.execute("SELECT * FROM sessoes WHERE id = ?", (sessao_id,))
-        sessao = dict(self.cursor.fetchone())
+        sessao = None
+        resultado = None
+        dados_meses = {f"mes_{mes}": [] for mes in [1, 2, 3]}
         
-        # Dados dos 3 meses
-        dados_meses = {}
-        for mes in [1, 2, 3]:
-            dados_meses[f"mes_{mes}"] = self.carregar_dados_mes(sessao_id, mes)
+        for lote in self.iterar_sessao(sessao_id):
+            if sessao is None:
+                row = lote[0]
+                sessao = {
+                    'id': row['sessao_id'], 'nome': row['nome'],
+                    'data_criacao': row['data_criacao'],
+                    'data_modificacao': row['data_modificacao'],
+                    'observacoes': row['observacoes'],
+                    'ano': row['ano'], 'mes_inicial': row['mes_inicial'],
+                    # None nos meses sem calendário gravado
+                    'dias': [row['dias_mes_1'], row['dias_mes_2'], row['dias_mes_3']]
+                }
+                if row['resultado_id'] is not None:
+                    resultado = {
+                        'id': row['resultado_id'], 'sessao_id': row['sessao_id'],
+                        'volume_total': row['volume_total'],
+                        'pmpv_trimestral': row['pmpv_trimestral'],
+                        'custo_total': row['custo_total'],
+                        'data_calculo': row['data_calculo']
+                    }
+            
+            for row in lote:
+                if row['id'] is not None and f"mes_{row['mes']}" in dados_meses:
+                    dados_meses[f"mes_{row['mes']}"].append({
+                        'id': row['id'], 'empresa': row['empresa'],
+                        'molecula': row['molecula'], 'transporte': row['transporte'],
+                        'logistica': row['logistica'], 'volume': row['volume']
+                    })
         
-        # Resultado
-        self.cursor.execute(
-            "SELECT * FROM resultados WHERE sessao_id = ? ORDER BY data_calculo DESC LIMIT 1",
-            (sessao_id,)
-        )
-        resultado_row = self.cursor.fetchone()
-        resultado = dict(resultado_row) if resultado_row else None
+        if sessao is None:
+            raise ValueError(f"Sessão não encontrada: {sessao_id}")
         
         return {
             'sessao': sessao,
@@ -262,7 +1573,11 @@ class DatabasePMPV:
         }
     
     def fechar(self):
-        """Fecha a conexão com o banco de dados"""
+        """Fecha as conexões com o banco de dados (escrita e leitura)"""
+        with self._lock_leitores:
+            for conn in self._leitores_abertos:
+                conn.close()
+            self._leitores_abertos = []
         if self.conn:
             self.conn.close()
     
@@ -275,19 +1590,23 @@ class DatabasePMPV:
 
 def criar_backup(db_path: str = "pmpv_data.db", backup_path: str = None):
     """
-    Cria um backup do banco de dados.
+    Cria um backup do banco de dados (mesmo com o banco em uso).
+    
+    Usa a API de backup do SQLite: a cópia é um retrato consistente, e não o
+    arquivo copiado no meio de uma gravação. Para backups comprimidos com
+    rotação e restauração verificada, veja backup.py.
     
     Args:
         db_path: Caminho do banco original
         backup_path: Caminho do backup (se None, usa timestamp)
     """
-    import shutil
+    from backup import copiar_online
     
     if backup_path is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_path = f"pmpv_backup_{timestamp}.db"
     
-    shutil.copy2(db_path, backup_path)
+    copiar_online(db_path, backup_path)
     print(f"Backup criado: {backup_path}")
     return backup_path
 
@@ -5,19 +5,61 @@ Permite importar e exportar dados em formato Excel
 """
 
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
 from datetime import datetime
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from modelo import converter_numero
 import os
 
 
+def _borda_fina() -> Border:
+    return Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+
+# Estilos nomeados do modo streaming: registrados uma vez no workbook e
+# referenciados pelo nome em cada célula (sem um objeto de estilo por célula)
+ESTILOS_STREAMING = {
+    'PMPV Título': dict(font=Font(bold=True, size=14), alignment=Alignment(horizontal='center')),
+    'PMPV Título Resumo': dict(font=Font(bold=True, size=16), alignment=Alignment(horizontal='center')),
+    'PMPV Data': dict(font=Font(italic=True)),
+    'PMPV Seção': dict(font=Font(bold=True, size=12, color="2C3E50")),
+    'PMPV Cabeçalho': dict(
+        fill=PatternFill(start_color="2C3E50", end_color="2C3E50", fill_type="solid"),
+        font=Font(bold=True, color="FFFFFF", size=11),
+        alignment=Alignment(horizontal='center', vertical='center'),
+        border=_borda_fina()
+    ),
+    'PMPV Cabeçalho Resumo': dict(
+        fill=PatternFill(start_color="34495E", end_color="34495E", fill_type="solid"),
+        font=Font(bold=True, color="FFFFFF"),
+        alignment=Alignment(horizontal='center')
+    ),
+    'PMPV Texto': dict(border=_borda_fina()),
+    'PMPV Preço': dict(number_format='#,##0.0000', border=_borda_fina()),
+    'PMPV Volume': dict(number_format='#,##0.00', border=_borda_fina()),
+    'PMPV Número': dict(number_format='#,##0.00'),
+    'PMPV Reais': dict(number_format='R$ #,##0.00'),
+    'PMPV Reais/m³': dict(number_format='R$ #,##0.0000'),
+    'PMPV Rótulo Destaque': dict(font=Font(bold=True, size=11)),
+    'PMPV Reais/m³ Destaque': dict(number_format='R$ #,##0.0000', font=Font(bold=True, size=11, color="27AE60")),
+}
+
+
 class ExcelHandlerPMPV:
     """Gerenciador de importação/exportação Excel"""
     
     @staticmethod
     def exportar_trimestre(dados_por_mes: Dict, resultado: Dict, 
-                          nome_arquivo: str = None) -> str:
+                          nome_arquivo: str = None,
+                          progresso: Callable[[float, str], None] = None,
+                          streaming: bool = False) -> str:
         """
         Exporta dados do trimestre para Excel formatado.
         
@@ -25,6 +67,9 @@ class ExcelHandlerPMPV:
             dados_por_mes: Dicionário com dados dos 3 meses
             resultado: Dicionário com resultado do cálculo
             nome_arquivo: Nome do arquivo (se None, usa timestamp)
+            progresso: Chamado com (fração, mensagem) a cada etapa
+            streaming: Usa o workbook write-only (memória constante; os meses
+                       podem ser qualquer iterável de linhas, ex: um gerador)
             
         Returns:
             Caminho do arquivo criado
@@ -33,6 +78,9 @@ class ExcelHandlerPMPV:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             nome_arquivo = f"PMPV_Trimestral_{timestamp}.xlsx"
         
+        if streaming:
+            return ExcelHandlerPMPV._exportar_streaming(dados_por_mes, resultado, nome_arquivo, progresso)
+        
         # Criar workbook
         wb = openpyxl.Workbook()
         
@@ -43,13 +91,19 @@ class ExcelHandlerPMPV:
         # Criar abas para cada mês
         for i in range(1, 4):
             mes_nome = f"Mês {i}"
+            if progresso:
+                progresso((i - 1) / 5, f"Gerando aba {mes_nome}...")
             dados_mes = dados_por_mes.get(mes_nome, [])
             ExcelHandlerPMPV._criar_aba_mes(wb, mes_nome, dados_mes, i)
         
         # Criar aba de resumo
+        if progresso:
+            progresso(3 / 5, "Gerando resumo...")
         ExcelHandlerPMPV._criar_aba_resumo(wb, dados_por_mes, resultado)
         
         # Salvar
+        if progresso:
+            progresso(4 / 5, f"Gravando {nome_arquivo}...")
         wb.save(nome_arquivo)
         print(f"Excel exportado: {nome_arquivo}")
         return nome_arquivo
@@ -94,10 +148,10 @@ class ExcelHandlerPMPV:
                 continue
             
             empresa = linha.get('empresa', '')
-            mol = float(linha.get('molecula', 0))
-            trans = float(linha.get('transporte', 0))
-            log = float(linha.get('logistica', 0))
-            vol = float(linha.get('volume', 0))
+            mol = ExcelHandlerPMPV._numero(linha.get('molecula'))
+            trans = ExcelHandlerPMPV._numero(linha.get('transporte'))
+            log = ExcelHandlerPMPV._numero(linha.get('logistica'))
+            vol = ExcelHandlerPMPV._numero(linha.get('volume'))
             
             preco_final = mol + trans + log
             custo_total = preco_final * vol
@@ -194,11 +248,11 @@ class ExcelHandlerPMPV:
             custo_mes = 0.0
             
             for linha in dados_mes:
-                vol = float(linha.get('volume', 0))
+                vol = ExcelHandlerPMPV._numero(linha.get('volume'))
                 if vol > 0:
-                    mol = float(linha.get('molecula', 0))
-                    trans = float(linha.get('transporte', 0))
-                    log = float(linha.get('logistica', 0))
+                    mol = ExcelHandlerPMPV._numero(linha.get('molecula'))
+                    trans = ExcelHandlerPMPV._numero(linha.get('transporte'))
+                    log = ExcelHandlerPMPV._numero(linha.get('logistica'))
                     preco = mol + trans + log
                     
                     volume_mes += vol
@@ -222,49 +276,333 @@ class ExcelHandlerPMPV:
         ws.column_dimensions['C'].width = 20
         ws.column_dimensions['D'].width = 20
     
+    # --- EXPORTAÇÃO STREAMING (write-only) ---
     @staticmethod
-    def importar_excel(caminho_arquivo: str) -> Dict:
+    def _exportar_streaming(dados_por_mes: Dict, resultado: Dict, nome_arquivo: str,
+                            progresso: Callable[[float, str], None] = None) -> str:
         """
-        Importa dados de um arquivo Excel.
+        Mesmo arquivo de exportar_trimestre, escrito linha a linha.
+        
+        Cada aba vai para o disco à medida que as linhas são adicionadas, então a
+        memória não cresce com o número de contratos. Os totais do resumo são
+        somados enquanto os meses são escritos (as linhas são lidas uma única vez).
+        """
+        wb = ExcelHandlerPMPV._workbook_streaming()
+        
+        totais = {}
+        for i in range(1, 4):
+            mes_nome = f"Mês {i}"
+            if progresso:
+                progresso((i - 1) / 5, f"Gerando aba {mes_nome}...")
+            totais[mes_nome] = ExcelHandlerPMPV._escrever_aba_mes(wb, mes_nome, dados_por_mes.get(mes_nome, []))
+        
+        if progresso:
+            progresso(3 / 5, "Gerando resumo...")
+        ExcelHandlerPMPV._escrever_aba_resumo(wb, totais, resultado)
+        
+        if progresso:
+            progresso(4 / 5, f"Gravando {nome_arquivo}...")
+        wb.save(nome_arquivo)
+        print(f"Excel exportado: {nome_arquivo}")
+        return nome_arquivo
+    
+    @staticmethod
+    def _workbook_streaming():
+        """Workbook write-only com os estilos nomeados já registrados"""
+        wb = openpyxl.Workbook(write_only=True)
+        for nome, atributos in ESTILOS_STREAMING.items():
+            wb.add_named_style(NamedStyle(name=nome, **atributos))
+        return wb
+    
+    @staticmethod
+    def _celula(ws, valor, estilo: str = None) -> WriteOnlyCell:
+        cell = WriteOnlyCell(ws, value=valor)
+        if estilo:
+            cell.style = estilo
+        return cell
+    
+    @staticmethod
+    def _escrever_aba_mes(wb, nome_aba: str, dados: Iterable[Dict]) -> Tuple[float, float]:
+        """
+        Escreve a aba de um mês no modo streaming.
+        
+        Returns:
+            (volume, custo) do mês, considerando só linhas com volume > 0
+        """
+        ws = wb.create_sheet(nome_aba)
+        celula = ExcelHandlerPMPV._celula
+        numero = ExcelHandlerPMPV._numero
+        
+        # Larguras e mesclagem precisam ser definidas antes das linhas
+        for coluna, largura in zip('ABCDEFG', (25, 18, 18, 18, 22, 18, 20)):
+            ws.column_dimensions[coluna].width = largura
+        ws.merged_cells.add('A1:G1')
+        
+        ws.append([celula(ws, f"PMPV - {nome_aba}", 'PMPV Título')])
+        ws.append([])
+        headers = ['Empresa/Contrato', 'Molécula (R$/m³)', 'Transporte (R$/m³)', 
+                  'Logística (R$/m³)', 'Preço Final (R$/m³)', 'Volume (m³/dia)', 'Custo Total (R$)']
+        ws.append([celula(ws, header, 'PMPV Cabeçalho') for header in headers])
+        
+        # Uma célula já estilizada por coluna, reaproveitada em todas as linhas:
+        # append() grava a linha na hora, então só o valor muda de uma para outra
+        linha_celulas = [celula(ws, None, estilo) for estilo in
+                         ('PMPV Texto', 'PMPV Preço', 'PMPV Preço', 'PMPV Preço',
+                          'PMPV Preço', 'PMPV Volume', 'PMPV Volume')]
+        c_empresa, c_mol, c_trans, c_log, c_preco, c_vol, c_custo = linha_celulas
+        
+        volume_mes = 0.0
+        custo_mes = 0.0
+        for linha in dados:
+            if not linha.get('volume', 0):  # Pula linhas vazias
+                continue
+            
+            mol = numero(linha.get('molecula'))
+            trans = numero(linha.get('transporte'))
+            log = numero(linha.get('logistica'))
+            vol = numero(linha.get('volume'))
+            preco_final = mol + trans + log
+            custo_total = preco_final * vol
+            if vol > 0:
+                volume_mes += vol
+                custo_mes += custo_total
+            
+            c_empresa.value = linha.get('empresa', '')
+            c_mol.value = mol
+            c_trans.value = trans
+            c_log.value = log
+            c_preco.value = preco_final
+            c_vol.value = vol
+            c_custo.value = custo_total
+            ws.append(linha_celulas)
+        
+        return volume_mes, custo_mes
+    
+    @staticmethod
+    def _escrever_aba_resumo(wb, totais: Dict[str, Tuple[float, float]], resultado: Dict):
+        """Escreve a aba de resumo (primeira aba) no modo streaming"""
+        ws = wb.create_sheet("Resumo Trimestral", 0)
+        celula = ExcelHandlerPMPV._celula
+        
+        for coluna, largura in zip('ABCD', (25, 20, 20, 20)):
+            ws.column_dimensions[coluna].width = largura
+        ws.merged_cells.add('A1:D1')
+        
+        ws.append([celula(ws, "RESUMO TRIMESTRAL - PMPV", 'PMPV Título Resumo')])
+        ws.append([celula(ws, f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 'PMPV Data')])
+        ws.append([])
+        ws.append([celula(ws, "RESULTADOS DO TRIMESTRE", 'PMPV Seção')])
+        ws.append([])
+        ws.append(["Volume Total Acumulado:",
+                   celula(ws, resultado.get('volume_total', 0), 'PMPV Número'), "m³"])
+        ws.append(["Custo Total Estimado:",
+                   celula(ws, resultado.get('custo_total', 0), 'PMPV Reais')])
+        ws.append([celula(ws, "PMPV Trimestral:", 'PMPV Rótulo Destaque'),
+                   celula(ws, resultado.get('pmpv', 0), 'PMPV Reais/m³ Destaque'), "/m³"])
+        
+        # Breakdown por mês
+        ws.append([])
+        ws.append([])
+        ws.append([celula(ws, "DETALHAMENTO POR MÊS", 'PMPV Seção')])
+        ws.append([])
+        ws.append([celula(ws, header, 'PMPV Cabeçalho Resumo')
+                   for header in ['Mês', 'Volume (m³)', 'Custo (R$)', 'PMPV (R$/m³)']])
+        for mes_nome, (volume_mes, custo_mes) in totais.items():
+            pmpv_mes = custo_mes / volume_mes if volume_mes > 0 else 0
+            ws.append([mes_nome,
+                       celula(ws, volume_mes, 'PMPV Número'),
+                       celula(ws, custo_mes, 'PMPV Reais'),
+                       celula(ws, pmpv_mes, 'PMPV Reais/m³')])
+    
+    @staticmethod
+    def exportar_consolidado(sessoes: Iterable[Dict], nome_arquivo: str,
+                             progresso: Callable[[int, str], None] = None) -> str:
+        """
+        Exporta várias sessões salvas num único arquivo (modo streaming).
+        
+        A aba "Sessões" tem uma linha por sessão com o resultado salvo; a aba
+        "Contratos" tem todas as linhas de todas as sessões. As duas abas são
+        escritas ao mesmo tempo, linha a linha.
         
         Args:
-            caminho_arquivo: Caminho do arquivo Excel
+            sessoes: Dicionários com 'id', 'nome', 'volume_total', 'custo_total',
+                     'pmpv' (podem ser None) e 'linhas': iterável de tuplas
+                     (mes, empresa, molecula, transporte, logistica, volume)
+            nome_arquivo: Caminho do arquivo
+            progresso: Chamado com (sessões exportadas, nome da sessão)
             
         Returns:
-            Dicionário com dados importados
+            Caminho do arquivo criado
+        """
+        wb = ExcelHandlerPMPV._workbook_streaming()
+        celula = ExcelHandlerPMPV._celula
+        
+        ws_sessoes = wb.create_sheet("Sessões")
+        for coluna, largura in zip('ABCDE', (10, 35, 20, 20, 18)):
+            ws_sessoes.column_dimensions[coluna].width = largura
+        ws_sessoes.append([celula(ws_sessoes, header, 'PMPV Cabeçalho') for header in
+                           ['Sessão', 'Nome', 'Volume Total (m³)', 'Custo Total (R$)', 'PMPV (R$/m³)']])
+        
+        ws_contratos = wb.create_sheet("Contratos")
+        for coluna, largura in zip('ABCDEFGHIJ', (10, 35, 8, 25, 18, 18, 18, 22, 18, 20)):
+            ws_contratos.column_dimensions[coluna].width = largura
+        ws_contratos.append([celula(ws_contratos, header, 'PMPV Cabeçalho') for header in
+                             ['Sessão', 'Nome', 'Mês', 'Empresa/Contrato', 'Molécula (R$/m³)',
+                              'Transporte (R$/m³)', 'Logística (R$/m³)', 'Preço Final (R$/m³)',
+                              'Volume (m³/dia)', 'Custo Total (R$)']])
+        
+        # Mesma ideia de _escrever_aba_mes: células estilizadas reaproveitadas
+        linha_celulas = [celula(ws_contratos, None, estilo) for estilo in
+                         (None, None, None, 'PMPV Texto', 'PMPV Preço', 'PMPV Preço', 'PMPV Preço',
+                          'PMPV Preço', 'PMPV Volume', 'PMPV Volume')]
+        
+        for n, sessao in enumerate(sessoes, start=1):
+            for mes, empresa, mol, trans, log, vol in sessao['linhas']:
+                preco_final = mol + trans + log
+                for c, valor in zip(linha_celulas, (sessao['id'], sessao['nome'], mes, empresa, mol,
+                                                    trans, log, preco_final, vol, preco_final * vol)):
+                    c.value = valor
+                ws_contratos.append(linha_celulas)
+            
+            ws_sessoes.append([
+                sessao['id'], sessao['nome'],
+                celula(ws_sessoes, sessao.get('volume_total'), 'PMPV Número'),
+                celula(ws_sessoes, sessao.get('custo_total'), 'PMPV Reais'),
+                celula(ws_sessoes, sessao.get('pmpv'), 'PMPV Reais/m³')
+            ])
+            if progresso:
+                progresso(n, sessao['nome'])
+        
+        wb.save(nome_arquivo)
+        print(f"Excel exportado: {nome_arquivo}")
+        return nome_arquivo
+    
+    # --- IMPORTAÇÃO STREAMING (read-only) ---
+    @staticmethod
+    def _numero(valor) -> float:
+        """Valor de célula como float (aceita texto com vírgula; inválido vira 0.0)"""
+        if isinstance(valor, (int, float)):
+            return float(valor)
+        if valor is None:
+            return 0.0
+        return converter_numero(str(valor)) or 0.0
+    
+    @staticmethod
+    def iterar_linhas_excel(caminho_arquivo: str,
+                            progresso: Callable[[float, str], None] = None
+                            ) -> Iterator[Tuple[int, str, float, float, float, float]]:
+        """
+        Lê as abas "Mês 1" a "Mês 3" linha a linha, sem carregar a planilha inteira.
+        
+        Usa o modo read-only do openpyxl: as células são lidas do arquivo à
+        medida que o gerador avança, então a memória não depende do tamanho.
+        
+        Args:
+            caminho_arquivo: Caminho do arquivo Excel
+            progresso: Chamado com (fração, mensagem) a cada aba
+            
+        Yields:
+            (mes, empresa, molecula, transporte, logistica, volume) já convertidos
         """
         if not os.path.exists(caminho_arquivo):
             raise FileNotFoundError(f"Arquivo não encontrado: {caminho_arquivo}")
         
-        wb = openpyxl.load_workbook(caminho_arquivo)
-        dados_por_mes = {}
-        
-        # Procurar abas de meses
-        for i in range(1, 4):
-            mes_nome = f"Mês {i}"
-            if mes_nome in wb.sheetnames:
-                ws = wb[mes_nome]
-                dados_mes = []
+        numero = ExcelHandlerPMPV._numero
+        wb = openpyxl.load_workbook(caminho_arquivo, read_only=True, data_only=True)
+        try:
+            for i in range(1, 4):
+                mes_nome = f"Mês {i}"
+                if progresso:
+                    progresso(i / 4, f"Lendo aba {mes_nome}...")
+                if mes_nome not in wb.sheetnames:
+                    continue
                 
-                # Começar da linha 4 (depois do cabeçalho)
-                for row in range(4, ws.max_row + 1):
-                    empresa = ws.cell(row=row, column=1).value
+                # Começar da linha 4 (depois do cabeçalho); E (preço final) e G (custo) são calculadas
+                for empresa, mol, trans, log, _, vol in wb[mes_nome].iter_rows(
+                        min_row=4, max_col=6, values_only=True):
                     if not empresa:
                         continue
-                    
-                    dados_mes.append({
-                        'empresa': empresa,
-                        'molecula': ws.cell(row=row, column=2).value or 0,
-                        'transporte': ws.cell(row=row, column=3).value or 0,
-                        'logistica': ws.cell(row=row, column=4).value or 0,
-                        'volume': ws.cell(row=row, column=6).value or 0
-                    })
-                
-                dados_por_mes[mes_nome] = dados_mes
+                    yield i, str(empresa), numero(mol), numero(trans), numero(log), numero(vol)
+        finally:
+            wb.close()
+    
+    @staticmethod
+    def ler_resumo_excel(caminho_arquivo: str) -> Optional[Dict]:
+        """
+        Lê os totais da aba "Resumo Trimestral" de um arquivo gerado por exportar_trimestre.
         
-        wb.close()
+        Returns:
+            {'volume_total', 'custo_total', 'pmpv'} ou None se o arquivo não tem resumo
+        """
+        rotulos = {
+            "Volume Total Acumulado:": 'volume_total',
+            "Custo Total Estimado:": 'custo_total',
+            "PMPV Trimestral:": 'pmpv'
+        }
+        wb = openpyxl.load_workbook(caminho_arquivo, read_only=True, data_only=True)
+        try:
+            if "Resumo Trimestral" not in wb.sheetnames:
+                return None
+            resumo = {}
+            for rotulo, valor in wb["Resumo Trimestral"].iter_rows(max_col=2, values_only=True):
+                if rotulo in rotulos:
+                    resumo[rotulos[rotulo]] = ExcelHandlerPMPV._numero(valor)
+            return resumo if len(resumo) == len(rotulos) else None
+        finally:
+            wb.close()
+    
+    @staticmethod
+    def importar_excel(caminho_arquivo: str,
+                       progresso: Callable[[float, str], None] = None) -> Dict:
+        """
+        Importa dados de um arquivo Excel.
+        
+        Args:
+            caminho_arquivo: Caminho do arquivo Excel
+            progresso: Chamado com (fração, mensagem) a cada aba
+            
+        Returns:
+            Dicionário com dados importados ("Mês 1" a "Mês 3" sempre presentes;
+            mês sem linhas = lista vazia, para substituir o que estava na tela)
+        """
+        dados_por_mes = {f"Mês {mes}": [] for mes in range(1, 4)}
+        for mes, empresa, mol, trans, log, vol in ExcelHandlerPMPV.iterar_linhas_excel(caminho_arquivo, progresso):
+            dados_por_mes[f"Mês {mes}"].append({
+                'empresa': empresa,
+                'molecula': mol,
+                'transporte': trans,
+                'logistica': log,
+                'volume': vol
+            })
         return dados_por_mes
     
+    @staticmethod
+    def importar_para_banco(caminho_arquivo: str, db, nome: str = None,
+                            progresso: Callable[[float, str], None] = None) -> int:
+        """
+        Importa um arquivo Excel direto para o banco, como uma sessão nova.
+        
+        As linhas vão do arquivo para o INSERT em lotes, sem montar os meses
+        em memória (DatabasePMPV.importar_linhas).
+        
+        Args:
+            caminho_arquivo: Caminho do arquivo Excel
+            db: DatabasePMPV de destino
+            nome: Nome da sessão (se None, usa o nome do arquivo)
+            progresso: Chamado com (fração, mensagem) a cada aba
+            
+        Returns:
+            ID da sessão criada
+        """
+        if nome is None:
+            nome = os.path.splitext(os.path.basename(caminho_arquivo))[0]
+        
+        linhas = ExcelHandlerPMPV.iterar_linhas_excel(caminho_arquivo, progresso)
+        sessao_id = db.importar_linhas(linhas, nome, observacoes=f"Importado de {os.path.basename(caminho_arquivo)}")
+        if sessao_id is None:
+            raise RuntimeError(f"Não foi possível importar {caminho_arquivo}")
+        return sessao_id
+    
     @staticmethod
     def criar_template(nome_arquivo: str = "PMPV_Template.xlsx"):
         """
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Exportação em Lote de Sessões Salvas
+Gera as planilhas de todas as sessões do banco (auditoria), em paralelo
+"""
+
+import argparse
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cache_exportacao import CacheExportacao
+from database import DatabasePMPV
+from excel_handler import ExcelHandlerPMPV
+
+
+# Conexão e cache de cada processo do pool (abertos uma vez, no início do processo)
+_db: Optional[DatabasePMPV] = None
+_cache: Optional[CacheExportacao] = None
+
+
+def dados_para_excel(exportado: Dict) -> Tuple[Dict, Dict]:
+    """
+    Converte o retorno de DatabasePMPV.exportar_para_dict no formato de exportar_trimestre.
+
+    Sessões sem resultado salvo são calculadas na hora, com os dias do
+    calendário gravado na sessão (30 nos meses sem calendário). Sem volume,
+    o PMPV fica None (célula vazia na planilha).
+
+    Returns:
+        (dados_por_mes com chaves "Mês 1".."Mês 3", resultado)
+    """
+    dados_por_mes = {f"Mês {mes}": exportado['dados'][f"mes_{mes}"] for mes in (1, 2, 3)}
+
+    salvo = exportado['resultado']
+    if salvo and salvo['pmpv_trimestral'] is not None:
+        resultado = {'volume_total': salvo['volume_total'], 'custo_total': salvo['custo_total'],
+                     'pmpv': salvo['pmpv_trimestral']}
+    else:
+        from calculo import calcular_trimestre
+        dias = exportado['sessao'].get('dias') or [None, None, None]
+        resultado = calcular_trimestre(dados_por_mes, {mes: d or 30 for mes, d in zip(dados_por_mes, dias)})
+        if not math.isfinite(resultado['pmpv']):
+            # NaN viraria uma célula numérica sem valor (<v/>), que o Excel recusa
+            resultado.update(pmpv=None, preco_final=None)
+    return dados_por_mes, resultado
+
+
+def nome_arquivo_sessao(sessao: Dict) -> str:
+    """Nome do arquivo de uma sessão: PMPV_Sessao_<id>_<nome>.xlsx"""
+    nome = re.sub(r'[^\w\-]+', '_', sessao['nome']).strip('_')[:60]
+    return f"PMPV_Sessao_{sessao['id']}_{nome}.xlsx"
+
+
+def _iniciar_processo(db_path: str, cache_dir: Optional[str]):
+    global _db, _cache
+    _db = DatabasePMPV(db_path)
+    if cache_dir:
+        _cache = CacheExportacao(cache_dir)
+
+
+def _exportar_sessao(sessao_id: int, pasta: str) -> Tuple[str, bool]:
+    """
+    Roda num processo do pool: lê a sessão com a conexão do processo e gera o arquivo.
+
+    Returns:
+        (caminho do arquivo, True se veio do cache)
+    """
+    exportado = _db.exportar_para_dict(sessao_id)
+    dados_por_mes, resultado = dados_para_excel(exportado)
+    caminho = os.path.join(pasta, nome_arquivo_sessao(exportado['sessao']))
+    if _cache is None:
+        return ExcelHandlerPMPV.exportar_trimestre(dados_por_mes, resultado, caminho, streaming=True), False
+
+    acertos = _cache.acertos
+    _cache.exportar(dados_por_mes, resultado, caminho)
+    return caminho, _cache.acertos > acertos
+
+
+def exportar_sessoes(db_path: str, pasta: str, sessao_ids: Iterable[int] = None,
+                     processos: Optional[int] = None,
+                     progresso: Callable[[int, int, str], None] = None,
+                     cache_dir: Optional[str] = None) -> Dict[int, str]:
+    """
+    Gera um arquivo por sessão, distribuindo as sessões entre processos.
+
+    Só os IDs passam de um processo para outro: cada processo abre a sua
+    conexão, lê a sessão (exportar_para_dict) e escreve a planilha em modo
+    streaming. Como a geração do Excel é quase toda CPU, o ganho acompanha o
+    número de núcleos.
+
+    Args:
+        db_path: Banco de origem
+        pasta: Pasta de saída (criada se não existir)
+        sessao_ids: Sessões a exportar (None = todas)
+        processos: Processos de exportação (None = número de CPUs)
+        progresso: Chamado com (sessão, exportadas até agora, arquivo ou "erro: ...")
+        cache_dir: Pasta de um CacheExportacao (sessões sem mudança viram cópias)
+
+    Returns:
+        {sessao_id: caminho do arquivo} das sessões exportadas
+    """
+    os.makedirs(pasta, exist_ok=True)
+    processos = processos or os.cpu_count() or 1
+    arquivos = {}
+    db = None
+    if sessao_ids is None:
+        db = DatabasePMPV(db_path)
+        sessao_ids = db.iterar_ids_sessoes()
+
+    try:
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo,
+                                 initargs=(db_path, cache_dir)) as pool:
+            # IDs lidos do cursor aos poucos, com poucas sessões à frente dos processos
+            fila = iter(sessao_ids)
+            em_andamento = {}
+
+            def enviar():
+                for sessao_id in fila:
+                    em_andamento[pool.submit(_exportar_sessao, sessao_id, pasta)] = sessao_id
+                    if len(em_andamento) >= 2 * processos:
+                        break
+
+            enviar()
+            while em_andamento:
+                prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    sessao_id = em_andamento.pop(futuro)
+                    try:
+                        arquivos[sessao_id], do_cache = futuro.result()
+                        situacao = arquivos[sessao_id] + (" (cache)" if do_cache else "")
+                    except Exception as e:
+                        situacao = f"erro: {e}"
+                    if progresso:
+                        progresso(sessao_id, len(arquivos), situacao)
+                enviar()
+    finally:
+        if db:
+            db.fechar()
+
+    return arquivos
+
+
+def _sessoes_consolidado(db: DatabasePMPV, sessao_ids: Iterable[int],
+                         ausentes: Optional[List[int]] = None) -> Iterator[Dict]:
+    """
+    Sessões no formato de ExcelHandlerPMPV.exportar_consolidado, lidas do banco sob demanda.
+
+    Sessões sem resultado salvo usam as somas de resumo_mes (relatorio_pmpv),
+    que seguem a mesma regra e os mesmos dias de dados_para_excel.
+
+    Args:
+        ausentes: Lista que recebe os ids que não existem no banco
+    """
+    for sessao_id in sessao_ids:
+        lotes = db.iterar_sessao(sessao_id)
+        primeiro = next(lotes, None)
+        if not primeiro:
+            if ausentes is not None:
+                ausentes.append(sessao_id)
+            continue
+
+        def linhas(lotes=chain([primeiro], lotes)):
+            for lote in lotes:
+                for row in lote:
+                    if row['id'] is not None:
+                        yield (row['mes'], row['empresa'], row['molecula'] or 0.0,
+                               row['transporte'] or 0.0, row['logistica'] or 0.0, row['volume'] or 0.0)
+
+        cabecalho = primeiro[0]
+        if cabecalho['pmpv_trimestral'] is not None:
+            volume, custo, pmpv = cabecalho['volume_total'], cabecalho['custo_total'], cabecalho['pmpv_trimestral']
+        else:
+            calculado = db.relatorio_pmpv([sessao_id])[sessao_id]
+            volume, custo, pmpv = calculado['volume_total'], calculado['custo_total'], calculado['pmpv']
+        yield {
+            'id': cabecalho['sessao_id'], 'nome': cabecalho['nome'],
+            'volume_total': volume, 'custo_total': custo, 'pmpv': pmpv, 'linhas': linhas()
+        }
+
+
+def exportar_consolidado(db_path: str, nome_arquivo: str, sessao_ids: Iterable[int] = None,
+                         progresso: Callable[[int, str], None] = None,
+                         ausentes: Optional[List[int]] = None) -> str:
+    """
+    Gera um único arquivo com todas as sessões (abas "Sessões" e "Contratos").
+
+    Um arquivo só pode ser escrito por um processo, então aqui não há pool: as
+    linhas vão do cursor do banco direto para a planilha, com memória constante.
+
+    Args:
+        ausentes: Lista que recebe os ids de `sessao_ids` que não existem no banco
+
+    Returns:
+        Caminho do arquivo criado
+    """
+    db = DatabasePMPV(db_path)
+    try:
+        if sessao_ids is None:
+            sessao_ids = db.iterar_ids_sessoes()
+        return ExcelHandlerPMPV.exportar_consolidado(_sessoes_consolidado(db, sessao_ids, ausentes),
+                                                     nome_arquivo, progresso)
+    finally:
+        db.fechar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta as sessões salvas no banco para Excel.")
+    parser.add_argument("saida", help="Pasta de saída (um arquivo por sessão) ou arquivo .xlsx com --consolidado")
+    parser.add_argument("--banco", default="pmpv_data.db", help="Arquivo do banco (padrão: pmpv_data.db)")
+    parser.add_argument("--sessoes", type=int, nargs="+", help="IDs das sessões (padrão: todas)")
+    parser.add_argument("--consolidado", action="store_true", help="Gera um único arquivo com todas as sessões")
+    parser.add_argument("--processos", type=int, help="Processos de exportação (padrão: número de CPUs)")
+    parser.add_argument("--cache", help="Pasta do cache de exportações (ex: .pmpv_cache)")
+    args = parser.parse_args(argv)
+
+    if args.consolidado:
+        ausentes = []
+        exportar_consolidado(args.banco, args.saida, args.sessoes,
+                             lambda n, nome: print(f"[{n}] {nome}"), ausentes)
+        for sessao_id in ausentes:
+            print(f"Sessão {sessao_id}: erro: Sessão não encontrada: {sessao_id}", file=sys.stderr)
+        return 1 if ausentes else 0
+
+    inicio = time.perf_counter()
+
+    acertos = erros = 0
+
+    def mostrar(sessao_id, n, situacao):
+        nonlocal acertos, erros
+        acertos += situacao.endswith(" (cache)")
+        erros += situacao.startswith("erro: ")
+        print(f"[{n}] Sessão {sessao_id}: {situacao}")
+
+    arquivos = exportar_sessoes(args.banco, args.saida, args.sessoes, args.processos, mostrar, args.cache)
+    segundos = time.perf_counter() - inicio
+    print(f"\n{len(arquivos)} arquivos em {segundos:.1f} s ({len(arquivos) / max(segundos, 1e-9):.1f} sessões/s)")
+    if args.cache:
+        print(f"Cache: {acertos} acertos, {len(arquivos) - acertos} falhas")
+    if erros:
+        print(f"Erros: {erros}")
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Grade Virtualizada de Contratos
+Desenha só as linhas visíveis, reciclando um conjunto fixo de widgets
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from modelo import ContratosMes
+from typing import Callable, List, Optional
+
+
+class GradeVirtual(tk.Frame):
+    """
+    Tabela de contratos de um mês com renderização virtual.
+
+    Os widgets de linha (5 Entries, Label e 2 botões) são criados apenas para as
+    linhas que cabem na tela. Ao rolar, os mesmos widgets passam a mostrar outras
+    linhas do modelo, então abrir ou rolar um mês com milhares de contratos custa
+    o mesmo que um mês com dez.
+
+    O texto digitado é convertido uma única vez, no próprio modelo
+    (ContratosMes.definir_texto); a grade só lê e escreve valores nele.
+    O nome da empresa é completado com a primeira sugestão que começa pelo
+    texto digitado (a parte completada fica selecionada). Uma edição que
+    descartaria a programação diária da linha só vale depois de confirmada.
+    """
+
+    CAMPOS = ('empresa', 'molecula', 'transporte', 'logistica', 'volume')
+    COR_INVALIDO = "#fdecea"
+
+    def __init__(self, parent, linhas: ContratosMes, ao_editar: Callable, ao_copiar: Callable,
+                 ao_remover: Callable, sugestoes: Optional[Callable[[], List[str]]] = None,
+                 confirmar_descarte: Optional[Callable[[int], bool]] = None, **kwargs):
+        """
+        Args:
+            parent: Widget pai (aba do mês)
+            linhas: Modelo do mês (compartilhado com a aplicação)
+            ao_editar: Chamado com o índice da linha depois de cada edição
+            ao_copiar: Chamado com o índice da linha ao clicar em 📋
+            ao_remover: Chamado com o índice da linha ao clicar em 🗑️
+            sugestoes: Devolve os nomes de empresa para autocompletar
+            confirmar_descarte: Chamado com o índice da linha antes de uma edição
+                                que descarta a programação diária; False desfaz a edição
+        """
+        super().__init__(parent, bg="#fafafa", **kwargs)
+        self.linhas = linhas
+        self.ao_editar = ao_editar
+        self.ao_copiar = ao_copiar
+        self.ao_remover = ao_remover
+        self.sugestoes = sugestoes
+        self.confirmar_descarte = confirmar_descarte
+
+        self.topo = 0            # Índice da primeira linha visível
+        self.altura_linha = 40   # Recalculada após criar o primeiro slot
+        self.slots = []          # Widgets reciclados
+
+        self.corpo = tk.Frame(self, bg="#fafafa")
+        self.scroll = ttk.Scrollbar(self, orient="vertical", command=self._rolar)
+        self.corpo.pack(side="left", fill="both", expand=True, padx=5)
+        self.scroll.pack(side="right", fill="y")
+
+        self.corpo.bind("<Configure>", lambda e: self._ajustar_slots())
+        self._bind_roda(self.corpo)
+
+    # --- POOL DE WIDGETS ---
+    def _criar_slot(self):
+        pos = len(self.slots)
+        row = tk.Frame(self.corpo, pady=8, padx=15)
+
+        e_nome = tk.Entry(row, width=29, font=("Segoe UI", 10), relief="solid", bd=1)
+        e_nome.pack(side="left", padx=3, ipady=4)
+
+        e_mol = tk.Entry(row, width=14, justify="center", font=("Segoe UI", 10), relief="solid", bd=1)
+        e_mol.pack(side="left", padx=3, ipady=4)
+
+        e_trans = tk.Entry(row, width=14, justify="center", font=("Segoe UI", 10), relief="solid", bd=1)
+        e_trans.pack(side="left", padx=3, ipady=4)
+
+        e_log = tk.Entry(row, width=14, justify="center", font=("Segoe UI", 10), relief="solid", bd=1)
+        e_log.pack(side="left", padx=3, ipady=4)
+
+        lbl_soma = tk.Label(row, text="0.0000", width=17, font=("Segoe UI", 10, "bold"),
+                            bg="#e3f2fd", fg="#1976d2", relief="solid", bd=1, anchor="center")
+        lbl_soma.pack(side="left", padx=3, ipady=4)
+
+        e_vol = tk.Entry(row, width=19, justify="center", font=("Segoe UI", 10, "bold"),
+                         bg="#fff9c4", relief="solid", bd=1, fg="#f57c00")
+        e_vol.pack(side="left", padx=3, ipady=4)
+
+        btn_copiar = tk.Button(row, text="📋",
+                               command=lambda: self._acao_slot(pos, self.ao_copiar),
+                               bg="#9b59b6", fg="white", font=("Segoe UI", 10, "bold"),
+                               width=3, relief="flat", cursor="hand2")
+        btn_copiar.pack(side="left", padx=2, ipady=2)
+
+        btn_remove = tk.Button(row, text="🗑️",
+                               command=lambda: self._acao_slot(pos, self.ao_remover),
+                               bg="#e74c3c", fg="white", font=("Segoe UI", 10, "bold"),
+                               width=3, relief="flat", cursor="hand2")
+        btn_remove.pack(side="left", padx=2, ipady=2)
+
+        slot = {'empresa': e_nome, 'molecula': e_mol, 'transporte': e_trans, 'logistica': e_log,
+                'lbl_soma': lbl_soma, 'volume': e_vol, 'row': row}
+        for campo in self.CAMPOS:
+            slot['bg_' + campo] = slot[campo].cget("bg")
+
+        for campo in self.CAMPOS:
+            slot[campo].bind("<KeyRelease>", lambda event, p=pos, c=campo: self._editar(p, c, event))
+        for w in (row, e_nome, e_mol, e_trans, e_log, lbl_soma, e_vol, btn_copiar, btn_remove):
+            self._bind_roda(w)
+
+        row.grid(row=pos, column=0, sticky="ew")
+        self.slots.append(slot)
+        return slot
+
+    def _ajustar_slots(self):
+        """Garante slots suficientes para a altura visível (nunca para o total de linhas)"""
+        if not self.slots:
+            self._criar_slot()
+            self.update_idletasks()
+            self.altura_linha = max(self.slots[0]['row'].winfo_reqheight(), 1)
+
+        visiveis = max(self.corpo.winfo_height() // self.altura_linha, 1) + 1
+        while len(self.slots) < visiveis:
+            self._criar_slot()
+        self._renderizar()
+
+    def _visiveis(self):
+        return max(min(len(self.slots), self.corpo.winfo_height() // self.altura_linha), 1)
+
+    # --- RENDERIZAÇÃO ---
+    def _renderizar(self):
+        total = len(self.linhas)
+        self.topo = max(0, min(self.topo, total - self._visiveis()))
+
+        for pos, slot in enumerate(self.slots):
+            idx = self.topo + pos
+            if idx >= total:
+                slot['row'].grid_remove()
+                continue
+
+            bg_color = "#ffffff" if idx % 2 == 0 else "#f8f9fa"
+            slot['row'].config(bg=bg_color)
+            for campo in self.CAMPOS:
+                entry = slot[campo]
+                texto = self.linhas.texto(idx, campo)
+                if entry.get() != texto:
+                    entry.delete(0, tk.END)
+                    entry.insert(0, texto)
+                entry.config(bg=slot['bg_' + campo])
+            slot['lbl_soma'].config(text=f"{self.linhas.preco(idx):.4f}")
+            slot['row'].grid()
+
+        self._atualizar_scroll()
+
+    def _atualizar_scroll(self):
+        total = len(self.linhas)
+        if total == 0:
+            self.scroll.set(0.0, 1.0)
+            return
+        self.scroll.set(self.topo / total, min((self.topo + self._visiveis()) / total, 1.0))
+
+    def atualizar(self):
+        """Redesenha após mudanças no modelo (linhas adicionadas/removidas/copiadas)"""
+        if self.slots:
+            self._renderizar()
+
+    def mostrar_linha(self, indice: int, campo: str = None):
+        """Rola até a linha e, opcionalmente, coloca o foco num campo dela"""
+        visiveis = self._visiveis()
+        if indice < self.topo or indice >= self.topo + visiveis:
+            self.topo = max(0, indice - visiveis + 1)
+        self.atualizar()
+
+        pos = indice - self.topo
+        if campo and 0 <= pos < len(self.slots):
+            entry = self.slots[pos][campo]
+            entry.focus_set()
+            entry.select_range(0, tk.END)
+
+    # --- EVENTOS ---
+    def _indice_do_slot(self, pos):
+        idx = self.topo + pos
+        return idx if idx < len(self.linhas) else None
+
+    def _editar(self, pos, campo, event=None):
+        idx = self._indice_do_slot(pos)
+        if idx is None:
+            return
+        slot = self.slots[pos]
+        if campo == 'empresa' and event is not None:
+            self._completar(slot[campo], event)
+        texto = slot[campo].get()
+        if (self.confirmar_descarte and self.linhas.descartaria_programacao(idx, campo, texto)
+                and not self.confirmar_descarte(idx)):
+            slot[campo].delete(0, tk.END)
+            slot[campo].insert(0, self.linhas.texto(idx, campo))
+            return
+        valido = self.linhas.definir_texto(idx, campo, texto)
+        slot[campo].config(bg=slot['bg_' + campo] if valido else self.COR_INVALIDO)
+        slot['lbl_soma'].config(text=f"{self.linhas.preco(idx):.4f}")
+        self.ao_editar(idx)
+
+    def _completar(self, entry, event):
+        """Completa o nome com a primeira sugestão que começa pelo texto antes do cursor"""
+        # Só ao digitar um caractere: apagar ou mover o cursor não completa de novo
+        if not self.sugestoes or not event.char or not event.char.isprintable():
+            return
+        digitado = entry.get()[:entry.index(tk.INSERT)]
+        prefixo = digitado.casefold()
+        if not prefixo:
+            return
+        nome = next((n for n in self.sugestoes() if n.casefold().startswith(prefixo) and len(n) > len(digitado)), None)
+        if nome is None:
+            return
+        entry.delete(0, tk.END)
+        entry.insert(0, nome)
+        entry.icursor(len(digitado))
+        entry.select_range(len(digitado), tk.END)
+
+    def _acao_slot(self, pos, callback):
+        idx = self._indice_do_slot(pos)
+        if idx is not None:
+            callback(idx)
+
+    def _rolar(self, *args):
+        """Comando da Scrollbar: ('moveto', fração) ou ('scroll', n, 'units'|'pages')"""
+        total = len(self.linhas)
+        if args[0] == "moveto":
+            self.topo = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            passo = int(args[1])
+            if args[2] == "pages":
+                passo *= self._visiveis()
+            self.topo += passo
+        self._renderizar()
+
+    def _bind_roda(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self._rolar("scroll", -3 if e.delta > 0 else 3, "units"))
+        widget.bind("<Button-4>", lambda e: self._rolar("scroll", -3, "units"))
+        widget.bind("<Button-5>", lambda e: self._rolar("scroll", 3, "units"))
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Importação em Lote de Planilhas Históricas
+Lê uma pasta de PMPV_Trimestral_*.xlsx em paralelo e grava uma sessão por arquivo
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import PERFIS, DatabasePMPV
+from excel_handler import ExcelHandlerPMPV
+
+
+PADRAO_ARQUIVOS = "PMPV_Trimestral_*.xlsx"
+
+
+def hash_arquivo(caminho: str) -> str:
+    """SHA-256 do conteúdo do arquivo (o mesmo arquivo renomeado não é importado de novo)"""
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _ler_planilha(caminho: str) -> Tuple[List[Tuple], Optional[Dict]]:
+    """
+    Roda num processo do pool: lê as linhas dos meses e o resumo da planilha.
+
+    Returns:
+        (linhas no formato de DatabasePMPV.importar_linhas, resultado ou None)
+    """
+    linhas = list(ExcelHandlerPMPV.iterar_linhas_excel(caminho))
+    return linhas, ExcelHandlerPMPV.ler_resumo_excel(caminho)
+
+
+def importar_pasta(pasta: str, db_path: str = "pmpv_data.db", padrao: str = PADRAO_ARQUIVOS,
+                   processos: Optional[int] = None,
+                   progresso: Callable[[int, int, str, str], None] = None,
+                   perfil: str = "rapido") -> Dict[str, int]:
+    """
+    Importa todas as planilhas da pasta, uma sessão por arquivo.
+
+    A leitura das planilhas (openpyxl, a parte lenta) é dividida entre processos;
+    só este processo escreve no banco, um arquivo por transação. Cada arquivo é
+    registrado pelo hash do conteúdo em `importacoes`, então rodar de novo pula
+    os que já entraram e tenta outra vez os que deram erro.
+
+    Args:
+        pasta: Pasta com as planilhas
+        db_path: Banco de destino
+        padrao: Padrão dos nomes de arquivo
+        processos: Processos de leitura (None = número de CPUs)
+        progresso: Chamado com (feitos, total, arquivo, situação) a cada arquivo
+        perfil: Perfil do SQLite (database.PERFIS). "carga" grava sem fsync: uma queda
+                de energia no meio pode corromper o banco inteiro, use só num banco
+                novo ou descartável
+
+    Returns:
+        Contagem por situação: {'importados', 'pulados', 'erros'}
+    """
+    arquivos = sorted(glob.glob(os.path.join(pasta, padrao)))
+    db = DatabasePMPV(db_path, perfil=perfil)
+    ja_importados = db.hashes_importados()
+    contagem = {'importados': 0, 'pulados': 0, 'erros': 0}
+    feitos = 0
+
+    def informar(arquivo, situacao):
+        nonlocal feitos
+        feitos += 1
+        if progresso:
+            progresso(feitos, len(arquivos), arquivo, situacao)
+
+    pendentes = []
+    for caminho in arquivos:
+        hash_conteudo = hash_arquivo(caminho)
+        if hash_conteudo in ja_importados:
+            contagem['pulados'] += 1
+            informar(caminho, "já importado")
+        else:
+            ja_importados.add(hash_conteudo)  # cópias idênticas na mesma pasta
+            pendentes.append((caminho, hash_conteudo))
+
+    try:
+        processos = processos or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            # Poucos arquivos lidos à frente do banco: a memória não cresce com a pasta
+            limite = 2 * processos
+            fila = iter(pendentes)
+            em_leitura = {}
+
+            def enviar():
+                for caminho, hash_conteudo in fila:
+                    em_leitura[pool.submit(_ler_planilha, caminho)] = (caminho, hash_conteudo)
+                    if len(em_leitura) >= limite:
+                        break
+
+            enviar()
+            while em_leitura:
+                prontos, _ = wait(em_leitura, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    caminho, hash_conteudo = em_leitura.pop(futuro)
+                    nome_arquivo = os.path.basename(caminho)
+                    try:
+                        linhas, resultado = futuro.result()
+                    except Exception as e:
+                        db.registrar_erro_importacao(hash_conteudo, nome_arquivo, str(e))
+                        contagem['erros'] += 1
+                        informar(caminho, f"erro: {e}")
+                        continue
+
+                    sessao_id = db.importar_linhas(
+                        linhas, os.path.splitext(nome_arquivo)[0],
+                        observacoes=f"Importado de {nome_arquivo}",
+                        resultado=resultado, origem=(nome_arquivo, hash_conteudo)
+                    )
+                    if sessao_id is None:
+                        db.registrar_erro_importacao(hash_conteudo, nome_arquivo, "falha ao gravar no banco")
+                        contagem['erros'] += 1
+                        informar(caminho, "erro: falha ao gravar no banco")
+                    else:
+                        contagem['importados'] += 1
+                        informar(caminho, f"sessão {sessao_id} ({len(linhas)} linhas)")
+                enviar()
+    finally:
+        db.fechar()
+
+    return contagem
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa uma pasta de planilhas PMPV para o banco.")
+    parser.add_argument("pasta", help="Pasta com as planilhas")
+    parser.add_argument("--banco", default="pmpv_data.db", help="Arquivo do banco (padrão: pmpv_data.db)")
+    parser.add_argument("--padrao", default=PADRAO_ARQUIVOS, help=f"Padrão dos arquivos (padrão: {PADRAO_ARQUIVOS})")
+    parser.add_argument("--processos", type=int, help="Processos de leitura (padrão: número de CPUs)")
+    parser.add_argument("--perfil", default="rapido", choices=sorted(PERFIS),
+                        help="Perfil do SQLite (padrão: rapido). 'carga' desliga o fsync: uma queda "
+                             "de energia pode corromper o banco inteiro, use só em banco novo/descartável")
+    args = parser.parse_args(argv)
+
+    def mostrar(feitos, total, arquivo, situacao):
+        print(f"[{feitos}/{total}] {os.path.basename(arquivo)}: {situacao}")
+
+    contagem = importar_pasta(args.pasta, args.banco, args.padrao, args.processos, mostrar, args.perfil)
+    print(f"\nImportados: {contagem['importados']} | Já importados: {contagem['pulados']} | "
+          f"Erros: {contagem['erros']}")
+    return 1 if contagem['erros'] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,7 +1,12 @@
 import tkinter as tk
-from tkinter import messagebox, ttk, simpledialog
-from database import DatabasePMPV
+from tkinter import messagebox, ttk, simpledialog, filedialog
+from database import DatabasePMPV, chave_empresa
 from excel_handler import ExcelHandlerPMPV
+from calculo import calcular_lote, dias_trimestre, AgregadoTrimestre
+from grade_virtual import GradeVirtual
+from modelo import ContratosMes, colunas_trimestre, converter_numero
+from tarefas import ExecutorTarefas
+from cache_exportacao import CacheExportacao
 from datetime import datetime
 
 class CalculadoraTrimestralPMPV:
@@ -15,6 +20,7 @@ class CalculadoraTrimestralPMPV:
         self.db = DatabasePMPV()
         
         self.empresas_padrao = ["PETROBRAS", "GALP", "PETRORECONCAVO", "BRAVA", "ENEVA", "ORIZON"]
+        self._sugestoes = None  # (lista do banco, sugestões do autocompletar)
         
         # Configuração de Dias Padrão
         self.mapa_dias_padrao = {
@@ -31,9 +37,27 @@ class CalculadoraTrimestralPMPV:
             "Mês 3": 30
         }
         
-        self.dados_por_mes = {} # Mês 1, Mês 2, Mês 3
+        self.dados_por_mes = {} # Mês 1, Mês 2, Mês 3 -> ContratosMes
+        self.grades = {}        # GradeVirtual de cada mês
+        
+        # Sessão do banco em edição (None até o primeiro salvamento)
+        self.sessao_id = None
+        self.sessao_nome = ""
+        self._resultado_salvo = None
+        self._carregando = False
+        # Sessão carregada sem calendário gravado (anterior ao calendário por sessão)
+        self._sessao_sem_calendario = False
+        
+        # Somas correntes por mês para o PMPV ao vivo no rodapé
+        self.agregado = AgregadoTrimestre(list(self.dias_mes_config.keys()))
 
         self._setup_ui()
+        
+        # Salvar/exportar/importar rodam fora da thread do Tk
+        self.tarefas = ExecutorTarefas(self.root, self._atualizar_status)
+        # Exportar de novo os mesmos dados só copia a planilha já gerada
+        self.cache_exportacao = CacheExportacao()
+        self.root.protocol("WM_DELETE_WINDOW", self._fechar)
 
     def _setup_ui(self):
         # --- Título Superior ---
@@ -60,12 +84,14 @@ class CalculadoraTrimestralPMPV:
         self.combo_mes_inicio.pack(side="left")
         self.combo_mes_inicio.bind("<<ComboboxSelected>>", self._atualizar_trimestre)
         
-        # Checkbox para Ano Bissexto (para Fevereiro)
-        self.var_bissexto = tk.BooleanVar()
-        self.chk_bissexto = tk.Checkbutton(frame_config, text="Ano Bissexto (Fev=29)?", 
-                                          variable=self.var_bissexto, bg="#bdc3c7", 
-                                          command=self._atualizar_trimestre, font=("Segoe UI", 9))
-        self.chk_bissexto.pack(side="left", padx=15)
+        # Ano do mês inicial (Fevereiro com 29 dias segue o ano dele)
+        tk.Label(frame_config, text="Ano:", 
+                 font=("Segoe UI", 10), bg="#bdc3c7").pack(side="left", padx=(15, 5))
+        self.var_ano = tk.StringVar(value=str(datetime.now().year))
+        self.spin_ano = tk.Spinbox(frame_config, from_=2000, to=2100, textvariable=self.var_ano,
+                                   width=6, font=("Segoe UI", 10), command=self._atualizar_trimestre)
+        self.spin_ano.pack(side="left")
+        self.spin_ano.bind("<KeyRelease>", self._atualizar_trimestre)
 
         # --- Sistema de Abas (Notebook) ---
         self.notebook = ttk.Notebook(self.root)
@@ -76,11 +102,27 @@ class CalculadoraTrimestralPMPV:
             key_mes = f"Mês {i}"
             aba = tk.Frame(self.notebook, bg="#fafafa")
             self.notebook.add(aba, text=f" {key_mes} ") # Texto provisório
-            self.dados_por_mes[key_mes] = self._criar_area_mes(aba)
+            self.dados_por_mes[key_mes] = self._criar_area_mes(aba, key_mes)
 
         # Atualizar os títulos das abas com base no padrão inicial
         self._atualizar_trimestre()
 
+        # --- Barra de Status (tarefas em segundo plano) ---
+        frame_status = tk.Frame(self.root, bg="#2c3e50", pady=3, padx=10)
+        frame_status.pack(fill="x", side="bottom")
+        
+        self.lbl_status = tk.Label(frame_status, text="Pronto", font=("Segoe UI", 9), 
+                                   bg="#2c3e50", fg="#ecf0f1", anchor="w")
+        self.lbl_status.pack(side="left", fill="x", expand=True)
+        
+        self.btn_cancelar = tk.Button(frame_status, text="✖ Cancelar", command=lambda: self.tarefas.cancelar(),
+                                      bg="#c0392b", fg="white", font=("Segoe UI", 9, "bold"),
+                                      relief="flat", cursor="hand2", state="disabled")
+        self.btn_cancelar.pack(side="right", padx=5)
+        
+        self.barra_progresso = ttk.Progressbar(frame_status, length=220, maximum=1.0)
+        self.barra_progresso.pack(side="right", padx=5)
+
         # --- Frame de Ações (Salvar/Exportar) ---
         frame_acoes = tk.Frame(self.root, bg="#ecf0f1", pady=5)
         frame_acoes.pack(fill="x", side="bottom")
@@ -99,6 +141,7 @@ class CalculadoraTrimestralPMPV:
         self.entry_conta_grafica = tk.Entry(frame_calc, width=12, font=("Segoe UI", 11), justify="center")
         self.entry_conta_grafica.insert(0, "-0.0210") 
         self.entry_conta_grafica.pack(side="left", padx=5)
+        self.entry_conta_grafica.bind("<KeyRelease>", lambda e: self._atualizar_rodape())
 
         btn_calc_trimestre = tk.Button(frame_calc, text="⚡ GERAR FECHAMENTO", 
                                        command=self.calcular_trimestre, bg="#27ae60", fg="white",
@@ -127,9 +170,26 @@ class CalculadoraTrimestralPMPV:
                                command=self.exportar_excel, bg="#2980b9", fg="white",
                                font=("Segoe UI", 10, "bold"), padx=15, pady=5, relief="flat", cursor="hand2")
         btn_export.pack(side="right", padx=5, pady=5)
-
-    def _atualizar_trimestre(self, event=None):
-        """Atualiza os nomes e dias dos meses com base na seleção inicial"""
+        
+        btn_abrir = tk.Button(frame_acoes, text="📂 Abrir Sessão", 
+                              command=self.abrir_navegador_sessoes, bg="#16a085", fg="white",
+                              font=("Segoe UI", 10, "bold"), padx=15, pady=5, relief="flat", cursor="hand2")
+        btn_abrir.pack(side="right", padx=5, pady=5)
+        
+        btn_importar = tk.Button(frame_acoes, text="📥 Importar Excel", 
+                                 command=self.importar_excel, bg="#7f8c8d", fg="white",
+                                 font=("Segoe UI", 10, "bold"), padx=15, pady=5, relief="flat", cursor="hand2")
+        btn_importar.pack(side="right", padx=5, pady=5)
+
+    def _atualizar_trimestre(self, event=None, dias=None):
+        """
+        Atualiza os nomes e dias dos meses com base na seleção inicial.
+        
+        Args:
+            event: Evento do Tk (não usado)
+            dias: Dias dos 3 meses (ex: os gravados com a sessão); se None,
+                  saem do calendário do mês inicial e do ano
+        """
         mes_inicio = self.combo_mes_inicio.get()
         if not mes_inicio: return
 
@@ -138,26 +198,36 @@ class CalculadoraTrimestralPMPV:
         except ValueError:
             return
 
-        eh_bissexto = self.var_bissexto.get()
-
-        # Calcular os 3 meses sequenciais
-        for i in range(3):
+        # Dias dos 3 meses sequenciais (bissexto pelo ano de Fevereiro)
+        dias_meses = dias or dias_trimestre(idx_inicio + 1, ano=self._ano())
+        for i, dias in enumerate(dias_meses):
             idx_atual = (idx_inicio + i) % 12
             nome_mes = self.lista_meses[idx_atual]
             
-            # Definir dias
-            dias = self.mapa_dias_padrao[nome_mes]
-            if nome_mes == "Fevereiro" and eh_bissexto:
-                dias = 29
-            
             # Atualizar config interna
             key_mes = f"Mês {i+1}"
             self.dias_mes_config[key_mes] = dias
+            self.agregado.definir_dias(key_mes, dias)
             
             # Atualizar Título da Aba
             self.notebook.tab(i, text=f"  {nome_mes} ({dias}d)  ")
 
-    def _criar_area_mes(self, parent):
+        self._atualizar_rodape()
+
+    def _ano(self):
+        """Ano digitado no Spinbox (o atual enquanto o campo está incompleto)"""
+        try:
+            return int(self.var_ano.get())
+        except ValueError:
+            return datetime.now().year
+
+    def _calendario(self):
+        """Calendário do trimestre na tela, no formato gravado com a sessão"""
+        return {'ano': self._ano(),
+                'mes_inicial': self.lista_meses.index(self.combo_mes_inicio.get()) + 1,
+                'dias': list(self.dias_mes_config.values())}
+
+    def _criar_area_mes(self, parent, key_mes):
         # Cabeçalho interno da aba
         header_bg = "#34495e"
         h_frame = tk.Frame(parent, bg=header_bg, padx=15, pady=12)
@@ -170,91 +240,71 @@ class CalculadoraTrimestralPMPV:
             tk.Label(h_frame, text=txt, width=w, font=("Segoe UI", 9, "bold"), 
                      bg=header_bg, fg="white", anchor="center").pack(side="left", padx=3)
 
-        # Scroll Area
-        canvas = tk.Canvas(parent, bg="#fafafa", highlightthickness=0, bd=0)
-        scroll = ttk.Scrollbar(parent, orient="vertical", command=canvas.yview)
-        scroll_frame = tk.Frame(canvas, bg="#fafafa")
-
-        scroll_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scroll_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scroll.set)
-
-        canvas.pack(side="left", fill="both", expand=True, padx=5)
-        scroll.pack(side="right", fill="y")
-
-        # Gerar linhas iniciais
-        lista_entries_mes = []
+        # Grade virtualizada: só as linhas visíveis têm widgets
+        contratos = ContratosMes()
         for emp in self.empresas_padrao:
-            entry_dict = self._adicionar_linha_tabela(scroll_frame, emp, lista_entries_mes)
-            lista_entries_mes.append(entry_dict)
+            contratos.adicionar(emp)
+
+        grade = GradeVirtual(parent, contratos,
+                             ao_editar=lambda i: self._update_row_total(key_mes, i),
+                             ao_copiar=lambda i: self._copiar_linha_para_outro_mes(key_mes, i),
+                             ao_remover=lambda i: self._remover_linha(key_mes, i),
+                             sugestoes=self._nomes_empresas,
+                             confirmar_descarte=lambda i: self._confirmar_descarte(key_mes, i))
+        grade.pack(fill="both", expand=True)
+        self.grades[key_mes] = grade
 
         # Botão de Adicionar Empresa
         btn_frame = tk.Frame(parent, bg="#fafafa", pady=10)
         btn_frame.pack(fill="x")
         
         btn_add = tk.Button(btn_frame, text="➕ Adicionar Nova Empresa", 
-                           command=lambda: self._adicionar_nova_linha(scroll_frame, lista_entries_mes),
+                           command=lambda: self._adicionar_nova_linha(key_mes),
                            bg="#3498db", fg="white", font=("Segoe UI", 10, "bold"),
                            padx=15, pady=8, relief="flat", cursor="hand2")
         btn_add.pack()
 
-        return lista_entries_mes
-
-    def _adicionar_linha_tabela(self, parent, nome, lista_referencia):
-        idx = len(lista_referencia)
-        bg_color = "#ffffff" if idx % 2 == 0 else "#f8f9fa"
-        
-        row = tk.Frame(parent, bg=bg_color, pady=8, padx=15)
-        row.pack(fill="x", expand=True)
-
-        # Widgets
-        e_nome = tk.Entry(row, width=29, font=("Segoe UI", 10), relief="solid", bd=1)
-        e_nome.insert(0, nome)
-        e_nome.pack(side="left", padx=3, ipady=4)
-
-        e_mol = tk.Entry(row, width=14, justify="center", font=("Segoe UI", 10), relief="solid", bd=1)
-        e_mol.pack(side="left", padx=3, ipady=4)
-
-        e_trans = tk.Entry(row, width=14, justify="center", font=("Segoe UI", 10), relief="solid", bd=1)
-        e_trans.pack(side="left", padx=3, ipady=4)
-
-        e_log = tk.Entry(row, width=14, justify="center", font=("Segoe UI", 10), relief="solid", bd=1)
-        e_log.pack(side="left", padx=3, ipady=4)
-
-        lbl_soma = tk.Label(row, text="0.0000", width=17, font=("Segoe UI", 10, "bold"), 
-                           bg="#e3f2fd", fg="#1976d2", relief="solid", bd=1, anchor="center")
-        lbl_soma.pack(side="left", padx=3, ipady=4)
-
-        e_vol = tk.Entry(row, width=19, justify="center", font=("Segoe UI", 10, "bold"), 
-                        bg="#fff9c4", relief="solid", bd=1, fg="#f57c00")
-        e_vol.pack(side="left", padx=3, ipady=4)
-
-        # Botões de Ação na Linha
-        btn_copiar = tk.Button(row, text="📋", 
-                               command=lambda: self._copiar_linha_para_outro_mes(dados),
-                               bg="#9b59b6", fg="white", font=("Segoe UI", 10, "bold"),
-                               width=3, relief="flat", cursor="hand2")
-        btn_copiar.pack(side="left", padx=2, ipady=2)
-
-        btn_remove = tk.Button(row, text="🗑️", 
-                               command=lambda: self._remover_linha(row, dados, lista_referencia),
-                               bg="#e74c3c", fg="white", font=("Segoe UI", 10, "bold"),
-                               width=3, relief="flat", cursor="hand2")
-        btn_remove.pack(side="left", padx=2, ipady=2)
-
-        dados = {'nome': e_nome, 'mol': e_mol, 'trans': e_trans, 'log': e_log, 
-                 'lbl_soma': lbl_soma, 'vol': e_vol, 'row': row, 
-                 'btn_copiar': btn_copiar, 'btn_remove': btn_remove}
+        return contratos
+
+    def _nomes_empresas(self):
+        """Sugestões do autocompletar: empresas padrão + a dimensão de empresas do banco (em cache)"""
+        do_banco = self.db.nomes_empresas()
+        # A lista do banco só muda de objeto quando o cache é recarregado
+        if self._sugestoes is None or self._sugestoes[0] is not do_banco:
+            nomes = {chave_empresa(n): n for n in self.empresas_padrao}
+            for nome in do_banco:
+                nomes.setdefault(chave_empresa(nome), nome)
+            self._sugestoes = (do_banco, sorted(nomes.values(), key=str.casefold))
+        return self._sugestoes[1]
+
+    def _confirmar_descarte(self, key_mes, indice):
+        """Confirma a edição que descarta a programação diária (QDC/molécula por dia) da linha"""
+        empresa = self.dados_por_mes[key_mes].empresa[indice]
+        return messagebox.askyesno(
+            "Programação Diária",
+            f"'{empresa}' tem programação diária (QDC/molécula por dia) salva no banco.\n\n"
+            "Alterar o volume ou a molécula substitui a programação por um valor único "
+            "e ela será apagada ao salvar. Continuar?", icon="warning")
+
+    def _update_row_total(self, key_mes, indice):
+        # Aplica só a diferença desta linha nas somas do mês
+        contratos = self.dados_por_mes[key_mes]
+        self.agregado.atualizar_linha(contratos.chaves[indice], key_mes,
+                                      contratos.preco(indice), contratos.volume[indice])
+        self._atualizar_rodape()
+
+    def _atualizar_rodape(self):
+        """Mostra o PMPV ao vivo a partir das somas correntes (O(1) por edição)"""
+        if not hasattr(self, 'lbl_pmpv'): return
+        
+        resultado = self.agregado.resultado(self._get_val(self.entry_conta_grafica))
+        if resultado is None:
+            self.lbl_pmpv.config(text="PMPV: ...")
+            self.lbl_final.config(text="PREÇO FINAL (PV): ...")
+            return
         
-        # Bind para cálculo
-        for e in [e_mol, e_trans, e_log]:
-            e.bind("<KeyRelease>", lambda event, d=dados: self._update_row_total(d))
-            
-        return dados
-
-    def _update_row_total(self, d):
-        total = self._get_val(d['mol']) + self._get_val(d['trans']) + self._get_val(d['log'])
-        d['lbl_soma'].config(text=f"{total:.4f}")
+        self.lbl_pmpv.config(text=f"PMPV (ao vivo): R$ {resultado['pmpv']:.4f}")
+        self.lbl_final.config(text=f"PREÇO FINAL (PV): R$ {resultado['preco_final']:.4f}")
 
     def _get_val(self, entry):
         try:
@@ -265,29 +315,22 @@ class CalculadoraTrimestralPMPV:
             return float(v) if v else 0.0
         except: return 0.0
 
-    def _adicionar_nova_linha(self, parent_frame, lista_referencia):
-        entry_dict = self._adicionar_linha_tabela(parent_frame, "Nova Empresa", lista_referencia)
-        lista_referencia.append(entry_dict)
-        entry_dict['nome'].focus_set()
-        entry_dict['nome'].select_range(0, tk.END)
+    def _adicionar_nova_linha(self, key_mes):
+        indice = self.dados_por_mes[key_mes].adicionar("Nova Empresa")
+        self.grades[key_mes].mostrar_linha(indice, 'empresa')
     
-    def _remover_linha(self, row_frame, dados, lista_referencia):
-        empresa = dados['nome'].get()
-        if messagebox.askyesno("Confirmar", f"Remover '{empresa}'?"):
-            row_frame.destroy()
-            if dados in lista_referencia:
-                lista_referencia.remove(dados)
+    def _remover_linha(self, key_mes, indice):
+        contratos = self.dados_por_mes[key_mes]
+        empresa = contratos.empresa[indice]
+        aviso = "\n\nA programação diária da linha também será apagada ao salvar." \
+            if contratos.tem_programacao(indice) else ""
+        if messagebox.askyesno("Confirmar", f"Remover '{empresa}'?{aviso}"):
+            self.agregado.remover_linha(contratos.chaves[indice])
+            contratos.remover(indice)
+            self.grades[key_mes].atualizar()
+            self._atualizar_rodape()
     
-    def _copiar_linha_para_outro_mes(self, dados_origem):
-        # Descobre qual "Mês X" estamos com base na lista de dados
-        mes_atual_key = None
-        for key, linhas in self.dados_por_mes.items():
-            if dados_origem in linhas:
-                mes_atual_key = key
-                break
-        
-        if not mes_atual_key: return
-        
+    def _copiar_linha_para_outro_mes(self, mes_atual_key, indice_origem):
         # Pega o nome real do mês para exibir na UI
         try:
             idx_aba = int(mes_atual_key.split()[-1]) - 1
@@ -302,7 +345,8 @@ class CalculadoraTrimestralPMPV:
         janela.grab_set()
         janela.configure(bg="#ecf0f1")
         
-        tk.Label(janela, text=f"Copiar '{dados_origem['nome'].get()}'\n(de {nome_mes_origem}) para:", 
+        nome_empresa = self.dados_por_mes[mes_atual_key].empresa[indice_origem]
+        tk.Label(janela, text=f"Copiar '{nome_empresa}'\n(de {nome_mes_origem}) para:", 
                  font=("Segoe UI", 11, "bold"), bg="#ecf0f1").pack(pady=15)
         
         # Botões para os outros meses
@@ -313,74 +357,62 @@ class CalculadoraTrimestralPMPV:
                 nome_destino = self.notebook.tab(i, "text").strip()
                 
                 tk.Button(janela, text=f"➡️ {nome_destino}", 
-                          command=lambda k=key_destino: self._executar_copia_linha(dados_origem, k, janela),
+                          command=lambda k=key_destino: self._executar_copia_linha(mes_atual_key, indice_origem, k, janela),
                           bg="#9b59b6", fg="white", font=("Segoe UI", 10),
                           padx=20, pady=8, relief="flat", cursor="hand2", width=20).pack(pady=5)
     
-    def _executar_copia_linha(self, dados_origem, mes_destino_key, janela):
+    def _executar_copia_linha(self, mes_origem_key, indice_origem, mes_destino_key, janela):
         janela.destroy()
+        origem = self.dados_por_mes[mes_origem_key]
         dados_destino = self.dados_por_mes[mes_destino_key]
         
         # Procura linha vazia ou cria nova se necessário
         destino = None
-        for d in dados_destino:
-            if d['nome'].get() == "Nova Empresa" or d['nome'].get() == "":
-                destino = d
+        for i, nome in enumerate(dados_destino.empresa):
+            if nome == "Nova Empresa" or nome == "":
+                destino = i
                 break
         
-        if not destino:
+        if destino is None:
              # Pega o nome amigável para o aviso
              idx = int(mes_destino_key.split()[-1]) - 1
              nome_amigavel = self.notebook.tab(idx, "text").strip()
              messagebox.showinfo("Aviso", f"Adicione uma linha vazia em '{nome_amigavel}' antes de copiar.")
              return
+        if dados_destino.tem_programacao(destino) and not self._confirmar_descarte(mes_destino_key, destino):
+            return
 
         # Copia valores
-        campos = ['nome', 'mol', 'trans', 'log', 'vol']
-        for campo in campos:
-            destino[campo].delete(0, tk.END)
-            destino[campo].insert(0, dados_origem[campo].get())
+        dados_destino.copiar_linha(destino, origem, indice_origem)
         
-        self._update_row_total(destino)
+        self._update_row_total(mes_destino_key, destino)
+        self.grades[mes_destino_key].atualizar()
         
         # Feedback visual
-        nome_empresa = dados_origem['nome'].get()
+        nome_empresa = origem.empresa[indice_origem]
         idx = int(mes_destino_key.split()[-1]) - 1
         nome_destino_amigavel = self.notebook.tab(idx, "text").strip()
         messagebox.showinfo("Sucesso", f"Empresa '{nome_empresa}' copiada para {nome_destino_amigavel}!")
 
     # --- LÓGICA DE CÁLCULO ---
     def calcular_trimestre(self):
-        custo_total_trimestre = 0.0
-        volume_total_trimestre = 0.0
-        
         try:
             conta_grafica = self._get_val(self.entry_conta_grafica)
         except:
             conta_grafica = 0.0
 
-        # Percorrer os 3 meses
-        for key_mes, linhas in self.dados_por_mes.items():
-            # Recupera quantos dias tem aquele mês (da config dinâmica)
-            dias_no_mes = self.dias_mes_config.get(key_mes, 30)
-            
-            for l in linhas:
-                qdc = self._get_val(l['vol']) # Volume Diário
-                
-                if qdc > 0:
-                    vol_mensal = qdc * dias_no_mes
-                    
-                    preco_unit = self._get_val(l['mol']) + self._get_val(l['trans']) + self._get_val(l['log'])
-                    
-                    custo_total_trimestre += (preco_unit * vol_mensal)
-                    volume_total_trimestre += vol_mensal
+        # Colunas já convertidas dos 3 meses (dias vêm da config dinâmica)
+        colunas = colunas_trimestre(self.dados_por_mes, self.dias_mes_config)
+        resultado = calcular_lote(conta_grafica=conta_grafica, **colunas)
+        volume_total_trimestre = float(resultado['volume_total'][0])
+        custo_total_trimestre = float(resultado['custo_total'][0])
 
         if volume_total_trimestre == 0:
             messagebox.showwarning("Dados Insuficientes", "Preencha o volume em pelo menos um mês.")
             return
 
-        pmpv = custo_total_trimestre / volume_total_trimestre
-        preco_final = pmpv + conta_grafica
+        pmpv = float(resultado['pmpv'][0])
+        preco_final = float(resultado['preco_final'][0])
         
         # Atualiza Interface
         self.lbl_pmpv.config(text=f"PMPV Calculado: R$ {pmpv:.4f}")
@@ -402,46 +434,87 @@ class CalculadoraTrimestralPMPV:
     # --- INTEGRAÇÃO ---
     def _extrair_dados_dict(self):
         dados_export = {}
-        for key_mes, linhas in self.dados_por_mes.items():
+        for key_mes, contratos in self.dados_por_mes.items():
             # Usa o nome amigável (Janeiro, Fevereiro...) para o Excel ficar bonito
             idx = int(key_mes.split()[-1]) - 1
             nome_real = self.notebook.tab(idx, "text").strip().split(" ")[0] # Pega só "Janeiro"
             
-            lista_mes = []
-            for l in linhas:
-                if l['nome'].get():
-                    lista_mes.append({
-                        'empresa': l['nome'].get(),
-                        'molecula': self._get_val(l['mol']),
-                        'transporte': self._get_val(l['trans']),
-                        'logistica': self._get_val(l['log']),
-                        'volume': self._get_val(l['vol'])
-                    })
-            dados_export[nome_real] = lista_mes # Salva com nome real ("Janeiro")
+            dados_export[nome_real] = contratos.para_dicts() # Salva com nome real ("Janeiro")
         return dados_export
 
     def salvar_sessao(self):
-        nome = simpledialog.askstring("Salvar Sessão", "Nome do Trimestre (ex: Q1 2026):")
-        if not nome: return
-        
-        sessao_id = self.db.criar_sessao(nome)
-        dados_ui = self._extrair_dados_dict()
+        if self.tarefas.em_andamento("Salvando sessão") or self._carregando: return
+        
+        nome = self.sessao_nome
+        nova = self.sessao_id is None
+        if not nova:
+            resposta = messagebox.askyesnocancel(
+                "Salvar Sessão", f"Atualizar a sessão '{nome}'?\n\n(Não = salvar como nova sessão)")
+            if resposta is None: return
+            nova = not resposta
+        
+        if nova:
+            nome = simpledialog.askstring("Salvar Sessão", "Nome do Trimestre (ex: Q1 2026):")
+            if not nome: return
+        
+        # Sessão antiga sem calendário: o trimestre da tela só é gravado se o usuário confirmar
+        calendario = self._calendario()
+        if self._sessao_sem_calendario:
+            resposta = messagebox.askyesnocancel(
+                "Salvar Sessão",
+                f"A sessão '{self.sessao_nome}' não tem calendário gravado.\n"
+                f"Gravar o trimestre da tela ({self.combo_mes_inicio.get()}/{calendario['ano']}, "
+                f"dias {calendario['dias']})?\n\n(Não = salvar sem calendário)")
+            if resposta is None: return
+            if not resposta:
+                calendario = None
         
         # Salva usando índice 1, 2, 3 (a ordem importa, não o nome)
-        idx = 1
-        for nome_mes, dados in dados_ui.items():
-            self.db.salvar_dados_mes(sessao_id, idx, dados)
-            idx += 1
-            
-        if hasattr(self, 'ultimo_resultado'):
-            self.db.salvar_resultado(
-                sessao_id, 
-                self.ultimo_resultado['volume_total'],
-                self.ultimo_resultado['pmpv'],
-                self.ultimo_resultado['custo_total']
-            )
-            
-        messagebox.showinfo("Salvo", f"Sessão '{nome}' salva com sucesso!")
+        # Só vão para o banco as linhas alteradas e as removidas; numa sessão nova
+        # vão todas (com cópia das programações diárias), e a tela só deixa a
+        # sessão atual quando a gravação termina
+        modelos = dict(enumerate(self.dados_por_mes.values(), start=1))
+        chaves, alteracoes = {}, {}
+        for idx, contratos in modelos.items():
+            chaves[idx], alteracoes[idx] = contratos.alteracoes(nova)
+        
+        resultado = getattr(self, 'ultimo_resultado', None)
+        if resultado is self._resultado_salvo and not nova:
+            resultado = None
+        
+        def concluido(salvo):
+            self.sessao_id, ids_por_mes = salvo
+            self.sessao_nome = nome
+            self._sessao_sem_calendario = calendario is None
+            if resultado is not None or nova:
+                self._resultado_salvo = resultado
+            for idx, contratos in modelos.items():
+                contratos.confirmar_salvamento(chaves[idx], ids_por_mes.get(idx, []), nova)
+            messagebox.showinfo("Salvo", f"Sessão '{nome}' salva com sucesso!")
+        
+        def falhou(erro=None):
+            # Nada foi gravado: as pendências voltam para o modelo
+            for idx, contratos in modelos.items():
+                contratos.cancelar_salvamento(chaves[idx], alteracoes[idx]['removidos'])
+            if erro is not None:
+                messagebox.showerror("Erro", f"Não foi possível salvar a sessão '{nome}'.\n{erro}")
+        
+        self.tarefas.iniciar("Salvando sessão", self._tarefa_salvar, self.db, 
+                             alteracoes, resultado, None if nova else self.sessao_id, nome, calendario,
+                             ao_concluir=concluido, ao_erro=falhou, ao_cancelar=falhou)
+
+    @staticmethod
+    def _tarefa_salvar(contexto, db, alteracoes, resultado, sessao_id, nome, calendario):
+        # O DatabasePMPV é compartilhado com a tela: a listagem continua lendo durante a gravação
+        contexto.ao_cancelar(db.conn.interrupt)
+        contexto.progresso(None, f"Gravando sessão '{nome}'...")
+        salvo = db.sincronizar_sessao(alteracoes, resultado, sessao_id=sessao_id, nome=nome,
+                                      calendario=calendario)
+        
+        if salvo is None:
+            contexto.verificar_cancelamento()
+            raise RuntimeError("Erro ao gravar no banco de dados.")
+        return salvo
 
     def exportar_excel(self):
         if not hasattr(self, 'ultimo_resultado'):
@@ -450,19 +523,261 @@ class CalculadoraTrimestralPMPV:
             
         dados_ui = self._extrair_dados_dict() # Agora vem com nomes reais (Janeiro...)
         
-        try:
-            # Precisamos converter de volta para "Mês 1", "Mês 2" pro ExcelHandler entender
-            # Ou ajustar o ExcelHandler. Vamos ajustar os dados aqui rápido:
-            dados_formatados = {}
-            i = 1
-            for nome_real, dados in dados_ui.items():
-                dados_formatados[f"Mês {i}"] = dados
-                i += 1
-
-            arquivo = ExcelHandlerPMPV.exportar_trimestre(dados_formatados, self.ultimo_resultado)
-            messagebox.showinfo("Excel", f"Gerado: {arquivo}")
-        except Exception as e:
-            messagebox.showerror("Erro", str(e))
+        # Precisamos converter de volta para "Mês 1", "Mês 2" pro ExcelHandler entender
+        dados_formatados = {}
+        i = 1
+        for nome_real, dados in dados_ui.items():
+            dados_formatados[f"Mês {i}"] = dados
+            i += 1
+        
+        resultado = self.ultimo_resultado
+        dias = list(self.dias_mes_config.values())
+        self.tarefas.iniciar(
+            "Exportando Excel",
+            lambda contexto: self.cache_exportacao.exportar(
+                dados_formatados, resultado, dias_por_mes=dias,
+                conta_grafica=resultado.get('conta_grafica', 0.0), progresso=contexto.progresso),
+            ao_concluir=lambda arquivo: messagebox.showinfo("Excel", f"Gerado: {arquivo}"),
+            ao_erro=lambda e: messagebox.showerror("Erro", str(e))
+        )
+
+    def importar_excel(self):
+        if self._carregando: return
+        if self.tarefas.em_andamento("Salvando sessão"):
+            messagebox.showwarning("Aviso", "Aguarde o salvamento terminar.")
+            return
+        caminho = filedialog.askopenfilename(
+            title="Importar Excel", filetypes=[("Planilhas Excel", "*.xlsx"), ("Todos", "*.*")])
+        if not caminho: return
+        
+        self.tarefas.iniciar(
+            "Importando Excel",
+            lambda contexto: ExcelHandlerPMPV.importar_excel(caminho, progresso=contexto.progresso),
+            ao_concluir=self._aplicar_importacao,
+            ao_erro=lambda e: messagebox.showerror("Erro", str(e))
+        )
+
+    def _aplicar_importacao(self, dados_por_mes):
+        """Coloca os dados importados na tela como uma sessão nova (ainda não salva)"""
+        if self.tarefas.em_andamento("Salvando sessão"):
+            # O salvamento ligaria as linhas importadas à sessão que está gravando
+            messagebox.showwarning("Aviso", "O arquivo foi lido durante um salvamento. "
+                                            "Aguarde o salvamento terminar e importe de novo.")
+            return
+        if not messagebox.askyesno("Importar Excel", "Substituir os dados da tela pelos do arquivo?"):
+            return
+        
+        def numero(valor):
+            return converter_numero(str(valor)) or 0.0
+        
+        for key_mes in self.dados_por_mes:
+            contratos = ContratosMes()
+            for linha in dados_por_mes.get(key_mes, []):
+                contratos.adicionar(str(linha['empresa']), numero(linha['molecula']), 
+                                    numero(linha['transporte']), numero(linha['logistica']), 
+                                    numero(linha['volume']))
+            self._trocar_contratos_mes(key_mes, contratos)
+        
+        self.sessao_id = None
+        self.sessao_nome = ""
+        self._sessao_sem_calendario = False
+        self._resultado_salvo = None
+        if hasattr(self, 'ultimo_resultado'):
+            del self.ultimo_resultado
+        self._atualizar_rodape()
+
+    # --- TAREFAS EM SEGUNDO PLANO ---
+    def _atualizar_status(self, nome, fracao, mensagem):
+        """Barra de status: chamada pelo ExecutorTarefas na thread do Tk"""
+        self.lbl_status.config(text=mensagem or nome or "Pronto")
+        if nome is None:
+            self.barra_progresso.stop()
+            self.barra_progresso.config(mode="determinate", value=0.0)
+            self.btn_cancelar.config(state="disabled")
+            return
+        
+        self.btn_cancelar.config(state="normal")
+        if fracao is None:
+            if str(self.barra_progresso.cget("mode")) != "indeterminate":
+                self.barra_progresso.config(mode="indeterminate")
+                self.barra_progresso.start(15)
+        else:
+            self.barra_progresso.stop()
+            self.barra_progresso.config(mode="determinate", value=fracao)
+
+    def _fechar(self):
+        if self.tarefas.em_andamento():
+            if not messagebox.askyesno("Sair", "Há uma tarefa em andamento. Cancelar e sair?"):
+                return
+        self.tarefas.encerrar()
+        self.root.destroy()
+
+    # --- NAVEGADOR DE SESSÕES ---
+    def abrir_navegador_sessoes(self):
+        """Janela com as sessões salvas, carregadas por páginas conforme a rolagem"""
+        janela = tk.Toplevel(self.root)
+        janela.title("Sessões Salvas")
+        janela.geometry("760x480")
+        janela.transient(self.root)
+        janela.configure(bg="#ecf0f1")
+        
+        frame_busca = tk.Frame(janela, bg="#ecf0f1", pady=8, padx=10)
+        frame_busca.pack(fill="x")
+        tk.Label(frame_busca, text="🔎 Buscar:", font=("Segoe UI", 10, "bold"), 
+                 bg="#ecf0f1").pack(side="left")
+        entry_busca = tk.Entry(frame_busca, font=("Segoe UI", 10), relief="solid", bd=1)
+        entry_busca.pack(side="left", fill="x", expand=True, padx=5, ipady=3)
+        
+        frame_lista = tk.Frame(janela, bg="#ecf0f1", padx=10)
+        frame_lista.pack(fill="both", expand=True)
+        tree = ttk.Treeview(frame_lista, columns=("nome", "modificacao", "pmpv"), show="headings")
+        tree.heading("nome", text="Sessão")
+        tree.heading("modificacao", text="Modificada em")
+        tree.heading("pmpv", text="PMPV (R$/m³)")
+        tree.column("nome", width=360)
+        tree.column("modificacao", width=180, anchor="center")
+        tree.column("pmpv", width=140, anchor="center")
+        scroll = ttk.Scrollbar(frame_lista, orient="vertical", command=tree.yview)
+        tree.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+        
+        estado = {'apos': None, 'fim': False, 'carregando': False, 'busca': "", 'agendado': None}
+        
+        def carregar_pagina():
+            estado['carregando'] = False
+            if estado['fim']: return
+            pagina = self.db.listar_sessoes_pagina(limite=50, apos=estado['apos'], busca=estado['busca'])
+            for sessao in pagina:
+                if tree.exists(str(sessao['id'])): continue
+                pmpv = sessao['pmpv_trimestral']
+                tree.insert("", tk.END, iid=str(sessao['id']), values=(
+                    sessao['nome'], sessao['data_modificacao'],
+                    f"{pmpv:.4f}" if pmpv is not None else "-"))
+            if len(pagina) < 50:
+                estado['fim'] = True
+            else:
+                estado['apos'] = (pagina[-1]['data_modificacao'], pagina[-1]['id'])
+        
+        def ao_rolar(inicio, fim):
+            scroll.set(inicio, fim)
+            # Perto do fim da lista: busca a próxima página
+            if float(fim) >= 0.98 and not estado['fim'] and not estado['carregando']:
+                estado['carregando'] = True
+                janela.after_idle(carregar_pagina)
+        
+        def recarregar():
+            estado.update(apos=None, fim=False, busca=entry_busca.get(), agendado=None)
+            tree.delete(*tree.get_children())
+            carregar_pagina()
+        
+        def ao_digitar(event):
+            # Espera o usuário parar de digitar antes de consultar
+            if estado['agendado']:
+                janela.after_cancel(estado['agendado'])
+            estado['agendado'] = janela.after(300, recarregar)
+        
+        def abrir():
+            selecao = tree.selection()
+            if not selecao: return
+            janela.destroy()
+            self.carregar_sessao(int(selecao[0]))
+        
+        tree.configure(yscrollcommand=ao_rolar)
+        entry_busca.bind("<KeyRelease>", ao_digitar)
+        tree.bind("<Double-1>", lambda e: abrir())
+        
+        tk.Button(janela, text="📂 Abrir", command=abrir, bg="#16a085", fg="white",
+                  font=("Segoe UI", 10, "bold"), padx=20, pady=6, relief="flat", 
+                  cursor="hand2").pack(pady=10)
+        
+        carregar_pagina()
+        entry_busca.focus_set()
+    
+    def carregar_sessao(self, sessao_id):
+        """
+        Substitui os 3 meses da tela pelos dados de uma sessão salva.
+        
+        Uma única consulta (DatabasePMPV.iterar_sessao) é lida em lotes; cada
+        lote vai para o modelo num callback `after_idle`, então a janela continua
+        respondendo enquanto uma sessão grande é carregada.
+        """
+        if self._carregando: return
+        if self.tarefas.em_andamento("Salvando sessão"):
+            messagebox.showwarning("Aviso", "Aguarde o salvamento terminar.")
+            return
+        self._carregando = True
+        
+        lotes = self.db.iterar_sessao(sessao_id)
+        chaves_mes = list(self.dados_por_mes)
+        novos = {key_mes: ContratosMes() for key_mes in chaves_mes}
+        estado = {'nome': None, 'linhas': 0, 'calendario': None}
+        self.root.config(cursor="watch")
+        
+        def proximo_lote():
+            try:
+                lote = next(lotes, None)
+            except Exception as e:
+                terminar(erro=str(e))
+                return
+            if lote is None:
+                terminar()
+                return
+            
+            estado['nome'] = lote[0]['nome']
+            estado['calendario'] = (lote[0]['ano'], lote[0]['mes_inicial'],
+                                    [lote[0][f'dias_mes_{mes}'] for mes in (1, 2, 3)])
+            for row in lote:
+                if row['id'] is None or not 1 <= row['mes'] <= len(chaves_mes): continue
+                novos[chaves_mes[row['mes'] - 1]].adicionar(
+                    row['empresa'], row['molecula'] or 0.0, row['transporte'] or 0.0,
+                    row['logistica'] or 0.0, row['volume'] or 0.0, id_banco=row['id'],
+                    programada=bool(row['programada']))
+            estado['linhas'] += len(lote)
+            self.lbl_pmpv.config(text=f"Carregando sessão... {estado['linhas']:,} linhas")
+            self.root.after_idle(proximo_lote)
+        
+        def terminar(erro=None):
+            self._carregando = False
+            self.root.config(cursor="")
+            if erro or estado['nome'] is None:
+                self._atualizar_rodape()
+                messagebox.showerror("Erro", erro or f"Sessão {sessao_id} não encontrada.")
+                return
+            
+            ano, mes_inicial, dias = estado['calendario']
+            if mes_inicial:
+                # Sessão com calendário gravado: a tela volta para o mesmo trimestre,
+                # com os dias gravados (podem ter sido ajustados à mão)
+                self.combo_mes_inicio.set(self.lista_meses[mes_inicial - 1])
+                if ano:
+                    self.var_ano.set(str(ano))
+                self._atualizar_trimestre(dias=dias if None not in dias else None)
+            
+            for key_mes in chaves_mes:
+                self._trocar_contratos_mes(key_mes, novos[key_mes])
+            
+            self.sessao_id = sessao_id
+            self.sessao_nome = estado['nome']
+            self._sessao_sem_calendario = not mes_inicial
+            self._resultado_salvo = None
+            if hasattr(self, 'ultimo_resultado'):
+                del self.ultimo_resultado
+            self._atualizar_rodape()
+        
+        proximo_lote()
+    
+    def _trocar_contratos_mes(self, key_mes, contratos):
+        """Coloca um novo modelo no mês e refaz a contribuição dele no rodapé"""
+        for chave in self.dados_por_mes[key_mes].chaves:
+            self.agregado.remover_linha(chave)
+        for indice, chave in enumerate(contratos.chaves):
+            self.agregado.atualizar_linha(chave, key_mes, contratos.preco(indice), contratos.volume[indice])
+        
+        self.dados_por_mes[key_mes] = contratos
+        grade = self.grades[key_mes]
+        grade.linhas = contratos
+        grade.topo = 0
+        grade.atualizar()
 
 if __name__ == "__main__":
     root = tk.Tk()
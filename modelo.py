@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Modelo de Dados dos Contratos
+Valores convertidos uma única vez (na edição) e guardados em colunas tipadas
+"""
+
+import math
+from array import array
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+
+
+CAMPOS_NUMERICOS = ('molecula', 'transporte', 'logistica', 'volume')
+
+# Chaves únicas entre todos os meses (usadas pelo AgregadoTrimestre)
+_chaves = count()
+
+
+def converter_numero(texto: str) -> Optional[float]:
+    """
+    Converte o texto digitado (aceita vírgula ou ponto) em float.
+
+    Returns:
+        O valor (0.0 para texto vazio) ou None se o texto não é um número
+        finito ("nan", "inf" e "1e400" são inválidos)
+    """
+    texto = texto.strip().replace(',', '.')
+    if not texto:
+        return 0.0
+    try:
+        valor = float(texto)
+    except ValueError:
+        return None
+    return valor if math.isfinite(valor) else None
+
+
+def formatar_numero(valor: float) -> str:
+    """Texto exibido na grade para um valor (vazio para zero)"""
+    if not valor:
+        return ""
+    return f"{valor:.10f}".rstrip('0').rstrip('.')
+
+
+class ContratosMes:
+    """
+    Contratos de um mês guardados em colunas.
+
+    Empresas ficam numa lista; preços e QDC em `array('d')`, prontos para o
+    motor de cálculo, a exportação e o banco sem passar de novo por texto.
+
+    Cada linha também guarda o id que tem no banco (0 = ainda não salva). As
+    linhas alteradas e os ids removidos desde o último salvamento são anotados,
+    para que salvar grave só a diferença (DatabasePMPV.sincronizar_sessao).
+
+    Linhas com programação diária no banco (QDC/molécula por dia) guardam em
+    `programacao` o id da linha dona da programação; volume e molécula são os
+    equivalentes. Mudar um dos dois descarta a programação (a tela confirma
+    antes, veja descartaria_programacao); salvar como sessão nova a copia.
+    """
+
+    __slots__ = ('chaves', 'ids_banco', 'empresa', 'molecula', 'transporte', 'logistica',
+                 'volume', 'programacao', 'sujas', 'removidos')
+
+    def __init__(self):
+        self.chaves = array('q')
+        self.ids_banco = array('q')
+        self.empresa: List[str] = []
+        self.molecula = array('d')
+        self.transporte = array('d')
+        self.logistica = array('d')
+        self.volume = array('d')
+        self.programacao = array('q')  # id da linha com a programação diária (0 = sem)
+        self.sujas = set()           # chaves alteradas desde o último salvamento
+        self.removidos = array('q')  # ids do banco a apagar no próximo salvamento
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def adicionar(self, empresa: str, molecula: float = 0.0, transporte: float = 0.0,
+                  logistica: float = 0.0, volume: float = 0.0, id_banco: int = 0,
+                  programada: bool = False) -> int:
+        """
+        Adiciona um contrato no fim do mês.
+
+        Args:
+            id_banco: Id da linha no banco (linhas carregadas já nascem salvas)
+            programada: A linha `id_banco` tem programação diária no banco
+
+        Returns:
+            Índice da linha criada
+        """
+        chave = next(_chaves)
+        self.chaves.append(chave)
+        self.ids_banco.append(id_banco)
+        if not id_banco:
+            self.sujas.add(chave)
+        self.empresa.append(empresa)
+        self.molecula.append(molecula)
+        self.transporte.append(transporte)
+        self.logistica.append(logistica)
+        self.volume.append(volume)
+        self.programacao.append(id_banco if programada else 0)
+        return len(self.chaves) - 1
+
+    def remover(self, indice: int):
+        """Remove o contrato da posição `indice`"""
+        if self.ids_banco[indice]:
+            self.removidos.append(self.ids_banco[indice])
+        self.sujas.discard(self.chaves[indice])
+        for coluna in (self.chaves, self.ids_banco, self.empresa, self.programacao) + self._numericas():
+            del coluna[indice]
+
+    def definir_texto(self, indice: int, campo: str, texto: str) -> bool:
+        """
+        Atualiza um campo a partir do texto digitado na grade.
+
+        Returns:
+            False se o texto não é um número válido (o valor fica 0.0)
+        """
+        if campo == 'empresa':
+            valor = texto
+        elif texto.strip() == self.texto(indice, campo):
+            # Texto exibido sem mudança (ex: só passou pelo campo): mantém o valor
+            # exato, que a exibição arredonda (equivalentes da programação diária)
+            return True
+        else:
+            valor = converter_numero(texto)
+        valido = valor is not None
+
+        coluna = getattr(self, campo)
+        valor = valor if valido else 0.0
+        if coluna[indice] != valor:
+            coluna[indice] = valor
+            self.sujas.add(self.chaves[indice])
+            if campo in ('volume', 'molecula'):
+                self.programacao[indice] = 0
+        return valido
+
+    def tem_programacao(self, indice: int) -> bool:
+        """A linha tem programação diária (QDC/molécula por dia) no banco?"""
+        return bool(self.programacao[indice])
+
+    def descartaria_programacao(self, indice: int, campo: str, texto: str) -> bool:
+        """definir_texto(indice, campo, texto) descartaria a programação diária da linha?"""
+        if not self.programacao[indice] or campo not in ('volume', 'molecula'):
+            return False
+        if texto.strip() == self.texto(indice, campo):
+            return False
+        return (converter_numero(texto) or 0.0) != getattr(self, campo)[indice]
+
+    def texto(self, indice: int, campo: str) -> str:
+        """Texto de um campo para exibir na grade"""
+        if campo == 'empresa':
+            return self.empresa[indice]
+        return formatar_numero(getattr(self, campo)[indice])
+
+    def preco(self, indice: int) -> float:
+        """Preço final (molécula + transporte + logística) de uma linha"""
+        return self.molecula[indice] + self.transporte[indice] + self.logistica[indice]
+
+    def copiar_linha(self, indice_destino: int, origem: 'ContratosMes', indice_origem: int):
+        """Copia empresa e valores de uma linha de outro mês (mantém a chave do destino)"""
+        self.empresa[indice_destino] = origem.empresa[indice_origem]
+        for campo in CAMPOS_NUMERICOS:
+            getattr(self, campo)[indice_destino] = getattr(origem, campo)[indice_origem]
+        # A programação diária é do contrato no mês de origem (o número de dias pode ser outro)
+        self.programacao[indice_destino] = 0
+        self.sujas.add(self.chaves[indice_destino])
+
+    def _numericas(self):
+        return (self.molecula, self.transporte, self.logistica, self.volume)
+
+    def _dict_linha(self, indice: int) -> Dict:
+        return {
+            'empresa': self.empresa[indice],
+            'molecula': self.molecula[indice],
+            'transporte': self.transporte[indice],
+            'logistica': self.logistica[indice],
+            'volume': self.volume[indice]
+        }
+
+    def alteracoes(self, nova: bool = False) -> Tuple[List[int], Dict]:
+        """
+        Diferença desde o último salvamento, no formato de DatabasePMPV.sincronizar_sessao.
+
+        As pendências saem do modelo neste momento: o que for editado enquanto o
+        banco grava fica anotado para o próximo salvamento. Se a gravação falhar,
+        devolva-as com `cancelar_salvamento`.
+
+        Linhas já salvas cuja empresa foi apagada saem do banco (como na
+        exportação, linha sem empresa não é gravada).
+
+        Args:
+            nova: Salvar como sessão nova: vão todas as linhas, sem id (as que têm
+                  programação diária levam 'programacao_de'). Os ids e as remoções
+                  da sessão atual só são esquecidos em confirmar_salvamento, então
+                  uma gravação que falha deixa o modelo ligado à sessão atual.
+
+        Returns:
+            (chaves das linhas enviadas, {'linhas': [...], 'removidos': [...]})
+        """
+        chaves, linhas = [], []
+        removidos = [] if nova else list(self.removidos)
+        pendentes = set()
+        for indice, chave in enumerate(self.chaves):
+            if not nova and chave not in self.sujas:
+                continue
+            if not self.empresa[indice]:
+                if nova:
+                    # Não vai para a sessão nova; continua pendente para a atual
+                    if chave in self.sujas:
+                        pendentes.add(chave)
+                    continue
+                # Fica pendente até ter empresa; se estava no banco, sai de lá
+                pendentes.add(chave)
+                if self.ids_banco[indice]:
+                    removidos.append(self.ids_banco[indice])
+                    self.ids_banco[indice] = 0
+                continue
+            linha = self._dict_linha(indice)
+            if self.ids_banco[indice] and not nova:
+                linha['id'] = self.ids_banco[indice]
+            if self.programacao[indice] and (nova or self.programacao[indice] != self.ids_banco[indice]):
+                # Sessão nova: o banco copia a programação da linha de origem
+                linha['programacao_de'] = self.programacao[indice]
+            chaves.append(chave)
+            linhas.append(linha)
+
+        self.sujas = pendentes
+        if not nova:
+            del self.removidos[:]
+        return chaves, {'linhas': linhas, 'removidos': removidos}
+
+    def confirmar_salvamento(self, chaves: List[int], ids: List[int], nova: bool = False):
+        """
+        Registra os ids que as linhas enviadas receberam no banco.
+
+        Args:
+            nova: O salvamento foi de `alteracoes(nova=True)`: o modelo passa para
+                  a sessão nova e esquece os ids e as remoções da anterior
+        """
+        if nova:
+            for indice in range(len(self.ids_banco)):
+                self.ids_banco[indice] = 0
+            del self.removidos[:]
+        posicoes = {chave: indice for indice, chave in enumerate(self.chaves)}
+        for chave, id_banco in zip(chaves, ids):
+            indice = posicoes.get(chave)
+            if indice is None:
+                # Removida enquanto o banco gravava: apaga no próximo salvamento
+                self.removidos.append(id_banco)
+            else:
+                self.ids_banco[indice] = id_banco
+                if self.programacao[indice]:
+                    self.programacao[indice] = id_banco
+
+    def cancelar_salvamento(self, chaves: List[int], removidos: List[int]):
+        """Devolve as pendências de um salvamento que não foi gravado"""
+        self.sujas.update(chaves)
+        self.removidos.extend(removidos)
+
+    def para_dicts(self) -> List[Dict]:
+        """Linhas com empresa preenchida, no formato usado pelo banco e pelo Excel"""
+        return [
+            {'empresa': emp, 'molecula': mol, 'transporte': trans, 'logistica': log, 'volume': vol}
+            for emp, mol, trans, log, vol in zip(self.empresa, *self._numericas())
+            if emp
+        ]
+
+
+def colunas_trimestre(meses: Dict[str, ContratosMes], dias_por_mes: Dict[str, float]) -> Dict[str, array]:
+    """
+    Junta as colunas dos meses para o motor de cálculo (calculo.calcular_lote).
+
+    Args:
+        meses: {"Mês 1": ContratosMes, ...}
+        dias_por_mes: {"Mês 1": 30, ...}
+
+    Returns:
+        Dicionário com as colunas molecula, transporte, logistica, qdc e dias
+    """
+    colunas = {campo: array('d') for campo in ('molecula', 'transporte', 'logistica', 'qdc', 'dias')}
+    for mes, contratos in meses.items():
+        colunas['molecula'].extend(contratos.molecula)
+        colunas['transporte'].extend(contratos.transporte)
+        colunas['logistica'].extend(contratos.logistica)
+        colunas['qdc'].extend(contratos.volume)
+        colunas['dias'].extend(array('d', [dias_por_mes.get(mes, 30)]) * len(contratos))
+    return colunas
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+Linha de comando da Calculadora PMPV (sem interface gráfica)
+
+Uso:
+    python -m pmpv --help
+"""
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Linha de comando da Calculadora PMPV
+
+    python -m pmpv calc   dados.json --mes-inicial 1 --conta-grafica -0.021
+    python -m pmpv save   dados.xlsx --nome "Q1 2026" --mes-inicial 1 --ano 2026
+    python -m pmpv export 12 --saida Q1_2026.xlsx
+    python -m pmpv import PMPV_Trimestral_20260101.xlsx   (ou uma pasta)
+    python -m pmpv list   --busca 2026
+    python -m pmpv rebuild                                (recalcula resumo_mes)
+    python -m pmpv calendar 12 --mes-inicial 1 --ano 2026  (calendário de uma sessão antiga)
+
+Os módulos pesados (tkinter, numpy, openpyxl, sqlite) são importados só
+dentro do subcomando que precisa deles: `calc` com JSON não carrega nenhum.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from typing import Dict, List
+
+# Os módulos do projeto ficam na pasta acima (permite rodar de qualquer diretório, ex: cron)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MESES = ("Mês 1", "Mês 2", "Mês 3")
+CAMPOS_NUMERICOS = ('molecula', 'transporte', 'logistica', 'volume')
+
+
+class EntradaInvalida(ValueError):
+    """Dados do trimestre que não dá para calcular (a mensagem vai para o stderr)"""
+
+
+# --- ENTRADA ---
+def _numero(valor, onde: str) -> float:
+    """Valor numérico finito de uma linha do JSON: null vale 0 e texto aceita vírgula ("10,5")"""
+    from modelo import converter_numero
+
+    if valor is None:
+        return 0.0
+    numero = None
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        try:
+            numero = float(valor)
+        except OverflowError:
+            pass
+    elif isinstance(valor, str):
+        numero = converter_numero(valor)
+    # 1e400, Infinity e NaN chegam do json.loads como float não finito
+    if numero is not None and math.isfinite(numero):
+        return numero
+    raise EntradaInvalida(f"{onde}: valor inválido {json.dumps(valor, ensure_ascii=False)}")
+
+
+def _normalizar_linhas(mes: str, linhas) -> List[Dict]:
+    """Linhas de um mês com empresa em texto e os campos numéricos já em float"""
+    if not isinstance(linhas, list):
+        raise EntradaInvalida(f"{mes}: esperava uma lista de linhas")
+    normalizadas = []
+    for numero, linha in enumerate(linhas, start=1):
+        if not isinstance(linha, dict):
+            raise EntradaInvalida(f"{mes}, linha {numero}: esperava um objeto com empresa e valores")
+        empresa = linha.get('empresa')
+        normalizadas.append(dict(
+            {campo: _numero(linha.get(campo), f"{mes}, linha {numero}, {campo}") for campo in CAMPOS_NUMERICOS},
+            empresa="" if empresa is None else str(empresa).strip()
+        ))
+    return normalizadas
+
+
+def _normalizar_meses(dados: Dict) -> Dict[str, List[Dict]]:
+    """Aceita chaves "Mês 1", "mes_1" (exportar_para_dict) ou "1" e devolve "Mês N" """
+    if isinstance(dados, dict) and isinstance(dados.get('dados'), dict):
+        dados = dados['dados']
+    if not isinstance(dados, dict):
+        raise EntradaInvalida('esperava um objeto {"Mês 1": [...], "Mês 2": [...], "Mês 3": [...]}')
+    meses = {mes: [] for mes in MESES}
+    for chave, linhas in dados.items():
+        numero = str(chave).replace("Mês", "").replace("mes_", "").strip()
+        if numero in ("1", "2", "3"):
+            meses[f"Mês {numero}"] = _normalizar_linhas(f"Mês {numero}", linhas)
+    return meses
+
+
+def _ler_entrada(caminho: str) -> Dict[str, List[Dict]]:
+    """Dados do trimestre de um JSON (ou '-' para stdin) ou de uma planilha .xlsx"""
+    if caminho.lower().endswith(".xlsx"):
+        from excel_handler import ExcelHandlerPMPV
+        return _normalizar_meses(ExcelHandlerPMPV.importar_excel(caminho))
+    try:
+        if caminho == "-":
+            return _normalizar_meses(json.load(sys.stdin))
+        with open(caminho, encoding="utf-8") as f:
+            return _normalizar_meses(json.load(f))
+    except json.JSONDecodeError as e:
+        raise EntradaInvalida(f"JSON inválido: {e}") from e
+
+
+def _dias(args) -> Dict[str, float]:
+    if args.dias:
+        return dict(zip(MESES, args.dias))
+    if args.mes_inicial:
+        from calculo import dias_trimestre
+        return dict(zip(MESES, dias_trimestre(args.mes_inicial, args.bissexto, ano=args.ano)))
+    return {mes: 30 for mes in MESES}
+
+
+def _calcular(dados_por_mes: Dict[str, List[Dict]], dias_por_mes: Dict[str, float],
+              conta_grafica: float):
+    """Resultado do trimestre (somas em Python puro: sem o custo de importar o NumPy)"""
+    from calculo import AgregadoTrimestre
+
+    agregado = AgregadoTrimestre(MESES)
+    for mes, dias in dias_por_mes.items():
+        agregado.definir_dias(mes, dias)
+    chave = 0
+    for mes in MESES:
+        for linha in dados_por_mes[mes]:
+            preco = linha['molecula'] + linha['transporte'] + linha['logistica']
+            agregado.atualizar_linha(chave, mes, preco, linha['volume'])
+            chave += 1
+    agregado.recalcular()
+    resultado = agregado.resultado(conta_grafica)
+    if resultado is not None and not all(math.isfinite(valor) for valor in resultado.values()):
+        raise EntradaInvalida("valores grandes demais para o cálculo")
+    return resultado
+
+
+# --- SUBCOMANDOS ---
+def cmd_calc(args) -> int:
+    dados = _ler_entrada(args.arquivo)
+    dias = _dias(args)
+    resultado = _calcular(dados, dias, args.conta_grafica)
+
+    if args.json:
+        print(json.dumps({'dias': list(dias.values()), 'resultado': resultado}, ensure_ascii=False))
+    elif resultado is None:
+        print("Sem volume: nenhuma linha com QDC > 0.")
+    else:
+        print(f"Dias por mês:          {', '.join(str(d) for d in dias.values())}")
+        print(f"Volume Total (m³):     {resultado['volume_total']:,.2f}")
+        print(f"Custo Total (R$):      {resultado['custo_total']:,.2f}")
+        print(f"PMPV (R$/m³):          {resultado['pmpv']:.4f}")
+        print(f"Conta Gráfica (R$):    {resultado['conta_grafica']:.4f}")
+        print(f"Preço Final (R$/m³):   {resultado['preco_final']:.4f}")
+    return 0 if resultado is not None else 1
+
+
+def cmd_save(args) -> int:
+    from database import DatabasePMPV
+
+    dados = _ler_entrada(args.arquivo)
+    dias = _dias(args)
+    resultado = _calcular(dados, dias, args.conta_grafica)
+    # Só grava o calendário informado (os 30 dias padrão não são um calendário)
+    calendario = None
+    if args.dias or args.mes_inicial:
+        calendario = {'ano': args.ano, 'mes_inicial': args.mes_inicial, 'dias': list(dias.values())}
+    db = DatabasePMPV(args.banco, perfil=args.perfil or "duravel")
+    try:
+        sessao_id = db.salvar_sessao_completa(
+            args.nome, {i: [l for l in dados[mes] if l.get('empresa')] for i, mes in enumerate(MESES, start=1)},
+            resultado, observacoes=args.observacoes, calendario=calendario
+        )
+    finally:
+        db.fechar()
+    if sessao_id is None:
+        return 1
+    print(sessao_id)
+    return 0
+
+
+def cmd_export(args) -> int:
+    from database import DatabasePMPV
+    from exportacao_lote import dados_para_excel, nome_arquivo_sessao
+
+    db = DatabasePMPV(args.banco, perfil=args.perfil or "duravel")
+    try:
+        exportado = db.exportar_para_dict(args.sessao)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        db.fechar()
+
+    dados_por_mes, resultado = dados_para_excel(exportado)
+    saida = args.saida or nome_arquivo_sessao(exportado['sessao'])
+    if args.cache:
+        from cache_exportacao import CacheExportacao
+        CacheExportacao(args.cache).exportar(dados_por_mes, resultado, saida)
+    else:
+        from excel_handler import ExcelHandlerPMPV
+        ExcelHandlerPMPV.exportar_trimestre(dados_por_mes, resultado, saida, streaming=True)
+    return 0
+
+
+def cmd_import(args) -> int:
+    if os.path.isdir(args.caminho):
+        from importacao_lote import main as importar_pasta
+        return importar_pasta([args.caminho, "--banco", args.banco]
+                              + (["--perfil", args.perfil] if args.perfil else []))
+
+    from database import DatabasePMPV
+    from excel_handler import ExcelHandlerPMPV
+
+    db = DatabasePMPV(args.banco, perfil=args.perfil or "duravel")
+    try:
+        sessao_id = ExcelHandlerPMPV.importar_para_banco(args.caminho, db, args.nome)
+    except (OSError, RuntimeError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        db.fechar()
+    print(sessao_id)
+    return 0
+
+
+def cmd_list(args) -> int:
+    from database import DatabasePMPV
+
+    db = DatabasePMPV(args.banco, perfil=args.perfil or "duravel")
+    try:
+        sessoes = db.listar_sessoes_pagina(limite=args.limite, busca=args.busca)
+    finally:
+        db.fechar()
+
+    if args.json:
+        print(json.dumps(sessoes, ensure_ascii=False))
+        return 0
+    for s in sessoes:
+        pmpv = f"{s['pmpv_trimestral']:.4f}" if s['pmpv_trimestral'] is not None else "-"
+        print(f"{s['id']:>6}  {s['data_modificacao']}  {pmpv:>10}  {s['nome']}")
+    return 0
+
+
+def cmd_rebuild(args) -> int:
+    from database import DatabasePMPV
+
+    db = DatabasePMPV(args.banco, perfil=args.perfil or "duravel")
+    try:
+        ok = db.reconstruir_resumo(args.sessoes or None)
+    finally:
+        db.fechar()
+    return 0 if ok else 1
+
+
+def cmd_calendar(args) -> int:
+    from database import DatabasePMPV
+
+    db = DatabasePMPV(args.banco, perfil=args.perfil or "duravel")
+    try:
+        ok = db.definir_calendario(args.sessao, ano=args.ano, mes_inicial=args.mes_inicial, dias=args.dias)
+    finally:
+        db.fechar()
+    return 0 if ok else 1
+
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m pmpv", description="Calculadora PMPV Trimestral (linha de comando)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    def opcoes_trimestre(p):
+        p.add_argument("arquivo", help="Dados do trimestre: .json, .xlsx ou '-' (JSON no stdin)")
+        p.add_argument("--dias", type=int, nargs=3, metavar=("M1", "M2", "M3"), help="Dias de cada mês")
+        p.add_argument("--mes-inicial", type=int, choices=range(1, 13), metavar="1-12",
+                       help="Mês inicial do trimestre (dias do calendário)")
+        p.add_argument("--bissexto", action="store_true", help="Fevereiro com 29 dias")
+        p.add_argument("--ano", type=int, help="Ano do mês inicial (define se Fevereiro tem 29 dias)")
+        p.add_argument("--conta-grafica", type=float, default=0.0, help="Conta gráfica (R$)")
+
+    def opcao_banco(p):
+        p.add_argument("--banco", default="pmpv_data.db", help="Arquivo do banco (padrão: pmpv_data.db)")
+        # Os nomes de database.PERFIS (sem importar o sqlite só para montar a ajuda)
+        p.add_argument("--perfil", choices=("duravel", "rapido", "carga"),
+                       help="Perfil do SQLite (padrão: duravel; importação de pasta: rapido). "
+                            "'carga' desliga o fsync: uma queda de energia pode corromper o banco "
+                            "inteiro, use só em banco novo/descartável")
+
+    p = sub.add_parser("calc", help="Calcula o PMPV do trimestre")
+    opcoes_trimestre(p)
+    p.add_argument("--json", action="store_true", help="Saída em JSON")
+    p.set_defaults(funcao=cmd_calc)
+
+    p = sub.add_parser("save", help="Calcula e salva o trimestre como uma sessão nova")
+    opcoes_trimestre(p)
+    opcao_banco(p)
+    p.add_argument("--nome", required=True, help="Nome da sessão")
+    p.add_argument("--observacoes", default="", help="Observações da sessão")
+    p.set_defaults(funcao=cmd_save)
+
+    p = sub.add_parser("export", help="Exporta uma sessão salva para Excel")
+    p.add_argument("sessao", type=int, help="ID da sessão")
+    p.add_argument("--saida", help="Arquivo .xlsx (padrão: PMPV_Sessao_<id>_<nome>.xlsx)")
+    p.add_argument("--cache", help="Pasta do cache de exportações")
+    opcao_banco(p)
+    p.set_defaults(funcao=cmd_export)
+
+    p = sub.add_parser("import", help="Importa uma planilha (ou uma pasta delas) para o banco")
+    p.add_argument("caminho", help="Arquivo .xlsx ou pasta com PMPV_Trimestral_*.xlsx")
+    p.add_argument("--nome", help="Nome da sessão (padrão: nome do arquivo)")
+    opcao_banco(p)
+    p.set_defaults(funcao=cmd_import)
+
+    p = sub.add_parser("list", help="Lista as sessões salvas (mais recentes primeiro)")
+    p.add_argument("--limite", type=int, default=20)
+    p.add_argument("--busca", default="", help="Texto no nome/observações")
+    p.add_argument("--json", action="store_true", help="Saída em JSON")
+    opcao_banco(p)
+    p.set_defaults(funcao=cmd_list)
+
+    p = sub.add_parser("rebuild", help="Recalcula a tabela resumo_mes a partir de dados_mes")
+    p.add_argument("sessoes", type=int, nargs="*", help="IDs das sessões (padrão: todas)")
+    opcao_banco(p)
+    p.set_defaults(funcao=cmd_rebuild)
+
+    p = sub.add_parser("calendar", help="Grava o calendário (ano, mês inicial, dias) de uma sessão")
+    p.add_argument("sessao", type=int, help="ID da sessão")
+    p.add_argument("--mes-inicial", type=int, choices=range(1, 13), metavar="1-12", required=True)
+    p.add_argument("--ano", type=int, help="Ano do mês inicial")
+    p.add_argument("--dias", type=int, nargs=3, metavar=("M1", "M2", "M3"),
+                   help="Dias de cada mês (padrão: pelo calendário)")
+    opcao_banco(p)
+    p.set_defaults(funcao=cmd_calendar)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = criar_parser().parse_args(argv)
+    try:
+        return args.funcao(args)
+    except (EntradaInvalida, OSError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
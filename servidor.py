@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Serviço HTTP/JSON da Calculadora PMPV
+Expõe cálculo, listagem e consulta de sessões para outras ferramentas (só stdlib)
+
+Rotas:
+    POST /calcular                 {"dados": {"Mês 1": [...]}, "dias": [31, 28, 31], "conta_grafica": -0.021}
+    GET  /sessoes?limite=50&busca=texto&apos_data=...&apos_id=...
+    GET  /sessoes/<id>
+    GET  /sessoes/<id>/excel       (download .xlsx)
+    GET  /saude
+
+Uso:
+    python servidor.py --porta 8765 --conexoes 4
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import tempfile
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from database import PERFIS, DatabasePMPV
+from modelo import CAMPOS_NUMERICOS, converter_numero
+
+
+MESES = ("Mês 1", "Mês 2", "Mês 3")
+TAMANHO_MAXIMO_CORPO = 50 * 2**20
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+          413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ErroHTTP(Exception):
+    """Erro que vira resposta JSON {"erro": ...} com o status dado"""
+
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class ServicoPMPV:
+    """Rotas do serviço: o trabalho de CPU e de banco roda no executor"""
+
+    def __init__(self, db_path: str = "pmpv_data.db", conexoes: int = 4, cache_dir: str = None,
+                 perfil: str = "rapido"):
+        # Um DatabasePMPV para todas as threads: cada leitura pega uma conexão do pool dele
+        self.db = DatabasePMPV(db_path, leitores=conexoes, perfil=perfil)
+        self.executor = ThreadPoolExecutor(max_workers=conexoes, thread_name_prefix="pmpv-http")
+        self.cache = None
+        if cache_dir:
+            from cache_exportacao import CacheExportacao
+            self.cache = CacheExportacao(cache_dir)
+
+    async def executar(self, funcao, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, funcao, *args)
+
+    # --- ROTAS ---
+    async def rotear(self, metodo: str, caminho: str, consulta: Dict,
+                     corpo: bytes) -> Tuple[int, str, bytes, Dict[str, str]]:
+        """
+        Returns:
+            (status, content-type, corpo da resposta, cabeçalhos extras)
+        """
+        if caminho == "/saude":
+            return self._json({'status': 'ok'})
+
+        if caminho == "/calcular":
+            if metodo != "POST":
+                raise ErroHTTP(405, "Use POST em /calcular")
+            try:
+                pedido = json.loads(corpo or b"{}")
+            except ValueError:
+                raise ErroHTTP(400, "Corpo não é um JSON válido")
+            return self._json(await self.executar(self._calcular, pedido))
+
+        if metodo != "GET":
+            raise ErroHTTP(405, "Método não permitido")
+
+        if caminho == "/sessoes":
+            return self._json(await self.executar(self._listar, consulta))
+
+        achado = re.fullmatch(r"/sessoes/(\d+)(/excel)?", caminho)
+        if achado:
+            sessao_id = int(achado.group(1))
+            if achado.group(2):
+                nome, conteudo = await self.executar(self._excel, sessao_id)
+                return (200, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", conteudo,
+                        {'Content-Disposition': self._anexo(nome)})
+            return self._json(await self.executar(self._sessao, sessao_id))
+
+        raise ErroHTTP(404, f"Rota não encontrada: {caminho}")
+
+    @staticmethod
+    def _json(dados) -> Tuple[int, str, bytes, Dict[str, str]]:
+        # allow_nan=False: NaN/Infinity não são JSON válido, melhor um erro aqui do que no cliente
+        corpo = json.dumps(dados, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        return 200, "application/json; charset=utf-8", corpo, {}
+
+    @staticmethod
+    def _anexo(nome: str) -> str:
+        """Content-Disposition de download: nome ASCII para clientes antigos e o original em UTF-8"""
+        ascii_ = unicodedata.normalize("NFKD", nome).encode("ascii", "ignore").decode("ascii")
+        ascii_ = re.sub(r'[^\w.\-]+', '_', ascii_)
+        return f"attachment; filename=\"{ascii_}\"; filename*=UTF-8''{quote(nome)}"
+
+    @staticmethod
+    def _numero(valor, onde: str) -> float:
+        """Número finito do pedido: null vale 0 e texto aceita vírgula (como a tela)"""
+        if valor is None:
+            return 0.0
+        numero = None
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            try:
+                numero = float(valor)
+            except OverflowError:  # inteiro maior que um float
+                pass
+        elif isinstance(valor, str):
+            numero = converter_numero(valor)
+        if numero is None or not math.isfinite(numero):
+            # 1e400 e Infinity chegam do json.loads como inf
+            raise ErroHTTP(400, f"{onde}: valor inválido {json.dumps(valor, ensure_ascii=False)}")
+        return numero
+
+    @classmethod
+    def _linhas_mes(cls, mes: str, linhas) -> List[Dict]:
+        if not isinstance(linhas, list):
+            raise ErroHTTP(400, f"'{mes}' deve ser uma lista de linhas")
+        convertidas = []
+        for numero, linha in enumerate(linhas, start=1):
+            if not isinstance(linha, dict):
+                raise ErroHTTP(400, f"{mes}, linha {numero}: esperava um objeto com empresa e valores")
+            convertidas.append({campo: cls._numero(linha.get(campo), f"{mes}, linha {numero}, {campo}")
+                                for campo in CAMPOS_NUMERICOS})
+        return convertidas
+
+    @classmethod
+    def _dias(cls, dias) -> Dict[str, float]:
+        if not dias:
+            return {mes: 30.0 for mes in MESES}
+        if isinstance(dias, dict):
+            return {mes: cls._numero(dias.get(mes, 30), f"dias de {mes}") for mes in MESES}
+        if isinstance(dias, list) and len(dias) == 3:
+            return {mes: cls._numero(valor, f"dias de {mes}") for mes, valor in zip(MESES, dias)}
+        raise ErroHTTP(400, "'dias' deve ser uma lista com os dias dos 3 meses")
+
+    @classmethod
+    def _calcular(cls, pedido: Dict) -> Dict:
+        from calculo import calcular_trimestre
+
+        if not isinstance(pedido, dict):
+            raise ErroHTTP(400, "O corpo deve ser um objeto JSON")
+        dados = pedido.get('dados', {})
+        if not isinstance(dados, dict):
+            raise ErroHTTP(400, "'dados' deve ser {\"Mês 1\": [...], ...}")
+        dados_por_mes = {mes: cls._linhas_mes(mes, dados.get(mes, [])) for mes in MESES}
+        resultado = calcular_trimestre(dados_por_mes, cls._dias(pedido.get('dias')),
+                                       cls._numero(pedido.get('conta_grafica'), "conta_grafica"))
+        if resultado['volume_total'] <= 0:
+            # Sem volume o PMPV é NaN, que não existe em JSON
+            return {chave: (valor if math.isfinite(valor) else None) for chave, valor in resultado.items()}
+        if not all(math.isfinite(valor) for valor in resultado.values()):
+            raise ErroHTTP(400, "Valores grandes demais para o cálculo")
+        return resultado
+
+    def _listar(self, consulta: Dict) -> list:
+        try:
+            limite = min(int(consulta.get('limite', 50)), 500)
+            apos = None
+            if 'apos_data' in consulta and 'apos_id' in consulta:
+                apos = (consulta['apos_data'], int(consulta['apos_id']))
+        except ValueError:
+            raise ErroHTTP(400, "Parâmetros de paginação inválidos")
+        return self.db.listar_sessoes_pagina(limite=limite, apos=apos, busca=consulta.get('busca', ''))
+
+    def _sessao(self, sessao_id: int) -> Dict:
+        try:
+            return self.db.exportar_para_dict(sessao_id)
+        except ValueError as e:
+            raise ErroHTTP(404, str(e))
+
+    def _excel(self, sessao_id: int) -> Tuple[str, bytes]:
+        from exportacao_lote import dados_para_excel, nome_arquivo_sessao
+        from excel_handler import ExcelHandlerPMPV
+
+        exportado = self._sessao(sessao_id)
+        dados_por_mes, resultado = dados_para_excel(exportado)
+        fd, caminho = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            if self.cache:
+                self.cache.exportar(dados_por_mes, resultado, caminho)
+            else:
+                ExcelHandlerPMPV.exportar_trimestre(dados_por_mes, resultado, caminho, streaming=True)
+            with open(caminho, "rb") as f:
+                return nome_arquivo_sessao(exportado['sessao']), f.read()
+        finally:
+            os.remove(caminho)
+
+    # --- HTTP ---
+    async def atender(self, leitor: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        """Uma conexão TCP; várias requisições em sequência (keep-alive)"""
+        try:
+            while True:
+                try:
+                    cabecalho = await leitor.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                linhas = cabecalho.decode("latin-1").split("\r\n")
+                try:
+                    metodo, alvo, versao = linhas[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for linha in linhas[1:]:
+                    if ":" in linha:
+                        nome, valor = linha.split(":", 1)
+                        headers[nome.strip().lower()] = valor.strip()
+
+                manter = headers.get("connection", "").lower() != "close" and versao == "HTTP/1.1"
+                extras = {}
+                try:
+                    try:
+                        tamanho = int(headers.get("content-length", 0) or 0)
+                    except ValueError:
+                        manter = False
+                        raise ErroHTTP(400, "Content-Length inválido")
+                    if tamanho > TAMANHO_MAXIMO_CORPO:
+                        manter = False
+                        raise ErroHTTP(413, "Corpo grande demais")
+                    corpo = await leitor.readexactly(tamanho) if tamanho else b""
+                    url = urlsplit(alvo)
+                    consulta = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                    status, tipo, resposta, extras = await self.rotear(
+                        metodo.upper(), url.path.rstrip("/") or "/", consulta, corpo)
+                except ErroHTTP as e:
+                    status, tipo, resposta = e.status, "application/json; charset=utf-8", \
+                        json.dumps({'erro': str(e)}, ensure_ascii=False).encode("utf-8")
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    print(f"Erro na requisição {metodo} {alvo}: {e}")
+                    status, tipo, resposta = 500, "application/json; charset=utf-8", \
+                        json.dumps({'erro': "Erro interno"}).encode("utf-8")
+
+                cabecalhos = "".join(f"{nome}: {valor}\r\n" for nome, valor in extras.items())
+                escritor.write(
+                    f"HTTP/1.1 {status} {STATUS.get(status, '')}\r\n"
+                    f"Content-Type: {tipo}\r\n"
+                    f"Content-Length: {len(resposta)}\r\n"
+                    f"{cabecalhos}"
+                    f"Connection: {'keep-alive' if manter else 'close'}\r\n\r\n".encode("latin-1") + resposta
+                )
+                await escritor.drain()
+                if not manter:
+                    break
+        finally:
+            escritor.close()
+
+    def fechar(self):
+        self.executor.shutdown(wait=True)
+        self.db.fechar()
+
+
+async def servir(host: str = "127.0.0.1", porta: int = 8765, db_path: str = "pmpv_data.db",
+                 conexoes: int = 4, cache_dir: str = None, perfil: str = "rapido"):
+    """Sobe o serviço e atende até ser interrompido (Ctrl+C)"""
+    servico = ServicoPMPV(db_path, conexoes, cache_dir, perfil)
+    servidor = await asyncio.start_server(servico.atender, host, porta)
+    print(f"Serviço PMPV em http://{host}:{porta} (banco: {db_path}, conexões: {conexoes})")
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        servico.fechar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP/JSON da Calculadora PMPV.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--banco", default="pmpv_data.db", help="Arquivo do banco (padrão: pmpv_data.db)")
+    parser.add_argument("--conexoes", type=int, default=4, help="Conexões de leitura / threads do executor")
+    parser.add_argument("--cache", help="Pasta do cache de exportações (para /excel)")
+    parser.add_argument("--perfil", default="rapido", choices=sorted(PERFIS),
+                        help="Perfil do SQLite (padrão: rapido)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(servir(args.host, args.porta, args.banco, args.conexoes, args.cache, args.perfil))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Executor de Tarefas em Segundo Plano
+Roda salvar/exportar/importar fora da thread do Tkinter, com progresso e cancelamento
+"""
+
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from typing import Callable, Dict, Optional
+
+
+class Cancelada(Exception):
+    """Levantada dentro da tarefa quando o usuário pede o cancelamento"""
+
+
+class ContextoTarefa:
+    """
+    Entregue à função da tarefa (primeiro argumento).
+
+    A função informa o progresso por `progresso()`, que também é o ponto onde
+    um cancelamento pedido pelo usuário interrompe a tarefa (levanta Cancelada).
+    """
+
+    def __init__(self, id_tarefa: int, nome: str, fila: queue.Queue):
+        self.id_tarefa = id_tarefa
+        self.nome = nome
+        self._fila = fila
+        self._evento = threading.Event()
+        self._ao_cancelar = []
+
+    @property
+    def cancelada(self) -> bool:
+        return self._evento.is_set()
+
+    def verificar_cancelamento(self):
+        """Levanta Cancelada se o usuário pediu para parar"""
+        if self._evento.is_set():
+            raise Cancelada()
+
+    def progresso(self, fracao: Optional[float], mensagem: str = ""):
+        """
+        Informa o andamento (thread-safe).
+
+        Args:
+            fracao: 0.0 a 1.0, ou None para progresso indeterminado
+            mensagem: Texto para a barra de status
+        """
+        self.verificar_cancelamento()
+        self._fila.put(('progresso', self.id_tarefa, (fracao, mensagem)))
+
+    def ao_cancelar(self, callback: Callable):
+        """Registra algo a chamar (de outra thread) no cancelamento, ex: conn.interrupt"""
+        self._ao_cancelar.append(callback)
+        if self._evento.is_set():
+            callback()
+
+    def _cancelar(self):
+        self._evento.set()
+        for callback in self._ao_cancelar:
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+class ExecutorTarefas:
+    """
+    Pool de threads para operações demoradas da tela.
+
+    As threads nunca tocam no Tk: progresso e término vão para uma fila
+    thread-safe, que a thread do Tk esvazia com `root.after`. Os callbacks
+    (ao_concluir, ao_erro, ao_cancelar) rodam, portanto, na thread do Tk.
+    """
+
+    def __init__(self, root, ao_progresso: Callable, max_workers: int = 2,
+                 intervalo_ms: int = 100):
+        """
+        Args:
+            root: Janela principal (Tk)
+            ao_progresso: Chamado com (nome, fração ou None, mensagem); nome None = ocioso
+            max_workers: Threads no pool
+            intervalo_ms: Intervalo de leitura da fila
+        """
+        self.root = root
+        self.ao_progresso = ao_progresso
+        self.intervalo_ms = intervalo_ms
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pmpv-tarefa")
+        self._fila = queue.Queue()
+        self._ids = count(1)
+        self._tarefas: Dict[int, Dict] = {}
+        self._agendado = self.root.after(self.intervalo_ms, self._processar_fila)
+
+    def iniciar(self, nome: str, funcao: Callable, *args, ao_concluir: Callable = None,
+                ao_erro: Callable = None, ao_cancelar: Callable = None) -> Optional[int]:
+        """
+        Inicia `funcao(contexto, *args)` numa thread do pool.
+
+        Uma tarefa com o mesmo nome já em andamento impede outra (evita, por
+        exemplo, duas sessões criadas por dois cliques em "Salvar").
+
+        Returns:
+            ID da tarefa, ou None se já existe uma tarefa com esse nome rodando
+        """
+        if self.em_andamento(nome):
+            return None
+
+        id_tarefa = next(self._ids)
+        contexto = ContextoTarefa(id_tarefa, nome, self._fila)
+        self._tarefas[id_tarefa] = {
+            'nome': nome, 'contexto': contexto, 'ao_concluir': ao_concluir,
+            'ao_erro': ao_erro, 'ao_cancelar': ao_cancelar
+        }
+        self.ao_progresso(nome, None, f"{nome}...")
+        self._pool.submit(self._executar, contexto, funcao, args)
+        return id_tarefa
+
+    def _executar(self, contexto: ContextoTarefa, funcao: Callable, args):
+        # Se a função retornou, o trabalho foi feito (ex: o commit já aconteceu):
+        # um cancelamento pedido tarde demais não desfaz nada e não é informado
+        try:
+            resultado = funcao(contexto, *args)
+        except Cancelada:
+            self._fila.put(('cancelada', contexto.id_tarefa, None))
+        except sqlite3.OperationalError as e:
+            # conn.interrupt() registrado em ao_cancelar
+            interrompida = contexto.cancelada and 'interrupted' in str(e)
+            self._fila.put(('cancelada' if interrompida else 'erro', contexto.id_tarefa,
+                            None if interrompida else e))
+        except Exception as e:
+            self._fila.put(('erro', contexto.id_tarefa, e))
+        else:
+            self._fila.put(('fim', contexto.id_tarefa, resultado))
+
+    def em_andamento(self, nome: str = None) -> bool:
+        """Há tarefa rodando (com esse nome, se informado)?"""
+        return any(nome is None or t['nome'] == nome for t in self._tarefas.values())
+
+    def cancelar(self, id_tarefa: int = None):
+        """Pede o cancelamento de uma tarefa (ou de todas)"""
+        for tid, tarefa in list(self._tarefas.items()):
+            if id_tarefa is None or tid == id_tarefa:
+                tarefa['contexto']._cancelar()
+
+    def _processar_fila(self):
+        """Roda na thread do Tk: repassa progresso e término das tarefas"""
+        try:
+            while True:
+                evento, id_tarefa, dado = self._fila.get_nowait()
+                tarefa = self._tarefas.get(id_tarefa)
+                if tarefa is None:
+                    continue
+
+                if evento == 'progresso':
+                    fracao, mensagem = dado
+                    self.ao_progresso(tarefa['nome'], fracao, mensagem)
+                    continue
+
+                del self._tarefas[id_tarefa]
+                callback = {'fim': tarefa['ao_concluir'], 'erro': tarefa['ao_erro'],
+                            'cancelada': tarefa['ao_cancelar']}[evento]
+                if not self._tarefas:
+                    self.ao_progresso(None, 0.0, "Pronto")
+                if callback and evento == 'cancelada':
+                    callback()
+                elif callback:
+                    callback(dado)
+        except queue.Empty:
+            pass
+        finally:
+            self._agendado = self.root.after(self.intervalo_ms, self._processar_fila)
+
+    def encerrar(self):
+        """Cancela o que estiver rodando e libera o pool (ao fechar a janela)"""
+        self.cancelar()
+        self.root.after_cancel(self._agendado)
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Backup online, verificação, rotação e restauração"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from backup import (FORMATO_DATA, PREFIXO, aplicar_retencao, criar_backup, listar_backups,
+                    restaurar_backup, verificar_backup)
+from database import VERSAO_ESQUEMA, DatabasePMPV
+
+
+def nova_sessao(db, nome):
+    return db.salvar_sessao_completa(nome, {1: [
+        {'empresa': "Petrobras", 'molecula': 10.0, 'transporte': 1.0, 'logistica': 0.5, 'volume': 100.0}
+    ]})
+
+
+@pytest.fixture
+def banco(tmp_path):
+    caminho = str(tmp_path / "pmpv.db")
+    db = DatabasePMPV(caminho)
+    nova_sessao(db, "Q1")
+    yield caminho, db
+    db.fechar()
+
+
+def test_backup_com_banco_aberto_e_restauracao(banco, tmp_path):
+    caminho, db = banco
+    pasta = str(tmp_path / "backups")
+    arquivo = criar_backup(caminho, pasta)
+    assert arquivo.endswith(".db.gz")
+    situacao = verificar_backup(arquivo)
+    assert situacao['ok'] and situacao['sessoes'] == 1 and situacao['versao_esquema'] == VERSAO_ESQUEMA
+
+    # Mudanças depois do backup somem na restauração (o banco atual ganha um backup de segurança)
+    nova_sessao(db, "Q2")
+    restaurado = restaurar_backup(arquivo, caminho, pasta_seguranca=str(tmp_path / "seguranca"))
+    assert restaurado['ok'] and restaurado['sessoes'] == 1
+    assert [s['nome'] for s in db.listar_sessoes()] == ["Q1"]
+    assert len(listar_backups(str(tmp_path / "seguranca"))) == 1
+
+
+def test_backup_corrompido_nao_toca_no_banco(banco, tmp_path):
+    caminho, db = banco
+    arquivo = criar_backup(caminho, str(tmp_path / "backups"), retencao={})
+    with open(arquivo, "r+b") as f:
+        f.seek(20)
+        f.write(b"\0" * 64)
+    assert not verificar_backup(arquivo)['ok']
+    with pytest.raises(ValueError):
+        restaurar_backup(arquivo, caminho, pasta_seguranca=None)
+    assert [s['nome'] for s in db.listar_sessoes()] == ["Q1"]
+
+
+def test_retencao(tmp_path):
+    pasta = str(tmp_path)
+    agora = datetime(2026, 6, 30, 2, 0)
+    for dias in range(120):
+        nome = f"{PREFIXO}{(agora - timedelta(days=dias)).strftime(FORMATO_DATA)}.db.gz"
+        open(os.path.join(pasta, nome), "wb").close()
+    apagados = aplicar_retencao(pasta, diarios=7, semanais=4, mensais=3)
+    restantes = [data for data, _ in listar_backups(pasta)]
+    assert len(apagados) + len(restantes) == 120
+    assert restantes[:7] == [agora - timedelta(days=d) for d in range(7)]
+    assert len(restantes) <= 7 + 4 + 3
+    assert len({(d.year, d.month) for d in restantes}) == 3
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Motor vetorizado comparado com o laço linha a linha da versão original e o PMPV ao vivo"""
+
+import math
+
+import numpy as np
+import pytest
+
+from calculo import AgregadoTrimestre, calcular_lote, calcular_programacao, calcular_trimestre
+
+
+def laco_original(molecula, transporte, logistica, qdc, dias, grupos, n_grupos):
+    """Mesma regra do calcular_trimestre original da tela, por grupo"""
+    volume = [0.0] * n_grupos
+    custo = [0.0] * n_grupos
+    for mol, trans, log, q, d, g in zip(molecula, transporte, logistica, qdc, dias, grupos):
+        if q > 0:
+            volume[g] += q * d
+            custo[g] += (mol + trans + log) * q * d
+    pmpv = [c / v if v > 0 else math.nan for c, v in zip(custo, volume)]
+    return volume, custo, pmpv
+
+
+def comparar(colunas, grupos, n_grupos):
+    resultado = calcular_lote(grupos=grupos, n_grupos=n_grupos, **colunas)
+    volume, custo, pmpv = laco_original(*(colunas[c] for c in ('molecula', 'transporte', 'logistica',
+                                                                'qdc', 'dias')), grupos, n_grupos)
+    np.testing.assert_allclose(resultado['volume_total'], volume, rtol=1e-12)
+    np.testing.assert_allclose(resultado['custo_total'], custo, rtol=1e-12)
+    np.testing.assert_allclose(resultado['pmpv'], pmpv, rtol=1e-12)
+
+
+def test_igual_ao_laco_com_grupos():
+    rng = np.random.default_rng(7)
+    n = 3000
+    colunas = {
+        'molecula': rng.uniform(9, 12, n),
+        'transporte': rng.uniform(0, 1, n),
+        'logistica': rng.uniform(0, 2, n),
+        'qdc': rng.uniform(-50_000, 100_000, n),   # ~1/3 das linhas fora do cálculo
+        'dias': rng.choice([28, 29, 30, 31], n).astype(float),
+    }
+    # O grupo 40 fica sem linhas: PMPV NaN, volume e custo 0
+    comparar(colunas, rng.integers(0, 40, n), 41)
+
+
+def test_linhas_sem_qdc_com_preco_invalido_nao_entram():
+    colunas = {
+        'molecula': [10.0, math.inf, math.nan, -math.inf, 11.0],
+        'transporte': [0.5, 0.0, 0.0, 0.0, 0.5],
+        'logistica': [0.3, 0.0, 0.0, 0.0, 0.3],
+        'qdc': [100.0, 0.0, -5.0, math.nan, 50.0],
+        'dias': [30.0, 30.0, 30.0, 30.0, 31.0],
+    }
+    comparar(colunas, [0, 0, 1, 1, 1], 2)
+    resultado = calcular_lote(**colunas)
+    assert resultado['pmpv'][0] == pytest.approx((10.8 * 3000 + 11.8 * 1550) / 4550)
+
+
+def test_sem_linhas():
+    resultado = calcular_lote([], [], [], [], 30.0, grupos=[], n_grupos=2)
+    assert list(resultado['volume_total']) == [0.0, 0.0]
+    assert np.isnan(resultado['pmpv']).all()
+    assert calcular_lote([], [], [], [], 30.0, grupos=[])['volume_total'].size == 0
+
+
+def test_dias_escalar_e_conta_grafica_por_grupo():
+    resultado = calcular_lote([10.0, 12.0], [0.0, 0.0], [0.0, 0.0], [1.0, 1.0], 30.0,
+                              grupos=[0, 1], conta_grafica=[0.5, -0.5])
+    assert list(resultado['volume_total']) == [30.0, 30.0]
+    assert list(resultado['preco_final']) == [10.5, 11.5]
+
+
+def test_calcular_trimestre_ignora_mes_sem_volume():
+    dados = {"Mês 1": [{'molecula': 10.0, 'transporte': 0.5, 'logistica': 0.3, 'volume': 100.0}],
+             "Mês 2": [{'molecula': math.inf, 'transporte': 0.0, 'logistica': 0.0, 'volume': 0.0}],
+             "Mês 3": []}
+    resultado = calcular_trimestre(dados, {"Mês 1": 31, "Mês 2": 28, "Mês 3": 31}, conta_grafica=-0.02)
+    assert resultado['volume_total'] == 3100.0
+    assert resultado['pmpv'] == pytest.approx(10.8)
+    assert resultado['preco_final'] == pytest.approx(10.78)
+
+
+# --- AgregadoTrimestre (PMPV ao vivo) ---
+MESES = ("Mês 1", "Mês 2", "Mês 3")
+
+
+def test_agregado_igual_ao_calculo_completo():
+    rng = np.random.default_rng(3)
+    agregado = AgregadoTrimestre(MESES)
+    linhas = {}
+    for passo in range(2000):
+        chave = int(rng.integers(0, 60))
+        if passo % 7 == 0:
+            agregado.remover_linha(chave)
+            linhas.pop(chave, None)
+            continue
+        mes = MESES[chave % 3]
+        preco, qdc = float(rng.uniform(9, 13)), float(rng.uniform(-100, 1000))
+        agregado.atualizar_linha(chave, mes, preco, qdc)
+        linhas[chave] = {'molecula': preco, 'volume': qdc}
+    agregado.definir_dias("Mês 2", 29)
+    dias = {"Mês 1": 30, "Mês 2": 29, "Mês 3": 30}
+    esperado = calcular_trimestre({mes: [l for c, l in linhas.items() if MESES[c % 3] == mes] for mes in MESES},
+                                  dias)
+    resultado = agregado.resultado()
+    assert resultado['volume_total'] == pytest.approx(esperado['volume_total'], rel=1e-9)
+    assert resultado['pmpv'] == pytest.approx(esperado['pmpv'], rel=1e-9)
+
+
+@pytest.mark.parametrize("invalido", [math.nan, math.inf, -math.inf])
+def test_agregado_se_recupera_de_valor_nao_finito(invalido):
+    agregado = AgregadoTrimestre(MESES)
+    agregado.atualizar_linha(1, "Mês 1", 12.0, 50.0)
+    agregado.atualizar_linha(2, "Mês 1", invalido, 100.0)
+    assert not math.isfinite(agregado.resultado()['pmpv'])
+    # Corrigir a célula corrige o rodapé (a soma não fica presa em NaN)
+    agregado.atualizar_linha(2, "Mês 1", 10.0, 100.0)
+    assert agregado.resultado()['pmpv'] == pytest.approx((12.0 * 50 + 10.0 * 100) / 150)
+    agregado.atualizar_linha(2, "Mês 1", invalido, 100.0)
+    agregado.remover_linha(2)
+    assert agregado.resultado()['pmpv'] == pytest.approx(12.0)
+
+
+def test_agregado_sem_volume():
+    agregado = AgregadoTrimestre(MESES)
+    agregado.atualizar_linha(1, "Mês 1", 10.0, 0.0)
+    assert agregado.resultado() is None
+
+
+# --- Programação diária ---
+def test_programacao_ignora_dias_sem_qdc_com_preco_invalido():
+    volumes = [[100.0, 0.0, 50.0], [0.0, 0.0, 0.0]]
+    moleculas = [[10.0, math.inf, 12.0], [math.nan, math.nan, math.nan]]
+    resultado = calcular_programacao(volumes, moleculas, transporte=[1.0, math.inf], logistica=0.0)
+    assert list(resultado['volume']) == [150.0, 0.0]
+    assert list(resultado['custo']) == [11.0 * 100 + 13.0 * 50, 0.0]
+    assert list(resultado['custo_dia']) == [1100.0, 0.0, 650.0]
+    assert resultado['pmpv'] == pytest.approx((1100.0 + 650.0) / 150)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Linha de comando (python -m pmpv): entrada tolerante e erros de uma linha"""
+
+import io
+import json
+
+import pytest
+
+from pmpv.__main__ import main
+
+
+def calc(monkeypatch, capsys, dados):
+    monkeypatch.setattr("sys.stdin", io.StringIO(json.dumps(dados)))
+    codigo = main(["calc", "-", "--json"])
+    return codigo, capsys.readouterr()
+
+
+def test_aceita_null_e_virgula(monkeypatch, capsys):
+    codigo, saida = calc(monkeypatch, capsys, {"Mês 1": [
+        {"empresa": "Petrobras", "molecula": "10,5", "transporte": None, "logistica": "", "volume": "100"}
+    ]})
+    assert codigo == 0
+    resultado = json.loads(saida.out)['resultado']
+    assert resultado['pmpv'] == pytest.approx(10.5)
+    assert resultado['volume_total'] == pytest.approx(3000.0)
+
+
+@pytest.mark.parametrize("dados, mensagem", [
+    ({"Mês 1": [{"empresa": "A", "volume": "abc"}]}, "Mês 1, linha 1, volume"),
+    ({"Mês 1": [1]}, "Mês 1, linha 1"),
+    ({"Mês 2": 5}, "Mês 2"),
+    ([1, 2], "esperava um objeto"),
+    ({"Mês 1": [{"empresa": "A", "molecula": "inf", "volume": 1}]}, "Mês 1, linha 1, molecula"),
+    ({"Mês 1": [{"empresa": "A", "molecula": float("nan"), "volume": 1}]}, "Mês 1, linha 1, molecula"),
+    ({"Mês 3": [{"empresa": "A", "molecula": 10, "volume": 10 ** 400}]}, "Mês 3, linha 1, volume"),
+    ({"Mês 1": [{"empresa": "A", "molecula": 1e308, "volume": 1e10}]}, "grandes demais"),
+])
+def test_entrada_invalida_vira_erro_de_uma_linha(monkeypatch, capsys, dados, mensagem):
+    codigo, saida = calc(monkeypatch, capsys, dados)
+    assert codigo == 1
+    assert saida.out == ""
+    assert saida.err.startswith("Erro: ") and mensagem in saida.err
+    assert saida.err.count("\n") == 1
+
+
+def test_json_malformado(monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", io.StringIO("{ruim"))
+    assert main(["calc", "-"]) == 1
+    assert capsys.readouterr().err.startswith("Erro: JSON inválido")
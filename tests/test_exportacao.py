@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Exportação Excel (normal, streaming e em lote) e impressão digital do cache com células vazias"""
+
+import zipfile
+from pathlib import Path
+
+import pytest
+from openpyxl import load_workbook
+
+import exportacao_lote
+from cache_exportacao import CacheExportacao
+from database import DatabasePMPV
+from excel_handler import ExcelHandlerPMPV
+
+RESULTADO = {'volume_total': 3000.0, 'custo_total': 34500.0, 'pmpv': 11.5,
+             'conta_grafica': 0.0, 'preco_final': 11.5}
+
+
+def dados(transporte):
+    return {"Mês 1": [
+        {'empresa': "Petrobras", 'molecula': 10.0, 'transporte': transporte, 'logistica': None, 'volume': 100.0},
+        {'empresa': None, 'molecula': None, 'transporte': None, 'logistica': None, 'volume': None},
+    ], "Mês 2": [], "Mês 3": []}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_exporta_com_none(tmp_path, streaming):
+    caminho = ExcelHandlerPMPV.exportar_trimestre(dados(None), RESULTADO, str(tmp_path / "x.xlsx"),
+                                                  streaming=streaming)
+    lidos = ExcelHandlerPMPV.importar_excel(caminho)
+    assert [(l['empresa'], l['molecula'], l['volume']) for l in lidos["Mês 1"]] == [("Petrobras", 10.0, 100.0)]
+
+
+def test_impressao_digital_com_none():
+    assert CacheExportacao.impressao_digital(dados(None), RESULTADO) == \
+        CacheExportacao.impressao_digital(dados(0.0), RESULTADO)
+    assert CacheExportacao.impressao_digital(dados("1,5"), RESULTADO) == \
+        CacheExportacao.impressao_digital(dados(1.5), RESULTADO)
+
+
+def test_cache_exporta_com_none(tmp_path):
+    cache = CacheExportacao(str(tmp_path / "cache"))
+    primeiro = cache.exportar(dados(None), RESULTADO, str(tmp_path / "a.xlsx"))
+    segundo = cache.exportar(dados(0.0), RESULTADO, str(tmp_path / "b.xlsx"))
+    assert Path(primeiro).read_bytes() == Path(segundo).read_bytes()
+
+
+def test_importar_devolve_os_tres_meses(tmp_path):
+    # Mês sem linhas volta como lista vazia (substitui o que estava na tela)
+    caminho = ExcelHandlerPMPV.exportar_trimestre(dados(0.0), RESULTADO, str(tmp_path / "x.xlsx"))
+    lidos = ExcelHandlerPMPV.importar_excel(caminho)
+    assert list(lidos) == ["Mês 1", "Mês 2", "Mês 3"]
+    assert lidos["Mês 2"] == [] and lidos["Mês 3"] == []
+
+
+# --- Exportação em lote (exportacao_lote) ---
+@pytest.fixture
+def banco(tmp_path):
+    """Sessão 1 com resultado salvo, 2 sem resultado e 3 sem volume"""
+    caminho = str(tmp_path / "pmpv.db")
+    db = DatabasePMPV(caminho)
+    linha = {'empresa': "Petrobras", 'molecula': 10.0, 'transporte': 1.0, 'logistica': 0.5, 'volume': 100.0}
+    db.salvar_sessao_completa("Com resultado", {1: [linha]}, resultado={
+        'volume_total': 1.0, 'custo_total': 2.0, 'pmpv': 2.0})
+    db.salvar_sessao_completa("Sem resultado", {1: [linha], 2: [dict(linha, volume=50.0, molecula=12.0)]},
+                              calendario={'ano': 2026, 'mes_inicial': 1})
+    db.salvar_sessao_completa("Sem volume", {1: [dict(linha, volume=0.0)]})
+    db.fechar()
+    return caminho
+
+
+def test_consolidado_calcula_como_o_arquivo_por_sessao(banco, tmp_path):
+    saida = str(tmp_path / "consolidado.xlsx")
+    assert exportacao_lote.main([saida, "--banco", banco, "--consolidado"]) == 0
+    valores = {linha[0]: linha[2:5] for linha in
+               load_workbook(saida)["Sessões"].iter_rows(min_row=2, values_only=True)}
+    assert valores[1] == (1.0, 2.0, 2.0)
+    db = DatabasePMPV(banco)
+    try:
+        for sessao_id in (2, 3):
+            _, resultado = exportacao_lote.dados_para_excel(db.exportar_para_dict(sessao_id))
+            esperado = (resultado['volume_total'], resultado['custo_total'], resultado['pmpv'])
+            assert valores[sessao_id] == pytest.approx(esperado)
+    finally:
+        db.fechar()
+    # Sem volume: PMPV em branco, não NaN
+    assert valores[3] == (0, 0, None)
+    assert valores[2][0] == pytest.approx(100.0 * 31 + 50.0 * 28)
+
+
+def test_sessao_sem_volume_sem_nan_na_planilha(banco, tmp_path):
+    db = DatabasePMPV(banco)
+    try:
+        dados_por_mes, resultado = exportacao_lote.dados_para_excel(db.exportar_para_dict(3))
+    finally:
+        db.fechar()
+    assert resultado['pmpv'] is None
+    caminho = ExcelHandlerPMPV.exportar_trimestre(dados_por_mes, resultado, str(tmp_path / "x.xlsx"),
+                                                  streaming=True)
+    with zipfile.ZipFile(caminho) as arquivo:
+        for nome in arquivo.namelist():
+            assert b"<v/>" not in arquivo.read(nome) and b"nan" not in arquivo.read(nome).lower()
+
+
+def test_sessao_inexistente_sai_com_erro(banco, tmp_path, capsys):
+    assert exportacao_lote.main([str(tmp_path / "saida"), "--banco", banco, "--sessoes", "1", "999",
+                                 "--processos", "1"]) == 1
+    assert "Sessão não encontrada: 999" in capsys.readouterr().out
+    assert exportacao_lote.main([str(tmp_path / "c.xlsx"), "--banco", banco, "--sessoes", "999",
+                                 "--consolidado"]) == 1
+    assert exportacao_lote.main([str(tmp_path / "saida"), "--banco", banco, "--processos", "1"]) == 0
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Migrações do esquema a partir de um banco criado pela versão original
+(sem PRAGMA user_version e gravado com foreign_keys desligado).
+"""
+
+import sqlite3
+
+import pytest
+
+from database import VERSAO_ESQUEMA, DatabasePMPV
+
+# Tabelas exatamente como a primeira versão do database.py as criava
+ESQUEMA_ORIGINAL = """
+    CREATE TABLE sessoes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL,
+        data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        data_modificacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        observacoes TEXT
+    );
+    CREATE TABLE dados_mes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sessao_id INTEGER NOT NULL,
+        mes INTEGER NOT NULL,
+        empresa TEXT NOT NULL,
+        molecula REAL,
+        transporte REAL,
+        logistica REAL,
+        volume REAL,
+        FOREIGN KEY (sessao_id) REFERENCES sessoes (id) ON DELETE CASCADE
+    );
+    CREATE TABLE resultados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sessao_id INTEGER NOT NULL,
+        volume_total REAL,
+        pmpv_trimestral REAL,
+        custo_total REAL,
+        data_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (sessao_id) REFERENCES sessoes (id) ON DELETE CASCADE
+    );
+"""
+
+
+def criar_banco_original(caminho, sessoes=3, apagar=(2,)):
+    """
+    Banco da versão original com `sessoes` sessões de 2 linhas por mês.
+    
+    As sessões em `apagar` são removidas como o deletar_sessao original
+    fazia (sem foreign_keys): os meses e resultados ficam órfãos.
+    """
+    conn = sqlite3.connect(caminho)
+    conn.executescript(ESQUEMA_ORIGINAL)
+    for n in range(1, sessoes + 1):
+        sessao_id = conn.execute("INSERT INTO sessoes (nome) VALUES (?)", (f"Sessão {n}",)).lastrowid
+        for mes in (1, 2, 3):
+            conn.executemany("""
+                INSERT INTO dados_mes (sessao_id, mes, empresa, molecula, transporte, logistica, volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(sessao_id, mes, "Petrobras", 10.0, 1.0, 0.5, 100.0 * mes),
+                  (sessao_id, mes, "PETROBRAS ", 12.0, 1.0, 0.5, 50.0)])
+        conn.execute("""
+            INSERT INTO resultados (sessao_id, volume_total, pmpv_trimestral, custo_total)
+            VALUES (?, 1.0, 1.0, 1.0)
+        """, (sessao_id,))
+    for sessao_id in apagar:
+        conn.execute("DELETE FROM sessoes WHERE id = ?", (sessao_id,))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def banco_original(tmp_path):
+    caminho = str(tmp_path / "original.db")
+    criar_banco_original(caminho)
+    return caminho
+
+
+def test_migra_banco_original_com_orfaos(banco_original):
+    db = DatabasePMPV(banco_original)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == VERSAO_ESQUEMA
+        assert db.conn.execute("PRAGMA foreign_key_check").fetchall() == []
+        # Só as sessões que existiam continuam, com todos os seus meses
+        assert sorted(s['id'] for s in db.listar_sessoes()) == [1, 3]
+        for tabela in ('dados_mes', 'resultados', 'resumo_mes'):
+            sessoes = {row[0] for row in db.conn.execute(f"SELECT DISTINCT sessao_id FROM {tabela}")}
+            assert sessoes == {1, 3}, tabela
+        assert len(db.carregar_dados_mes(3, 2)) == 2
+    finally:
+        db.fechar()
+
+
+def test_resumo_migrado_igual_a_reconstrucao(banco_original):
+    db = DatabasePMPV(banco_original)
+    try:
+        consulta = "SELECT * FROM resumo_mes ORDER BY sessao_id, mes"
+        migrado = [tuple(row) for row in db.conn.execute(consulta)]
+        assert db.reconstruir_resumo()
+        assert migrado == [tuple(row) for row in db.conn.execute(consulta)]
+        # volume_dia do mês 2: 200 + 50
+        assert dict(((s, m), v) for s, m, v, *_ in migrado)[(1, 2)] == pytest.approx(250.0)
+    finally:
+        db.fechar()
+
+
+def test_banco_migrado_abre_de_novo(banco_original):
+    DatabasePMPV(banco_original).fechar()
+    db = DatabasePMPV(banco_original)
+    try:
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == VERSAO_ESQUEMA
+    finally:
+        db.fechar()
+
+
+def test_v3_empresas_e_ids_preservados(tmp_path):
+    caminho = str(tmp_path / "original.db")
+    criar_banco_original(caminho, apagar=(3,))
+    db = DatabasePMPV(caminho)
+    try:
+        # "Petrobras" e "PETROBRAS " viram a mesma empresa
+        assert db.conn.execute("SELECT COUNT(*) FROM empresas").fetchone()[0] == 1
+        assert {linha['empresa'] for linha in db.carregar_dados_mes(1, 1)} == {"Petrobras"}
+        # Ids das linhas mantidos e a sequência não volta para ids já usados (inclusive os apagados)
+        assert [linha['id'] for linha in db.carregar_dados_mes(2, 3)] == [11, 12]
+        _, ids = db.sincronizar_sessao({1: {'linhas': [{'empresa': "Eneva", 'volume': 1.0}]}},
+                                       nome="Nova")
+        assert ids[1][0] == 19
+    finally:
+        db.fechar()
+
+
+def test_v3_ignora_orfaos_que_restarem(tmp_path, monkeypatch):
+    # Órfãos que sobrevivem até a cópia (ex: gravados por outra ferramenta) não a interrompem
+    caminho = str(tmp_path / "original.db")
+    criar_banco_original(caminho)
+    monkeypatch.setattr(DatabasePMPV, "_apagar_orfaos", staticmethod(lambda cursor: None))
+    monkeypatch.setattr(DatabasePMPV, "_reconstruir_resumo_em", staticmethod(lambda cursor, ids=None: None))
+    db = DatabasePMPV(caminho)
+    try:
+        assert db.conn.execute("PRAGMA foreign_key_check(dados_mes)").fetchall() == []
+        assert db.conn.execute("SELECT COUNT(*) FROM dados_mes").fetchone()[0] == 12
+    finally:
+        db.fechar()
+
+
+def test_listagem_sem_resultado_usa_resumo_mes(banco_original):
+    db = DatabasePMPV(banco_original)
+    try:
+        sessao_id = db.salvar_sessao_completa("Sem resultado", {1: [
+            {'empresa': "Petrobras", 'molecula': 10.0, 'transporte': 1.0, 'logistica': 0.5, 'volume': 100.0}
+        ]}, calendario={'ano': 2026, 'mes_inicial': 1})
+        sessoes = {s['id']: s for s in db.listar_sessoes()}
+        assert sessoes == {s['id']: s for s in db.listar_sessoes_pagina(limite=10)}
+        assert sessoes[sessao_id]['volume_total'] == pytest.approx(100.0 * 31)
+        assert sessoes[sessao_id]['pmpv_trimestral'] == pytest.approx(11.5)
+        assert sessoes[sessao_id]['linhas'] == 1
+        # Com resultado salvo, vale o resultado
+        assert sessoes[1]['volume_total'] == 1.0
+    finally:
+        db.fechar()
+
+
+def test_v4_v5_calendario_e_programacao(banco_original):
+    db = DatabasePMPV(banco_original)
+    try:
+        # Sessões antigas ficam sem calendário (os cálculos usam 30 dias)
+        calendarios = db.conn.execute(
+            "SELECT ano, mes_inicial, dias_mes_1, dias_mes_2, dias_mes_3 FROM sessoes"
+        ).fetchall()
+        assert [tuple(row) for row in calendarios] == [(None,) * 5] * 2
+        objetos = {row[0] for row in db.conn.execute("SELECT name FROM sqlite_master")}
+        assert {'programacao_diaria', 'programacao_diaria_descartar'} <= objetos
+        assert db.relatorio_pmpv([1])[1]['volume_total'] == pytest.approx(30 * (150 + 250 + 350))
+    finally:
+        db.fechar()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Modelo de contratos em colunas (ContratosMes): conversão do texto e pendências de salvamento"""
+
+import pytest
+
+from modelo import ContratosMes, colunas_trimestre, converter_numero
+
+
+@pytest.mark.parametrize("texto, valor", [
+    ("10,5", 10.5), (" 3.25 ", 3.25), ("", 0.0), ("  ", 0.0), ("-1e3", -1000.0),
+    ("abc", None), ("1,2,3", None),
+    ("nan", None), ("inf", None), ("-Infinity", None), ("1e400", None),
+])
+def test_converter_numero(texto, valor):
+    assert converter_numero(texto) == valor
+
+
+# --- ContratosMes: valores convertidos uma vez e pendências de salvamento ---
+def carregado(*linhas):
+    """Mês como carregar_sessao monta: linhas com id do banco, já salvas"""
+    contratos = ContratosMes()
+    for id_banco, (empresa, volume) in enumerate(linhas, start=1):
+        contratos.adicionar(empresa, 10.0, 1.0, 0.5, volume, id_banco=id_banco)
+    return contratos
+
+
+def test_texto_convertido_uma_vez():
+    contratos = ContratosMes()
+    contratos.adicionar("Petrobras")
+    assert contratos.definir_texto(0, 'molecula', " 10,5 ")
+    assert contratos.molecula[0] == 10.5 and contratos.texto(0, 'molecula') == "10.5"
+    assert not contratos.definir_texto(0, 'volume', "abc")
+    assert contratos.volume[0] == 0.0 and contratos.texto(0, 'volume') == ""
+    contratos.definir_texto(0, 'empresa', "Eneva")
+    assert contratos.para_dicts() == [{'empresa': "Eneva", 'molecula': 10.5, 'transporte': 0.0,
+                                       'logistica': 0.0, 'volume': 0.0}]
+    assert contratos.preco(0) == 10.5
+
+
+def test_so_o_que_mudou_vai_para_o_banco():
+    contratos = carregado(("Petrobras", 100.0), ("Eneva", 50.0), ("Shell", 10.0))
+    assert contratos.alteracoes() == ([], {'linhas': [], 'removidos': []})
+    # Texto igual ao exibido não suja a linha
+    contratos.definir_texto(0, 'volume', contratos.texto(0, 'volume'))
+    contratos.definir_texto(1, 'volume', "75")
+    contratos.remover(2)
+    nova = contratos.adicionar("Gás")
+    chaves, alteracoes = contratos.alteracoes()
+    assert chaves == [contratos.chaves[1], contratos.chaves[nova]]
+    assert [l.get('id') for l in alteracoes['linhas']] == [2, None]
+    assert alteracoes['linhas'][0]['volume'] == 75.0
+    assert alteracoes['removidos'] == [3]
+    # As pendências saíram do modelo
+    assert contratos.alteracoes() == ([], {'linhas': [], 'removidos': []})
+    contratos.confirmar_salvamento(chaves, [2, 4])
+    assert list(contratos.ids_banco) == [1, 2, 4]
+
+
+def test_linha_sem_empresa_sai_do_banco_e_fica_pendente():
+    contratos = carregado(("Petrobras", 100.0), ("Eneva", 50.0))
+    contratos.definir_texto(1, 'empresa', "")
+    chaves, alteracoes = contratos.alteracoes()
+    assert chaves == [] and alteracoes == {'linhas': [], 'removidos': [2]}
+    assert contratos.ids_banco[1] == 0
+    contratos.definir_texto(1, 'empresa', "Eneva")
+    _, alteracoes = contratos.alteracoes()
+    assert [(l['empresa'], l.get('id')) for l in alteracoes['linhas']] == [("Eneva", None)]
+
+
+def test_cancelar_devolve_as_pendencias():
+    contratos = carregado(("Petrobras", 100.0), ("Eneva", 50.0))
+    contratos.definir_texto(0, 'volume', "120")
+    contratos.remover(1)
+    chaves, alteracoes = contratos.alteracoes()
+    contratos.cancelar_salvamento(chaves, alteracoes['removidos'])
+    assert contratos.alteracoes() == (chaves, alteracoes)
+
+
+def test_edicoes_durante_o_salvamento():
+    contratos = carregado(("Petrobras", 100.0), ("Eneva", 50.0))
+    contratos.adicionar("Gás", volume=10.0)
+    outra = contratos.adicionar("Shell", volume=5.0)
+    contratos.definir_texto(0, 'volume', "120")
+    chaves, alteracoes = contratos.alteracoes()
+
+    # Enquanto o banco grava: edita uma linha enviada, remove uma nova e uma já salva
+    contratos.definir_texto(0, 'volume', "130")
+    contratos.remover(outra)
+    contratos.remover(1)
+    contratos.confirmar_salvamento(chaves, [1, 3, 4])
+
+    assert list(contratos.ids_banco) == [1, 3]
+    chaves, alteracoes = contratos.alteracoes()
+    assert chaves == [contratos.chaves[0]]
+    assert alteracoes['linhas'] == [{'empresa': "Petrobras", 'molecula': 10.0, 'transporte': 1.0,
+                                     'logistica': 0.5, 'volume': 130.0, 'id': 1}]
+    assert sorted(alteracoes['removidos']) == [2, 4]
+    assert contratos.empresa == ["Petrobras", "Gás"]
+
+
+def test_edicoes_durante_salvamento_que_falha():
+    contratos = carregado(("Petrobras", 100.0), ("Eneva", 50.0))
+    contratos.definir_texto(0, 'volume', "120")
+    chaves, alteracoes = contratos.alteracoes()
+    contratos.definir_texto(1, 'volume', "60")
+    contratos.remover(0)
+    contratos.cancelar_salvamento(chaves, alteracoes['removidos'])
+    chaves, alteracoes = contratos.alteracoes()
+    assert [l['id'] for l in alteracoes['linhas']] == [2]
+    assert alteracoes['removidos'] == [1]
+
+
+def test_salvar_como_nova():
+    contratos = carregado(("Petrobras", 100.0), ("Eneva", 50.0), ("", 0.0))
+    contratos.remover(1)
+    chaves, alteracoes = contratos.alteracoes(nova=True)
+    assert [l['empresa'] for l in alteracoes['linhas']] == ["Petrobras"]
+    assert 'id' not in alteracoes['linhas'][0] and alteracoes['removidos'] == []
+    # Até confirmar, o modelo continua na sessão atual
+    assert list(contratos.ids_banco) == [1, 3] and list(contratos.removidos) == [2]
+    contratos.confirmar_salvamento(chaves, [10], nova=True)
+    assert list(contratos.ids_banco) == [10, 0] and list(contratos.removidos) == []
+
+
+def test_copiar_linha_marca_o_destino():
+    origem = carregado(("Petrobras", 100.0))
+    destino = carregado(("Eneva", 50.0))
+    destino.copiar_linha(0, origem, 0)
+    chaves, alteracoes = destino.alteracoes()
+    assert chaves == [destino.chaves[0]]
+    assert alteracoes['linhas'][0]['empresa'] == "Petrobras" and alteracoes['linhas'][0]['id'] == 1
+
+
+def test_colunas_trimestre():
+    meses = {"Mês 1": carregado(("A", 100.0), ("B", 50.0)), "Mês 2": carregado(("C", 10.0))}
+    colunas = colunas_trimestre(meses, {"Mês 1": 31, "Mês 2": 28})
+    assert list(colunas['qdc']) == [100.0, 50.0, 10.0]
+    assert list(colunas['dias']) == [31.0, 31.0, 28.0]
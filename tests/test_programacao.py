@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Programação diária: preservada pela tela (ContratosMes) e copiada ao salvar como nova"""
+
+import numpy as np
+import pytest
+
+from database import DatabasePMPV
+from modelo import ContratosMes
+
+CALENDARIO = {'ano': 2028, 'mes_inicial': 1, 'dias': [31, 29, 31]}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabasePMPV(str(tmp_path / "pmpv.db"))
+    yield db
+    db.fechar()
+
+
+@pytest.fixture
+def sessao(db):
+    """Sessão com 2 contratos no mês 1; o primeiro com programação diária"""
+    linhas = [{'empresa': "Petrobras", 'molecula': 10.0, 'transporte': 1.0, 'logistica': 0.5, 'volume': 1.0},
+              {'empresa': "Eneva", 'molecula': 12.0, 'transporte': 1.0, 'logistica': 0.5, 'volume': 50.0}]
+    sessao_id, ids = db.sincronizar_sessao({1: {'linhas': linhas}}, nome="Q1", calendario=CALENDARIO)
+    rng = np.random.default_rng(7)
+    volumes, moleculas = rng.uniform(0, 300, (1, 31)), rng.uniform(9, 11, (1, 31))
+    assert db.salvar_programacao(sessao_id, 1, ids[1][:1], volumes, moleculas)
+    return sessao_id
+
+
+def carregar(db, sessao_id):
+    """Mês 1 da sessão no modelo da tela, como carregar_sessao faz"""
+    contratos = ContratosMes()
+    for lote in db.iterar_sessao(sessao_id):
+        for row in lote:
+            if row['mes'] == 1:
+                contratos.adicionar(row['empresa'], row['molecula'], row['transporte'], row['logistica'],
+                                    row['volume'], id_banco=row['id'], programada=bool(row['programada']))
+    return contratos
+
+
+def salvar(db, contratos, sessao_id=None, calendario=CALENDARIO, nova=False):
+    chaves, alteracoes = contratos.alteracoes(nova)
+    salvo = db.sincronizar_sessao({1: alteracoes}, sessao_id=sessao_id, nome="Cópia", calendario=calendario)
+    if salvo is None:
+        contratos.cancelar_salvamento(chaves, alteracoes['removidos'])
+        return None
+    contratos.confirmar_salvamento(chaves, salvo[1].get(1, []), nova)
+    return salvo[0]
+
+
+def test_carrega_quem_tem_programacao(db, sessao):
+    contratos = carregar(db, sessao)
+    assert [contratos.tem_programacao(i) for i in range(len(contratos))] == [True, False]
+
+
+def test_passar_pelo_campo_nao_descarta(db, sessao):
+    contratos = carregar(db, sessao)
+    exato = contratos.volume[0]
+    exibido = contratos.texto(0, 'volume')
+    assert float(exibido) != exato  # o equivalente tem mais casas do que a grade mostra
+    assert not contratos.descartaria_programacao(0, 'volume', exibido)
+    assert contratos.definir_texto(0, 'volume', exibido)
+    assert contratos.volume[0] == exato and contratos.tem_programacao(0)
+    # Outras colunas não mexem na programação
+    assert not contratos.descartaria_programacao(0, 'transporte', "2")
+    contratos.definir_texto(0, 'transporte', "2")
+    salvar(db, contratos, sessao)
+    assert db.carregar_programacao(sessao, 1) is not None
+
+
+def test_editar_volume_descarta_ao_salvar(db, sessao):
+    contratos = carregar(db, sessao)
+    assert contratos.descartaria_programacao(0, 'volume', "100")
+    contratos.definir_texto(0, 'volume', "100")
+    assert not contratos.tem_programacao(0)
+    salvar(db, contratos, sessao)
+    assert db.carregar_programacao(sessao, 1) is None
+
+
+def test_salvar_como_nova_copia_programacao(db, sessao):
+    original = db.carregar_programacao(sessao, 1)
+    contratos = carregar(db, sessao)
+    nova = salvar(db, contratos, nova=True)
+    assert nova is not None and nova != sessao
+
+    copia = db.carregar_programacao(nova, 1)
+    assert copia['id'].tolist() == [contratos.ids_banco[0]]
+    np.testing.assert_array_equal(copia['volumes'], original['volumes'])
+    np.testing.assert_array_equal(copia['moleculas'], original['moleculas'])
+    # O modelo passa a apontar para a linha nova; a sessão antiga continua intacta
+    assert contratos.programacao[0] == contratos.ids_banco[0]
+    assert db.carregar_programacao(sessao, 1)['id'].tolist() == original['id'].tolist()
+    relatorio = db.relatorio_pmpv([sessao, nova])
+    assert relatorio[nova]['pmpv'] == pytest.approx(relatorio[sessao]['pmpv'], rel=1e-12)
+
+
+def test_copia_com_outro_calendario_nao_salva(db, sessao):
+    contratos = carregar(db, sessao)
+    ids = list(contratos.ids_banco)
+    assert salvar(db, contratos, calendario={'ano': 2027, 'mes_inicial': 2}, nova=True) is None
+    assert db.conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0] == 1
+    # O modelo continua ligado à sessão original e ainda sabe de onde copiar
+    assert list(contratos.ids_banco) == ids and contratos.programacao[0] == ids[0]
+    nova = salvar(db, contratos, nova=True)
+    assert nova is not None and db.carregar_programacao(nova, 1) is not None
+
+
+# --- Calendário gravado com a sessão ---
+def test_iterar_sessao_traz_os_dias_gravados(db, sessao):
+    # Dias ajustados à mão não são os do calendário: a tela usa os gravados
+    assert db.definir_calendario(sessao, 2028, 1, [31, 28, 31])
+    primeira = next(db.iterar_sessao(sessao))[0]
+    assert [primeira[f'dias_mes_{mes}'] for mes in (1, 2, 3)] == [31, 28, 31]
+
+
+def test_salvar_sem_calendario_nao_grava_um(db):
+    linhas = [{'empresa': "Eneva", 'molecula': 12.0, 'transporte': 1.0, 'logistica': 0.5, 'volume': 50.0}]
+    sessao_id, _ = db.sincronizar_sessao({1: {'linhas': linhas}}, nome="Antiga")
+    contratos = carregar(db, sessao_id)
+    assert contratos.definir_texto(0, 'volume', "60")
+    assert salvar(db, contratos, sessao_id=sessao_id, calendario=None) == sessao_id
+    calendario = db.conn.execute("SELECT ano, mes_inicial, dias_mes_1, dias_mes_2, dias_mes_3 "
+                                 "FROM sessoes WHERE id = ?", (sessao_id,)).fetchone()
+    assert tuple(calendario) == (None,) * 5
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Serviço HTTP: rotas, download do Excel e erros 400 para pedidos malformados"""
+
+import asyncio
+import http.client
+import json
+import threading
+
+import pytest
+
+from database import DatabasePMPV
+from servidor import ServicoPMPV
+
+
+@pytest.fixture
+def servidor(tmp_path):
+    """Serviço num banco temporário, atendendo numa porta livre (thread própria)"""
+    caminho = str(tmp_path / "pmpv.db")
+    db = DatabasePMPV(caminho)
+    sessao_id = db.salvar_sessao_completa("Março 2026", {1: [
+        {'empresa': "Petrobras", 'molecula': 10.0, 'transporte': 1.0, 'logistica': 0.5, 'volume': 100.0}
+    ]}, calendario={'ano': 2026, 'mes_inicial': 3})
+    db.fechar()
+    servico = ServicoPMPV(caminho, conexoes=2)
+    loop = asyncio.new_event_loop()
+    pronto = threading.Event()
+    estado = {}
+
+    async def subir():
+        estado['servidor'] = await asyncio.start_server(servico.atender, "127.0.0.1", 0)
+        estado['porta'] = estado['servidor'].sockets[0].getsockname()[1]
+        pronto.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(subir()), loop.run_forever()))
+    thread.start()
+    pronto.wait(10)
+    yield estado['porta'], sessao_id
+
+    async def parar():
+        # Fecha o servidor e encerra as conexões keep-alive ainda abertas
+        estado['servidor'].close()
+        tarefas = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        await estado['servidor'].wait_closed()
+
+    asyncio.run_coroutine_threadsafe(parar(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
+    servico.fechar()
+
+
+def pedir(porta, metodo, caminho, corpo=None):
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+    try:
+        conexao.request(metodo, caminho, body=None if corpo is None else corpo.encode("utf-8"))
+        resposta = conexao.getresponse()
+        return resposta.status, dict(resposta.getheaders()), resposta.read()
+    finally:
+        conexao.close()
+
+
+def test_calcular(servidor):
+    porta, _ = servidor
+    status, _, corpo = pedir(porta, "POST", "/calcular", json.dumps({
+        "dados": {"Mês 1": [{"empresa": "A", "molecula": "10,5", "transporte": None, "volume": 100}]},
+        "dias": [31, 28, 31]}))
+    assert status == 200
+    assert json.loads(corpo)['pmpv'] == pytest.approx(10.5)
+
+
+@pytest.mark.parametrize("pedido", [
+    {"dados": {"Mês 1": [1]}},
+    {"dados": {"Mês 1": 5}},
+    {"dados": {"Mês 1": [{"empresa": "A", "volume": "muito"}]}},
+    {"dados": {}, "dias": "ab"},
+    {"dados": {}, "dias": [31, "x", 30]},
+    {"dados": {}, "conta_grafica": [1]},
+    [1, 2],
+])
+def test_pedido_malformado_da_400(servidor, pedido):
+    porta, _ = servidor
+    status, _, corpo = pedir(porta, "POST", "/calcular", json.dumps(pedido))
+    assert status == 400
+    assert json.loads(corpo)['erro']
+
+
+@pytest.mark.parametrize("corpo", [
+    '{"dados": {"Mês 1": [{"empresa": "A", "molecula": 1e400, "volume": 1}]}}',
+    '{"dados": {"Mês 1": [{"empresa": "A", "molecula": "inf", "volume": 1}]}}',
+    '{"dados": {"Mês 1": [{"empresa": "A", "molecula": 10, "volume": NaN}]}}',
+    '{"dados": {"Mês 1": [{"empresa": "A", "molecula": 1%s, "volume": 1}]}}' % ("0" * 400),
+    '{"dados": {}, "conta_grafica": -Infinity}',
+    '{"dados": {}, "dias": [31, Infinity, 31]}',
+    # Valores finitos cujo custo não cabe num float
+    '{"dados": {"Mês 1": [{"empresa": "A", "molecula": 1e308, "volume": 1e10}]}}',
+])
+def test_valores_nao_finitos_dao_400(servidor, corpo):
+    porta, _ = servidor
+    status, _, resposta = pedir(porta, "POST", "/calcular", corpo)
+    assert status == 400
+    assert json.loads(resposta)['erro']
+
+
+def test_calcular_sem_volume_devolve_null(servidor):
+    porta, _ = servidor
+    status, _, corpo = pedir(porta, "POST", "/calcular", json.dumps({"dados": {}}))
+    assert status == 200
+    resposta = json.loads(corpo, parse_constant=lambda constante: pytest.fail(f"JSON com {constante}"))
+    assert resposta['pmpv'] is None and resposta['volume_total'] == 0
+
+
+def test_sessoes(servidor):
+    porta, sessao_id = servidor
+    status, _, corpo = pedir(porta, "GET", "/sessoes")
+    assert status == 200 and [s['id'] for s in json.loads(corpo)] == [sessao_id]
+    status, _, corpo = pedir(porta, "GET", f"/sessoes/{sessao_id}")
+    assert status == 200 and json.loads(corpo)['sessao']['nome'] == "Março 2026"
+    assert pedir(porta, "GET", "/sessoes/999")[0] == 404
+    assert pedir(porta, "GET", "/sessoes?limite=x")[0] == 400
+
+
+def test_excel_com_nome_do_arquivo(servidor):
+    porta, sessao_id = servidor
+    status, cabecalhos, corpo = pedir(porta, "GET", f"/sessoes/{sessao_id}/excel")
+    assert status == 200 and corpo[:2] == b"PK"
+    disposicao = cabecalhos['Content-Disposition']
+    assert disposicao.startswith(f'attachment; filename="PMPV_Sessao_{sessao_id}_Marco_2026.xlsx"')
+    assert f"filename*=UTF-8''PMPV_Sessao_{sessao_id}_Mar%C3%A7o_2026.xlsx" in disposicao
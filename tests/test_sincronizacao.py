@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Gravação incremental de sessões (DatabasePMPV.sincronizar_sessao).
+"""
+
+import pytest
+
+from database import DatabasePMPV
+
+
+def linha(empresa, volume, molecula=10.0, **extra):
+    return dict(empresa=empresa, molecula=molecula, transporte=1.0, logistica=0.5, volume=volume, **extra)
+
+
+@pytest.fixture
+def db(tmp_path):
+    banco = DatabasePMPV(str(tmp_path / "sessoes.db"))
+    yield banco
+    banco.fechar()
+
+
+def resumo(db):
+    return [tuple(row) for row in db.conn.execute("SELECT * FROM resumo_mes ORDER BY sessao_id, mes")]
+
+
+def assert_resumo_igual_reconstrucao(db):
+    antes = resumo(db)
+    assert db.reconstruir_resumo()
+    assert antes == resumo(db)
+
+
+def test_upsert_mantem_ids(db):
+    sessao_id, ids = db.sincronizar_sessao({1: {'linhas': [linha("Petrobras", 100.0), linha("Eneva", 50.0)]}},
+                                           nome="Sessão")
+    primeiro, segundo = ids[1]
+    _, ids = db.sincronizar_sessao({1: {'linhas': [linha("Petrobras", 300.0, id=primeiro),
+                                                   linha("Gás Natural", 20.0)]}},
+                                   sessao_id=sessao_id)
+    assert ids[1][0] == primeiro
+    assert ids[1][1] > segundo
+    volumes = {l['id']: l['volume'] for l in db.carregar_dados_mes(sessao_id, 1)}
+    assert volumes == {primeiro: 300.0, segundo: 50.0, ids[1][1]: 20.0}
+    assert_resumo_igual_reconstrucao(db)
+
+
+def test_removidos_e_resumo(db):
+    sessao_id, ids = db.sincronizar_sessao({
+        1: {'linhas': [linha("Petrobras", 100.0), linha("Eneva", 50.0)]},
+        2: {'linhas': [linha("Petrobras", 70.0)]},
+    }, nome="Sessão")
+    db.sincronizar_sessao({1: {'removidos': [ids[1][1]]}, 2: {'removidos': ids[2]}}, sessao_id=sessao_id)
+    assert [l['id'] for l in db.carregar_dados_mes(sessao_id, 1)] == ids[1][:1]
+    assert db.carregar_dados_mes(sessao_id, 2) == []
+    assert_resumo_igual_reconstrucao(db)
+    assert [mes for _, mes, *_ in resumo(db)] == [1]
+
+
+def test_id_de_outra_sessao_vira_linha_nova(db):
+    outra, ids_outra = db.sincronizar_sessao({1: {'linhas': [linha("Petrobras", 100.0)]}}, nome="Outra")
+    sessao_id, _ = db.sincronizar_sessao({1: {'linhas': [linha("Eneva", 10.0)]}}, nome="Sessão")
+    alheio = ids_outra[1][0]
+    _, ids = db.sincronizar_sessao({1: {'linhas': [linha("Eneva", 999.0, id=alheio)], 'removidos': [alheio]}},
+                                   sessao_id=sessao_id)
+    assert [(l['id'], l['volume']) for l in db.carregar_dados_mes(outra, 1)] == [(alheio, 100.0)]
+    # A edição não se perde: vai para uma linha nova, com o id devolvido
+    assert ids[1][0] != alheio
+    assert (ids[1][0], 999.0) in [(l['id'], l['volume']) for l in db.carregar_dados_mes(sessao_id, 1)]
+    assert_resumo_igual_reconstrucao(db)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Executor de tarefas e o fluxo de salvar/cancelar da tela, sem abrir o Tk:
+uma raiz falsa guarda o `after` e o teste esvazia a fila na mão.
+"""
+
+import sqlite3
+
+import pytest
+
+from database import DatabasePMPV
+from main import CalculadoraTrimestralPMPV
+from modelo import ContratosMes
+from tarefas import Cancelada, ExecutorTarefas
+
+
+class RaizFalsa:
+    """Só o que o ExecutorTarefas usa do Tk"""
+
+    def __init__(self):
+        self.agendado = None
+
+    def after(self, ms, funcao):
+        self.agendado = funcao
+        return "after#1"
+
+    def after_cancel(self, identificador):
+        self.agendado = None
+
+
+@pytest.fixture
+def executor():
+    executor = ExecutorTarefas(RaizFalsa(), ao_progresso=lambda *args: None, max_workers=1)
+    yield executor
+    executor.encerrar()
+
+
+def rodar(executor, funcao, *args):
+    """Roda a tarefa até o fim e devolve (evento, dado) do callback chamado"""
+    eventos = []
+    executor.iniciar("Tarefa", funcao, *args,
+                     ao_concluir=lambda dado: eventos.append(('fim', dado)),
+                     ao_erro=lambda erro: eventos.append(('erro', erro)),
+                     ao_cancelar=lambda: eventos.append(('cancelada', None)))
+    executor._pool.submit(lambda: None).result(timeout=10)  # max_workers=1: espera a tarefa
+    executor._processar_fila()
+    assert len(eventos) == 1 and not executor.em_andamento()
+    return eventos[0]
+
+
+def test_conclui(executor):
+    assert rodar(executor, lambda contexto: 42) == ('fim', 42)
+
+
+def test_cancelamento_depois_do_trabalho_feito_conclui(executor):
+    def funcao(contexto):
+        executor.cancelar()
+        return "gravado"
+    assert rodar(executor, funcao) == ('fim', "gravado")
+
+
+def test_cancelamento_no_progresso(executor):
+    def funcao(contexto):
+        executor.cancelar()
+        contexto.progresso(0.5)
+        return "não chega aqui"
+    assert rodar(executor, funcao) == ('cancelada', None)
+
+
+def test_interrupcao_do_sqlite_so_conta_se_cancelada(executor):
+    def interrompida(contexto, cancelar):
+        if cancelar:
+            executor.cancelar()
+        raise sqlite3.OperationalError("interrupted")
+    assert rodar(executor, interrompida, True) == ('cancelada', None)
+    evento, erro = rodar(executor, interrompida, False)
+    assert evento == 'erro' and isinstance(erro, sqlite3.OperationalError)
+
+
+def test_erro_com_cancelamento_pedido_continua_erro(executor):
+    def funcao(contexto):
+        executor.cancelar()
+        raise ValueError("falhou")
+    evento, erro = rodar(executor, funcao)
+    assert evento == 'erro' and isinstance(erro, ValueError)
+
+
+# --- Fluxo de salvar da tela (concluido/falhou de salvar_sessao) ---
+@pytest.fixture
+def db(tmp_path):
+    db = DatabasePMPV(str(tmp_path / "pmpv.db"))
+    yield db
+    db.fechar()
+
+
+def salvar(executor, db, modelo, sessao_id, cancelar_depois=False, cancelar_antes=False, nova=False):
+    """Repete o que salvar_sessao faz com o modelo em cada desfecho da tarefa"""
+    chaves, alteracoes = modelo.alteracoes(nova)
+    gravar = CalculadoraTrimestralPMPV._tarefa_salvar
+
+    def tarefa(contexto):
+        if cancelar_antes:
+            executor.cancelar()
+        salvo = gravar(contexto, db, {1: alteracoes}, None, None if nova else sessao_id, "Q1", None)
+        if cancelar_depois:
+            executor.cancelar()
+        return salvo
+
+    evento, dado = rodar(executor, tarefa)
+    if evento == 'fim':
+        sessao_id, ids = dado
+        modelo.confirmar_salvamento(chaves, ids.get(1, []), nova)
+    else:
+        modelo.cancelar_salvamento(chaves, alteracoes['removidos'])
+    return evento, sessao_id
+
+
+def contar(db):
+    return [db.conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+            for tabela in ('sessoes', 'dados_mes')]
+
+
+def test_cancelar_depois_do_commit_nao_duplica(executor, db):
+    modelo = ContratosMes()
+    modelo.adicionar("Petrobras", 10.0, 1.0, 0.5, 100.0)
+    modelo.adicionar("Eneva", 12.0, 1.0, 0.5, 50.0)
+
+    evento, sessao_id = salvar(executor, db, modelo, None, cancelar_depois=True)
+    assert evento == 'fim' and sessao_id is not None
+    assert list(modelo.ids_banco) == [row['id'] for row in db.carregar_dados_mes(sessao_id, 1)]
+
+    modelo.definir_texto(0, 'volume', "200")
+    evento, mesmo_id = salvar(executor, db, modelo, sessao_id)
+    assert evento == 'fim' and mesmo_id == sessao_id
+    assert contar(db) == [1, 2]
+    assert [row['volume'] for row in db.carregar_dados_mes(sessao_id, 1)] == [200.0, 50.0]
+
+
+def test_cancelar_antes_de_gravar_devolve_pendencias(executor, db):
+    modelo = ContratosMes()
+    modelo.adicionar("Petrobras", 10.0, 1.0, 0.5, 100.0)
+
+    evento, sessao_id = salvar(executor, db, modelo, None, cancelar_antes=True)
+    assert evento == 'cancelada' and sessao_id is None
+    assert contar(db) == [0, 0]
+    # As linhas continuam pendentes e o próximo salvamento grava uma vez só
+    evento, sessao_id = salvar(executor, db, modelo, None)
+    assert evento == 'fim' and contar(db) == [1, 1]
+    assert modelo.alteracoes()[1] == {'linhas': [], 'removidos': []}
+
+
+
+def test_salvar_como_nova_cancelado_mantem_a_sessao(executor, db):
+    modelo = ContratosMes()
+    modelo.adicionar("Petrobras", 10.0, 1.0, 0.5, 100.0)
+    modelo.adicionar("Eneva", 12.0, 1.0, 0.5, 50.0)
+    _, sessao_id = salvar(executor, db, modelo, None)
+    ids = list(modelo.ids_banco)
+    modelo.remover(1)
+    modelo.definir_texto(0, 'volume', "200")
+
+    evento, atual = salvar(executor, db, modelo, sessao_id, cancelar_antes=True, nova=True)
+    assert evento == 'cancelada' and atual == sessao_id
+    assert list(modelo.ids_banco) == ids[:1] and list(modelo.removidos) == ids[1:]
+    # O próximo "atualizar" grava a edição e a remoção na sessão original
+    evento, atual = salvar(executor, db, modelo, sessao_id)
+    assert evento == 'fim' and atual == sessao_id and contar(db) == [1, 1]
+    assert [(row['id'], row['volume']) for row in db.carregar_dados_mes(sessao_id, 1)] == [(ids[0], 200.0)]
+
+
+def test_salvar_como_nova_com_edicao_durante_a_gravacao(executor, db):
+    modelo = ContratosMes()
+    modelo.adicionar("Petrobras", 10.0, 1.0, 0.5, 100.0)
+    modelo.adicionar("Eneva", 12.0, 1.0, 0.5, 50.0)
+    _, original = salvar(executor, db, modelo, None)
+    ids_originais = list(modelo.ids_banco)
+
+    chaves, alteracoes = modelo.alteracoes(nova=True)
+    modelo.definir_texto(0, 'volume', "300")   # editada enquanto o banco grava
+    modelo.remover(1)                          # removida enquanto o banco grava
+    nova, ids = db.sincronizar_sessao({1: alteracoes}, nome="Cópia")
+    modelo.confirmar_salvamento(chaves, ids[1], nova=True)
+
+    assert list(modelo.ids_banco) == ids[1][:1] and list(modelo.removidos) == ids[1][1:]
+    assert db.sincronizar_sessao({1: modelo.alteracoes()[1]}, sessao_id=nova)
+    assert [(row['id'], row['volume']) for row in db.carregar_dados_mes(nova, 1)] == [(ids[1][0], 300.0)]
+    # A sessão original não muda
+    assert [row['id'] for row in db.carregar_dados_mes(original, 1)] == ids_originais